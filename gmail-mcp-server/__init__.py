@@ -11,9 +11,33 @@ def main():
     parser.add_argument('--token-path',
                         required=True,
                        help='File location to store and retrieve access and refresh tokens for application')
+    parser.add_argument('--max-workers',
+                        type=int,
+                        default=server.DEFAULT_MAX_WORKERS,
+                       help='Number of threads used to run Gmail API calls concurrently')
+    parser.add_argument('--request-timeout',
+                        type=float,
+                        default=server.DEFAULT_REQUEST_TIMEOUT,
+                       help='Seconds to wait for a single Gmail API call')
+    parser.add_argument('--cache-path',
+                        default=None,
+                       help='SQLite file used to cache emails and unread listings between calls')
+    parser.add_argument('--transport',
+                        choices=['stdio', 'sse'],
+                        default='stdio',
+                       help='Serve over stdio for a single client, or over SSE as a persistent server')
+    parser.add_argument('--host',
+                        default=server.DEFAULT_HOST,
+                       help='Host to listen on with the SSE transport')
+    parser.add_argument('--port',
+                        type=int,
+                        default=server.DEFAULT_PORT,
+                       help='Port to listen on with the SSE transport')
     
     args = parser.parse_args()
-    asyncio.run(server.main(args.creds_file_path, args.token_path))
+    asyncio.run(server.main(args.creds_file_path, args.token_path,
+                            args.max_workers, args.request_timeout, args.cache_path,
+                            args.transport, args.host, args.port))
 
 # Optionally expose other important items at package level
 __all__ = ['main', 'server']
@@ -0,0 +1,77 @@
+"""
+Benchmark: concurrent GmailService calls against a fake Gmail backend that adds a fixed
+latency to every HTTP request. With one API worker the reads run one after another; with
+more workers they overlap, so the wall time should drop roughly by the worker count.
+
+    python bench_concurrency.py --requests 32 --latency 0.05 --workers 1,4,8
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import time
+
+from googleapiclient.http import HttpMockSequence
+
+from server import GmailService
+
+MESSAGE = json.dumps({
+    'id': 'm1',
+    'threadId': 't1',
+    'payload': {
+        'mimeType': 'text/plain',
+        'headers': [{'name': 'Subject', 'value': 'Benchmark'}, {'name': 'From', 'value': 'a@example.com'}],
+        'body': {'data': base64.urlsafe_b64encode(b'Hello from the fake Gmail backend').decode()},
+    },
+})
+
+
+class DelayedHttpMockSequence(HttpMockSequence):
+    """HttpMockSequence that sleeps latency seconds before answering, like a remote Gmail API"""
+
+    def __init__(self, latency):
+        super().__init__([])
+        self.latency = latency
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        time.sleep(self.latency)
+        # messages.modify answers with an empty object, everything else with the message
+        content = '{}' if uri.split('?')[0].endswith('/modify') else MESSAGE
+        self._iterable.append(({'status': '200'}, content))
+        return super().request(uri, method, body, headers, *args, **kwargs)
+
+
+async def run(requests, latency, workers):
+    """Wall time of `requests` concurrent read_email calls (a get and a modify each)"""
+    service = GmailService('unused', 'unused', http_factory=lambda: DelayedHttpMockSequence(latency),
+                           max_workers=workers)
+    service.service  # build the API client outside the timed section
+    start = time.perf_counter()
+    results = await asyncio.gather(*(service.read_email(f'm{i}') for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if not isinstance(result, dict)]
+    if failures:
+        raise RuntimeError(f"{len(failures)} reads failed, e.g. {failures[0]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GmailService concurrency benchmark')
+    parser.add_argument('--requests', type=int, default=32, help='concurrent read_email calls')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every HTTP request')
+    parser.add_argument('--workers', default='1,4,8', help='comma-separated API thread pool sizes')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    serial = args.requests * 2 * args.latency
+    print(f"{args.requests} reads, 2 requests each, {args.latency * 1000:.0f} ms per request "
+          f"(fully serial: {serial:.2f} s)")
+    print(f"{'workers':>8} {'wall s':>8} {'speedup':>8}")
+    for workers in (int(w) for w in args.workers.split(',')):
+        elapsed = asyncio.run(run(args.requests, args.latency, workers))
+        print(f"{workers:>8} {elapsed:>8.2f} {serial / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
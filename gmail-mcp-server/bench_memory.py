@@ -0,0 +1,100 @@
+"""
+Benchmark: memory and time to turn Gmail API responses for large messages into read_email
+results. Compares the previous path (format='raw': decode and parse the whole MIME message,
+attachments included) with parse_message_payload on a format='full' response, where Gmail
+leaves attachment data out and the body is decoded only up to max_body_bytes.
+
+    python bench_memory.py --messages 20 --body-mb 2 --attachment-mb 8
+"""
+import argparse
+import base64
+import json
+import time
+import tracemalloc
+from email import message_from_bytes
+from email.message import EmailMessage
+
+from server import MAX_BODY_BYTES, decode_mime_header, parse_message_payload
+
+
+def synthetic_message(index, body_bytes, attachment_bytes):
+    """A large message as Gmail returns it with format='raw' and with format='full'"""
+    body = (f"Line {index} of a long synthetic email body.\n" * (body_bytes // 40 + 1))[:body_bytes]
+    attachment = bytes(range(256)) * (attachment_bytes // 256)
+    message = EmailMessage()
+    message['Subject'] = f'Synthetic message {index}'
+    message['From'] = 'sender@example.com'
+    message['To'] = 'me@example.com'
+    message.set_content(body)
+    message.add_attachment(attachment, maintype='application', subtype='octet-stream', filename='data.bin')
+    raw = json.dumps({'id': f'm{index}', 'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()})
+    full = json.dumps({
+        'id': f'm{index}',
+        'threadId': f't{index}',
+        'payload': {
+            'mimeType': 'multipart/mixed',
+            'headers': [{'name': 'Subject', 'value': message['Subject']},
+                        {'name': 'From', 'value': message['From']},
+                        {'name': 'To', 'value': message['To']}],
+            'parts': [
+                {'mimeType': 'text/plain', 'filename': '',
+                 'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset="utf-8"'}],
+                 'body': {'size': len(body), 'data': base64.urlsafe_b64encode(body.encode()).decode()}},
+                {'mimeType': 'application/octet-stream', 'filename': 'data.bin',
+                 'body': {'size': len(attachment), 'attachmentId': f'att{index}'}},
+            ],
+        },
+    })
+    return raw, full
+
+
+def parse_raw_response(response):
+    """read_email before the streaming parser: the whole message is decoded and parsed"""
+    msg = json.loads(response)
+    mime_message = message_from_bytes(base64.urlsafe_b64decode(msg['raw']))
+    body = None
+    for part in mime_message.walk():
+        if part.get_content_type() == "text/plain":
+            body = part.get_payload(decode=True).decode()
+            break
+    return {'content': body, 'subject': decode_mime_header(mime_message.get('subject', ''))}
+
+
+def parse_full_response(response, max_body_bytes):
+    return parse_message_payload(json.loads(response), max_body_bytes)
+
+
+def measure(label, parse, responses):
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for response in responses:
+        parse(response)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    print(f"{label:<28} {peak / 2**20:>10.1f} {elapsed / len(responses) * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='read_email parsing memory benchmark')
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--body-mb', type=float, default=2)
+    parser.add_argument('--attachment-mb', type=float, default=8)
+    args = parser.parse_args()
+
+    corpus = [synthetic_message(i, int(args.body_mb * 2**20), int(args.attachment_mb * 2**20))
+              for i in range(args.messages)]
+    raw_responses = [raw for raw, _ in corpus]
+    full_responses = [full for _, full in corpus]
+    print(f"{args.messages} messages, {args.body_mb} MB body + {args.attachment_mb} MB attachment each")
+    print(f"{'path':<28} {'peak MB':>10} {'ms/msg':>10}")
+
+    tracemalloc.start()
+    measure("format='raw' (before)", parse_raw_response, raw_responses)
+    measure("format='full', default cap", lambda r: parse_full_response(r, MAX_BODY_BYTES), full_responses)
+    measure("format='full', 16 KB cap", lambda r: parse_full_response(r, 16 * 1024), full_responses)
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,34 @@
-from typing import Any
+from typing import Any, Callable
 import argparse
 import os
 import asyncio
 import logging
 import base64
-from email.message import EmailMessage
+import codecs
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from email.message import EmailMessage, Message
 from email.header import decode_header
 from base64 import urlsafe_b64decode
-from email import message_from_bytes
+from html.parser import HTMLParser
 import webbrowser
 import math
+from decimal import Decimal, localcontext
+import sys
 
+import numpy as np
 from mcp.server.models import InitializationOptions
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 import mcp.server.stdio
 
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
@@ -26,6 +38,45 @@ from googleapiclient.errors import HttpError
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Gmail accepts up to 100 calls per batch request, but smaller batches avoid hitting per-user rate limits
+BATCH_SIZE = 50
+# Maximum number of batch requests in flight at once when fetching messages in bulk
+MAX_BATCH_WORKERS = 4
+# Size of the thread pool that runs the blocking Gmail API calls
+DEFAULT_MAX_WORKERS = 8
+# Seconds to wait for a single Gmail API call before giving up
+DEFAULT_REQUEST_TIMEOUT = 30.0
+# users.messages.batchModify accepts at most 1000 message IDs per call
+BATCH_MODIFY_LIMIT = 1000
+# Seconds deferred read markers are collected before being flushed in a single batchModify call
+READ_FLUSH_DELAY = 2.0
+# Largest email body, in bytes, returned when reading an email; longer bodies are truncated
+MAX_BODY_BYTES = 256 * 1024
+# Parts of the message resource needed to build the email metadata
+MESSAGE_FIELDS = 'id,threadId,payload'
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+# Seconds to wait before retrying a failed background token refresh
+TOKEN_REFRESH_RETRY_DELAY = 60
+# Address the server listens on when run as a persistent SSE server
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+
+# Natural log of the largest float; sums of exponentials above it are returned as decimal strings
+LOG_FLOAT_MAX = math.log(sys.float_info.max)
+# Result modes of int_list_to_exponential_sum
+EXP_SUM_MODES = ('auto', 'log', 'decimal')
+# Significant digits of decimal exponential sums
+EXP_SUM_DECIMAL_DIGITS = 30
+# Lists up to this length get an exact Decimal sum; longer ones go through log-sum-exp
+EXP_SUM_EXACT_DECIMAL_LIMIT = 10000
+# Lists at least this long are summed with NumPy
+EXP_SUM_NUMPY_THRESHOLD = 1000
+
+# Gmail query used for unread listings and the labels every message it matches carries
+UNREAD_QUERY = 'in:inbox is:unread category:primary'
+UNREAD_LABELS = ['INBOX', 'UNREAD', 'CATEGORY_PERSONAL']
+
 EMAIL_ADMIN_PROMPTS = """You are an email administrator. 
 You can draft, edit, read, trash, open, and send emails.
 You've been given access to a specific gmail account. 
@@ -34,6 +85,8 @@ You have the following tools available:
 - Retrieve unread emails (get-unread-emails)
 - Read email content (read-email)
 - Trash email (tras-email)
+- Trash many emails at once (batch-trash-emails)
+- Mark many emails as read at once (batch-mark-as-read)
 - Open email in browser (open-email)
 Never send an email draft or trash an email unless the user confirms first. 
 Always ask for approval if not already given.
@@ -90,10 +143,61 @@ def strings_to_chars_to_int(string: str) -> list[int]:
     logger.info("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
     return [int(ord(char)) for char in string]
 
-def int_list_to_exponential_sum(int_list: list) -> float:
-    """Return sum of expon exponentials of numbers in a list"""
+def log_sum_exp(values: list[float] | np.ndarray) -> float:
+    """Return log(sum(exp(v))) without overflowing, by factoring out the largest value"""
+    if isinstance(values, np.ndarray):
+        largest = values.max()
+        return float(largest + np.log(np.sum(np.exp(values - largest))))
+    largest = max(values)
+    return largest + math.log(math.fsum(math.exp(v - largest) for v in values))
+
+def exp_sum_decimal(values: list[float] | np.ndarray, log_sum: float | None = None) -> str:
+    """Return sum(exp(v)) as a decimal string with EXP_SUM_DECIMAL_DIGITS significant digits"""
+    with localcontext() as ctx:
+        ctx.prec = EXP_SUM_DECIMAL_DIGITS
+        if len(values) <= EXP_SUM_EXACT_DECIMAL_LIMIT:
+            total = sum(Decimal(float(v)).exp() for v in values)
+        else:
+            # Long lists go through the float log-sum-exp, good to about 13 significant digits
+            total = Decimal(log_sum if log_sum is not None else log_sum_exp(values)).exp()
+        return str(+total)
+
+def int_list_to_exponential_sum(int_list: list, mode: str = "auto") -> float | str:
+    """
+    Return sum of exponentials of numbers in a list.
+    mode "auto" returns a float, or a decimal string when the sum overflows a float;
+    "log" returns the natural log of the sum; "decimal" always returns a decimal string.
+    """
     logger.info("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
-    return sum(math.exp(i) for i in int_list)
+    if mode not in EXP_SUM_MODES:
+        raise ValueError(f"Unknown mode {mode}; expected one of {', '.join(EXP_SUM_MODES)}")
+    if len(int_list) == 0:
+        if mode == "log":
+            raise ValueError("The log of an empty sum is undefined")
+        return "0" if mode == "decimal" else 0.0
+    vectorized = len(int_list) >= EXP_SUM_NUMPY_THRESHOLD
+    values = np.asarray(int_list, dtype=np.float64) if vectorized else [float(i) for i in int_list]
+    if mode == "decimal":
+        return exp_sum_decimal(values)
+    # Python's max() would iterate a NumPy array element by element
+    largest = values.max() if vectorized else max(values)
+    if mode == "auto" and largest <= LOG_FLOAT_MAX:
+        if vectorized:
+            with np.errstate(over="ignore"):
+                total = float(np.sum(np.exp(values)))
+            if math.isfinite(total):
+                return total
+        else:
+            try:
+                return math.fsum(math.exp(v) for v in values)
+            except OverflowError:
+                pass  # Every term fits a float but their sum does not
+    log_sum = log_sum_exp(values)
+    if mode == "log":
+        return log_sum
+    if log_sum <= LOG_FLOAT_MAX:
+        return math.exp(log_sum)
+    return exp_sum_decimal(values, log_sum)
 
 def decode_mime_header(header: str) -> str: 
     """Helper function to decode encoded email headers"""
@@ -109,22 +213,275 @@ def decode_mime_header(header: str) -> str:
             decoded_string += part 
     return decoded_string
 
+def decode_body_data(data: str, max_bytes: int) -> tuple[bytes, bool]:
+    """Decode at most max_bytes of base64URL encoded body data, leaving the rest undecoded"""
+    # Every 4 base64 characters encode 3 bytes
+    limit = -(-max_bytes // 3) * 4
+    chunk = data[:limit]
+    decoded = urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+    # The last 4 characters may decode to a few bytes past max_bytes
+    return decoded[:max_bytes], len(decoded) > max_bytes or len(data) > limit
+
+def part_charset(part: dict) -> str:
+    """Return the charset declared in a message part's Content-Type header"""
+    for header in part.get('headers', []):
+        if header['name'].lower() == 'content-type':
+            content_type = Message()
+            content_type['Content-Type'] = header['value']
+            return content_type.get_content_charset('utf-8')
+    return 'utf-8'
+
+def iter_parts(part: dict):
+    """Walk a message payload and its nested parts depth first"""
+    yield part
+    for subpart in part.get('parts', []):
+        yield from iter_parts(subpart)
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect the text of an HTML document, leaving out scripts and styles"""
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip += 1
+        elif tag in ('br', 'p', 'div', 'tr', 'li'):
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.chunks.append(data)
+
+def html_to_text(html: str) -> str:
+    """Plain text of an HTML email body, for messages without a text/plain part"""
+    extractor = _HTMLTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = (' '.join(line.split()) for line in ''.join(extractor.chunks).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def parse_message_payload(message: dict, max_body_bytes: int = MAX_BODY_BYTES) -> dict[str, Any]:
+    """
+    Build email metadata from a message fetched with format='full'.
+    Only the first text/plain part is decoded, up to max_body_bytes, falling back to the
+    text of the first text/html part; attachments are listed with their attachmentId but
+    their contents are never downloaded.
+    """
+    payload = message.get('payload', {})
+    headers = {}
+    for header in payload.get('headers', []):
+        headers.setdefault(header['name'].lower(), header['value'])
+
+    # Extract the email body
+    if payload.get('parts'):
+        # Extract the text/plain part, or the text/html part of HTML-only emails
+        body_parts = [part for part in iter_parts(payload) if not part.get('filename')]
+        body_part = next((part for part in body_parts if part.get('mimeType') == 'text/plain'),
+                         next((part for part in body_parts if part.get('mimeType') == 'text/html'), None))
+    else:
+        # For non-multipart messages
+        body_part = payload
+
+    body = None
+    truncated = False
+    if body_part is not None and 'data' in body_part.get('body', {}):
+        body_bytes, truncated = decode_body_data(body_part['body']['data'], max_body_bytes)
+        try:
+            decoder = codecs.getincrementaldecoder(part_charset(body_part))(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # A character cut in half at the limit is held back by the decoder and dropped
+        body = decoder.decode(body_bytes, final=not truncated)
+        if body_part.get('mimeType') == 'text/html':
+            body = html_to_text(body)
+
+    attachments = [
+        {
+            'filename': part['filename'],
+            'mimeType': part.get('mimeType', ''),
+            'size': part['body'].get('size', 0),
+            'attachmentId': part['body']['attachmentId'],
+        }
+        for part in iter_parts(payload)
+        if part.get('filename') and 'attachmentId' in part.get('body', {})
+    ]
+
+    email_metadata = {
+        'content': body,
+        'subject': decode_mime_header(headers.get('subject', '')),
+        'from': headers.get('from', ''),
+        'to': headers.get('to', ''),
+        'date': headers.get('date', ''),
+        'attachments': attachments,
+    }
+    if truncated:
+        email_metadata['truncated'] = True
+    return email_metadata
+
+def truncate_body(email_metadata: dict[str, Any], max_body_bytes: int) -> dict[str, Any]:
+    """Apply max_body_bytes to already decoded email metadata, e.g. a full body from MessageCache"""
+    content = email_metadata.get('content')
+    if content is None:
+        return email_metadata
+    encoded = content.encode('utf-8')
+    if len(encoded) <= max_body_bytes:
+        return email_metadata
+    # A character cut in half at the limit is dropped
+    return {**email_metadata, 'content': encoded[:max_body_bytes].decode('utf-8', errors='ignore'), 'truncated': True}
+
+class MessageCache:
+    """
+    On-disk SQLite store of parsed messages and their labels.
+    Message contents never change in Gmail, so they are cached forever; labels are kept
+    fresh by replaying history records since the stored historyId.
+    """
+    def __init__(self, path: str):
+        logger.info(f"Opening message cache: {path}")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id TEXT PRIMARY KEY,
+                    thread_id TEXT NOT NULL DEFAULT '',
+                    email TEXT
+                );
+                CREATE TABLE IF NOT EXISTS message_labels (
+                    message_id TEXT NOT NULL,
+                    label_id TEXT NOT NULL,
+                    PRIMARY KEY (message_id, label_id)
+                );
+                CREATE INDEX IF NOT EXISTS message_labels_label ON message_labels (label_id);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def _get_state(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def get_history_id(self) -> str | None:
+        """Return the historyId the cached labels are consistent with"""
+        with self._lock:
+            return self._get_state('history_id')
+
+    def set_history_id(self, history_id: str) -> None:
+        with self._lock, self._conn:
+            self._set_state('history_id', str(history_id))
+
+    def get_email(self, email_id: str) -> dict[str, str] | None:
+        """Return the parsed email if it has been cached"""
+        with self._lock:
+            row = self._conn.execute("SELECT email FROM messages WHERE id = ?", (email_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def put_email(self, email_id: str, thread_id: str, email: dict[str, str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO messages (id, thread_id, email) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET email = excluded.email",
+                (email_id, thread_id or '', json.dumps(email)))
+
+    def add_labels(self, email_id: str, thread_id: str, label_ids: list[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO messages (id, thread_id) VALUES (?, ?)",
+                               (email_id, thread_id or ''))
+            self._conn.executemany("INSERT OR IGNORE INTO message_labels (message_id, label_id) VALUES (?, ?)",
+                                   [(email_id, label_id) for label_id in label_ids])
+
+    def remove_labels(self, email_id: str, label_ids: list[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM message_labels WHERE message_id = ? AND label_id = ?",
+                                   [(email_id, label_id) for label_id in label_ids])
+
+    def delete(self, email_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE id = ?", (email_id,))
+            self._conn.execute("DELETE FROM message_labels WHERE message_id = ?", (email_id,))
+
+    def has_unread_listing(self) -> bool:
+        """Whether a full unread listing has been stored and can be served locally"""
+        with self._lock:
+            return self._get_state('unread_listed') == '1'
+
+    def replace_unread_listing(self, messages: list[dict[str, str]], history_id: str) -> None:
+        """Reset all labels to a fresh unread listing taken at history_id (newest message first)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM message_labels")
+            # Insert oldest first so that rowid order matches Gmail's newest-first order
+            for message in reversed(messages):
+                self._conn.execute("INSERT OR IGNORE INTO messages (id, thread_id) VALUES (?, ?)",
+                                   (message['id'], message.get('threadId', '')))
+                self._conn.executemany("INSERT OR IGNORE INTO message_labels (message_id, label_id) VALUES (?, ?)",
+                                       [(message['id'], label_id) for label_id in UNREAD_LABELS])
+            self._set_state('history_id', str(history_id))
+            self._set_state('unread_listed', '1')
+
+    def unread_messages(self) -> list[dict[str, str]]:
+        """Return cached messages carrying all unread listing labels, newest first"""
+        placeholders = ', '.join('?' for _ in UNREAD_LABELS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, thread_id FROM messages WHERE id IN ("
+                f"SELECT message_id FROM message_labels WHERE label_id IN ({placeholders}) "
+                f"GROUP BY message_id HAVING COUNT(*) = ?) ORDER BY rowid DESC",
+                (*UNREAD_LABELS, len(UNREAD_LABELS))).fetchall()
+        return [{'id': row[0], 'threadId': row[1]} for row in rows]
+
 
 class GmailService:
     def __init__(self,
                  creds_file_path: str,
                  token_path: str,
-                 scopes: list[str] = ['https://www.googleapis.com/auth/gmail.modify']):
+                 scopes: list[str] = ['https://www.googleapis.com/auth/gmail.modify'],
+                 http_factory: Callable[[], Any] | None = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 request_timeout: float | None = DEFAULT_REQUEST_TIMEOUT,
+                 cache_path: str | None = None):
+        """
+        http_factory optionally returns a ready-to-use httplib2-compatible HTTP object
+        (e.g. googleapiclient.http.HttpMockSequence for a local fake Gmail backend).
+        When given, no OAuth token is loaded and every request goes through it.
+
+        Blocking API calls run on a pool of max_workers threads so concurrent tool calls
+        overlap; each call is abandoned after request_timeout seconds (None waits forever).
+
+        With cache_path, parsed emails and unread listings are kept in a local SQLite cache
+        that is synced incrementally through the Gmail history API.
+
+        Nothing is loaded here: credentials and the API client are created by start() in
+        the background, or on first use, so the server can report readiness immediately."""
         logger.info(f"Initializing GmailService with creds file: {creds_file_path}")
         self.creds_file_path = creds_file_path
         self.token_path = token_path
         self.scopes = scopes
-        self.token = self._get_token()
-        logger.info("Token retrieved successfully")
-        self.service = self._get_service()
-        logger.info("Gmail service initialized")
-        self.user_email = self._get_user_email()
-        logger.info(f"User email retrieved: {self.user_email}")
+        self.http_factory = http_factory
+        self.request_timeout = request_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail-api')
+        self._thread_local = threading.local()
+        self.cache = MessageCache(cache_path) if cache_path else None
+        # Emails read with defer_mark_as_read, waiting to be marked as read in one batch
+        self._pending_reads: dict[str, None] = {}
+        self._flush_task: asyncio.Task | None = None
+        self.token = None
+        self._service = None
+        self._service_lock = threading.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        self.user_email = None
 
     def _get_token(self) -> Credentials:
         """Get or refresh Google API token"""
@@ -144,26 +501,104 @@ class GmailService:
                 flow = InstalledAppFlow.from_client_secrets_file(self.creds_file_path, self.scopes)
                 token = flow.run_local_server(port=0)
 
-            with open(self.token_path, 'w') as token_file:
-                token_file.write(token.to_json())
-                logger.info(f'Token saved to {self.token_path}')
+            self._save_token(token)
 
         return token
 
+    def _save_token(self, token: Credentials) -> None:
+        with open(self.token_path, 'w') as token_file:
+            token_file.write(token.to_json())
+            logger.info(f'Token saved to {self.token_path}')
+
+    async def _refresh_token_before_expiry(self) -> None:
+        """Keep the access token fresh so that no tool call pays for a refresh round trip"""
+        loop = asyncio.get_running_loop()
+        while self.token.expiry is not None:
+            # google-auth stores expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            delay = (self.token.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN
+            await asyncio.sleep(max(delay, 0))
+            try:
+                await loop.run_in_executor(self._executor, self.token.refresh, Request())
+                self._save_token(self.token)
+                logger.info('Token refreshed ahead of expiry')
+            except Exception as e:
+                logger.error(f'Background token refresh failed: {e}')
+                await asyncio.sleep(TOKEN_REFRESH_RETRY_DELAY)
+
+    def _new_http(self) -> Any:
+        """Create an authorized HTTP object; httplib2 is not thread-safe so each worker needs its own"""
+        if self.http_factory is not None:
+            return self.http_factory()
+        return AuthorizedHttp(self.token, http=httplib2.Http())
+
+    def _thread_http(self) -> Any:
+        """Return the HTTP object owned by the current worker thread, creating it on first use"""
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = self._thread_local.http = self._new_http()
+        return http
+
+    async def _run_blocking(self, func: Callable[[], Any], timeout: float | None = None) -> Any:
+        """Run a blocking call on the API thread pool, raising asyncio.TimeoutError after the timeout"""
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self._executor, func)
+        return await asyncio.wait_for(call, timeout if timeout is not None else self.request_timeout)
+
+    async def _execute(self, request: Any, timeout: float | None = None) -> Any:
+        """Execute a googleapiclient request without blocking the event loop"""
+        return await self._run_blocking(lambda: request.execute(http=self._thread_http()), timeout)
+
     def _get_service(self) -> Any:
         """Initialize Gmail API service"""
+        if self.http_factory is None:
+            self.token = self._get_token()
+            logger.info("Token retrieved successfully")
         try:
-            service = build('gmail', 'v1', credentials=self.token)
+            # Use the discovery document bundled with googleapiclient instead of fetching it
+            service = build('gmail', 'v1', http=self._new_http(),
+                            static_discovery=True, cache_discovery=False)
+            logger.info("Gmail service initialized")
             return service
         except HttpError as error:
             logger.error(f'An error occurred building Gmail service: {error}')
             raise ValueError(f'An error occurred: {error}')
+
+    def _load_service(self) -> Any:
+        with self._service_lock:
+            if self._service is None:
+                self._service = self._get_service()
+            return self._service
+
+    @property
+    def service(self) -> Any:
+        """Gmail API service, loaded on first use unless start() already did"""
+        if self._service is None:
+            return self._load_service()
+        return self._service
+
+    async def start(self) -> None:
+        """Load credentials and the API client off the event loop, then keep the token fresh"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._load_service)
+        if self.token is not None and self.token.refresh_token and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_token_before_expiry())
+
+    async def close(self) -> None:
+        """Flush deferred work and stop background tasks"""
+        await self.flush_pending_reads()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self._executor.shutdown(wait=False)
     
-    def _get_user_email(self) -> str:
-        """Get user email address"""
-        profile = self.service.users().getProfile(userId='me').execute()
-        user_email = profile.get('emailAddress', '')
-        return user_email
+    async def _get_user_email(self) -> str:
+        """Get user email address, fetching the profile on first use"""
+        if self.user_email is None:
+            profile = await self._execute(self.service.users().getProfile(userId='me'))
+            self.user_email = profile.get('emailAddress', '')
+            logger.info(f"User email retrieved: {self.user_email}")
+        return self.user_email
     
     async def send_email(self, recipient_id: str, subject: str, message: str,) -> dict:
         """Creates and sends an email message"""
@@ -172,7 +607,7 @@ class GmailService:
             message_obj.set_content(message)
             
             message_obj['To'] = recipient_id
-            message_obj['From'] = self.user_email
+            message_obj['From'] = await self._get_user_email()
             message_obj['Subject'] = subject
 
             encoded_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
@@ -180,14 +615,17 @@ class GmailService:
             
             logger.debug(f"Sending email to {recipient_id} with subject '{subject}' and message: {message}")
 
-            send_message = await asyncio.to_thread(
-                self.service.users().messages().send(userId="me", body=create_message).execute
+            send_message = await self._execute(
+                self.service.users().messages().send(userId="me", body=create_message)
             )
             logger.info(f"Message sent: {send_message['id']}")
             return {"status": "success", "message_id": send_message["id"]}
         except HttpError as error:
             logger.error(f"Failed to send mail, An error occurred sending email: {error}")
             return {"status": "error", "error_message": str(error)}
+        except asyncio.TimeoutError:
+            logger.error("Failed to send mail, the request timed out")
+            return {"status": "error", "error_message": "Gmail request timed out"}
 
     async def open_email(self, email_id: str) -> str:
         """Opens email in browser given ID."""
@@ -198,98 +636,329 @@ class GmailService:
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
 
-    async def get_unread_emails(self) -> list[dict[str, str]]| str:
+    async def get_unread_emails(self, include_content: bool = False,
+                                max_workers: int = MAX_BATCH_WORKERS) -> list[dict[str, str]]| str:
         """
         Retrieves unread messages from mailbox.
-        Returns list of messsage IDs in key 'id'."""
+        Returns list of messsage IDs in key 'id'.
+        With include_content, each entry also carries the subject, from, to, date and content,
+        fetched in batches without marking the messages as read."""
         try:
-            user_id = 'me'
-            query = 'in:inbox is:unread category:primary'
-
-            response = self.service.users().messages().list(userId=user_id,
-                                                        q=query).execute()
-            messages = []
-            if 'messages' in response:
-                messages.extend(response['messages'])
-
-            while 'nextPageToken' in response:
-                page_token = response['nextPageToken']
-                response = self.service.users().messages().list(userId=user_id, q=query,
-                                                    pageToken=page_token).execute()
-                messages.extend(response['messages'])
+            if self.cache is not None and await self._sync_cache() and self.cache.has_unread_listing():
+                messages = self.cache.unread_messages()
+                logger.info(f"Serving {len(messages)} unread emails from cache")
+            else:
+                messages = await self._list_unread_emails()
+
+            if include_content:
+                return await self._fetch_messages(messages, max_workers)
             return messages
 
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
+
+    async def _list_unread_emails(self) -> list[dict[str, str]]:
+        """List unread message IDs page by page, recording the listing in the cache if enabled"""
+        user_id = 'me'
+        if self.cache is not None:
+            # Take the historyId before listing so that changes made meanwhile are replayed by the next sync
+            profile = await self._execute(self.service.users().getProfile(userId=user_id))
+            history_id = profile['historyId']
+
+        response = await self._execute(self.service.users().messages().list(userId=user_id,
+                                                                            q=UNREAD_QUERY))
+        messages = []
+        if 'messages' in response:
+            messages.extend(response['messages'])
 
-    async def read_email(self, email_id: str) -> dict[str, str]| str:
-        """Retrieves email contents including to, from, subject, and contents."""
+        while 'nextPageToken' in response:
+            page_token = response['nextPageToken']
+            response = await self._execute(self.service.users().messages().list(userId=user_id, q=UNREAD_QUERY,
+                                                                                pageToken=page_token))
+            messages.extend(response.get('messages', []))
+
+        if self.cache is not None:
+            self.cache.replace_unread_listing(messages, history_id)
+        return messages
+
+    async def _sync_cache(self) -> bool:
+        """
+        Apply mailbox changes since the cached historyId.
+        Returns False when the cache has no usable historyId and must be rebuilt from a full listing."""
+        start_history_id = self.cache.get_history_id()
+        if start_history_id is None:
+            return False
+
+        records = []
+        params = {'userId': 'me', 'startHistoryId': start_history_id}
         try:
-            msg = self.service.users().messages().get(userId="me", id=email_id, format='raw').execute()
-            email_metadata = {}
-
-            # Decode the base64URL encoded raw content
-            raw_data = msg['raw']
-            decoded_data = urlsafe_b64decode(raw_data)
-
-            # Parse the RFC 2822 email
-            mime_message = message_from_bytes(decoded_data)
-
-            # Extract the email body
-            body = None
-            if mime_message.is_multipart():
-                for part in mime_message.walk():
-                    # Extract the text/plain part
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
+            while True:
+                response = await self._execute(self.service.users().history().list(**params))
+                records.extend(response.get('history', []))
+                if 'nextPageToken' not in response:
+                    break
+                params['pageToken'] = response['nextPageToken']
+        except HttpError as error:
+            # Gmail only keeps history for a limited time and answers 404 for expired historyIds
+            if error.resp.status == 404:
+                logger.info("Cached historyId expired, rebuilding message cache")
+                return False
+            raise
+
+        for record in records:
+            for change in record.get('messagesAdded', []):
+                message = change['message']
+                self.cache.add_labels(message['id'], message.get('threadId', ''), message.get('labelIds', []))
+            for change in record.get('labelsAdded', []):
+                message = change['message']
+                self.cache.add_labels(message['id'], message.get('threadId', ''), change.get('labelIds', []))
+            for change in record.get('labelsRemoved', []):
+                self.cache.remove_labels(change['message']['id'], change.get('labelIds', []))
+            for change in record.get('messagesDeleted', []):
+                self.cache.delete(change['message']['id'])
+
+        self.cache.set_history_id(response.get('historyId', start_history_id))
+        logger.info(f"Message cache synced with {len(records)} history records")
+        return True
+
+    async def _fetch_messages(self, messages: list[dict[str, str]], max_workers: int) -> list[dict[str, str]]:
+        """Fetch and parse the given messages using batch requests spread over a bounded worker pool"""
+        fetched = {}
+        semaphore = asyncio.Semaphore(max_workers)
+
+        if self.cache is not None:
+            for message in messages:
+                email_metadata = self.cache.get_email(message['id'])
+                if email_metadata is not None:
+                    fetched[message['id']] = {**email_metadata, 'id': message['id'],
+                                              'threadId': message.get('threadId', '')}
+            missing = [message for message in messages if message['id'] not in fetched]
+        else:
+            missing = messages
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                fetched[request_id] = {'id': request_id, 'error': str(exception)}
+                return
+            try:
+                email_metadata = parse_message_payload(response)
+            except Exception as e:
+                logger.error(f"Failed to parse email {request_id}: {e}")
+                email_metadata = {'error': f"Failed to parse email: {e}"}
+            if self.cache is not None and 'error' not in email_metadata and not email_metadata.get('truncated'):
+                self.cache.put_email(response['id'], response.get('threadId', ''), email_metadata)
+            email_metadata['id'] = response['id']
+            email_metadata['threadId'] = response.get('threadId', '')
+            fetched[request_id] = email_metadata
+
+        async def run_batch(chunk):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message in chunk:
+                batch.add(self.service.users().messages().get(userId='me', id=message['id'], format='full',
+                                                              fields=MESSAGE_FIELDS),
+                          request_id=message['id'])
+            async with semaphore:
+                await self._run_blocking(lambda: batch.execute(http=self._thread_http()))
+
+        chunks = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+        await asyncio.gather(*(run_batch(chunk) for chunk in chunks))
+        logger.info(f"Fetched {len(fetched)} emails in {len(chunks)} batch requests")
+        return [fetched[message['id']] for message in messages if message['id'] in fetched]
+
+    async def read_email(self, email_id: str, defer_mark_as_read: bool = False,
+                         max_body_bytes: int = MAX_BODY_BYTES) -> dict[str, Any]| str:
+        """
+        Retrieves email contents including to, from, subject, and contents.
+        The body is cut after max_body_bytes and attachments are only listed, see get_attachment.
+        With defer_mark_as_read, the email is marked as read shortly afterwards
+        together with other deferred reads instead of with its own request."""
+        try:
+            email_metadata = self.cache.get_email(email_id) if self.cache is not None else None
+            if email_metadata is not None:
+                # The cache holds full bodies, so the limit of this read still applies
+                email_metadata = truncate_body(email_metadata, max_body_bytes)
             else:
-                # For non-multipart messages
-                body = mime_message.get_payload(decode=True).decode()
-            email_metadata['content'] = body
-            
-            # Extract metadata
-            email_metadata['subject'] = decode_mime_header(mime_message.get('subject', ''))
-            email_metadata['from'] = mime_message.get('from','')
-            email_metadata['to'] = mime_message.get('to','')
-            email_metadata['date'] = mime_message.get('date','')
+                msg = await self._execute(self.service.users().messages().get(userId="me", id=email_id, format='full',
+                                                                              fields=MESSAGE_FIELDS))
+                email_metadata = parse_message_payload(msg, max_body_bytes)
+                # Truncated bodies are not cached so that a later read with a higher limit gets the full text
+                if self.cache is not None and not email_metadata.get('truncated'):
+                    self.cache.put_email(email_id, msg.get('threadId', ''), email_metadata)
             
             logger.info(f"Email read: {email_id}")
             
             # We want to mark email as read once we read it
-            await self.mark_email_as_read(email_id)
+            if defer_mark_as_read:
+                await self._defer_mark_as_read(email_id)
+            else:
+                await self.mark_email_as_read(email_id)
 
             return email_metadata
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
         
+    async def get_attachment(self, email_id: str, attachment_id: str) -> dict[str, Any]| str:
+        """Retrieves the base64URL encoded contents of an email attachment."""
+        try:
+            attachment = await self._execute(self.service.users().messages().attachments().get(
+                userId="me", messageId=email_id, id=attachment_id))
+            logger.info(f"Attachment read from email: {email_id}")
+            return {'size': attachment.get('size', 0), 'data': attachment['data']}
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
+
     async def trash_email(self, email_id: str) -> str:
         """Moves email to trash given ID."""
         try:
-            self.service.users().messages().trash(userId="me", id=email_id).execute()
+            await self._execute(self.service.users().messages().trash(userId="me", id=email_id))
+            if self.cache is not None:
+                self.cache.remove_labels(email_id, ['INBOX'])
             logger.info(f"Email moved to trash: {email_id}")
             return "Email moved to trash successfully."
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
         
     async def mark_email_as_read(self, email_id: str) -> str:
         """Marks email as read given ID."""
         try:
-            self.service.users().messages().modify(userId="me", id=email_id, body={'removeLabelIds': ['UNREAD']}).execute()
+            await self._execute(self.service.users().messages().modify(userId="me", id=email_id, body={'removeLabelIds': ['UNREAD']}))
+            if self.cache is not None:
+                self.cache.remove_labels(email_id, ['UNREAD'])
             logger.info(f"Email marked as read: {email_id}")
             return "Email marked as read."
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
-  
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
+
+    async def _batch_modify(self, email_ids: list[str],
+                            add_label_ids: list[str] | None = None,
+                            remove_label_ids: list[str] | None = None) -> None:
+        """Apply label changes to many emails using as few batchModify calls as possible"""
+        for i in range(0, len(email_ids), BATCH_MODIFY_LIMIT):
+            body = {'ids': email_ids[i:i + BATCH_MODIFY_LIMIT]}
+            if add_label_ids:
+                body['addLabelIds'] = add_label_ids
+            if remove_label_ids:
+                body['removeLabelIds'] = remove_label_ids
+            await self._execute(self.service.users().messages().batchModify(userId="me", body=body))
+
+    async def batch_mark_as_read(self, email_ids: list[str]) -> str:
+        """Marks many emails as read given their IDs."""
+        email_ids = list(dict.fromkeys(email_ids))
+        try:
+            await self._batch_modify(email_ids, remove_label_ids=['UNREAD'])
+            if self.cache is not None:
+                for email_id in email_ids:
+                    self.cache.remove_labels(email_id, ['UNREAD'])
+            logger.info(f"{len(email_ids)} emails marked as read")
+            return f"{len(email_ids)} emails marked as read."
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
+
+    async def batch_trash_emails(self, email_ids: list[str]) -> str:
+        """Moves many emails to trash given their IDs."""
+        email_ids = list(dict.fromkeys(email_ids))
+        try:
+            # Applying the TRASH label is what users.messages.trash does; batchDelete would delete permanently
+            await self._batch_modify(email_ids, add_label_ids=['TRASH'], remove_label_ids=['INBOX'])
+            if self.cache is not None:
+                for email_id in email_ids:
+                    self.cache.remove_labels(email_id, ['INBOX'])
+            logger.info(f"{len(email_ids)} emails moved to trash")
+            return f"{len(email_ids)} emails moved to trash successfully."
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+        except asyncio.TimeoutError:
+            return "The Gmail request timed out."
+
+    async def _defer_mark_as_read(self, email_id: str) -> None:
+        """Queue an email to be marked as read by the next batched flush"""
+        self._pending_reads[email_id] = None
+        if len(self._pending_reads) >= BATCH_MODIFY_LIMIT:
+            await self.flush_pending_reads()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_pending_reads_later())
+
+    async def _flush_pending_reads_later(self) -> None:
+        await asyncio.sleep(READ_FLUSH_DELAY)
+        self._flush_task = None
+        await self.flush_pending_reads()
+
+    async def flush_pending_reads(self) -> str:
+        """Marks all emails queued by deferred reads as read."""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._pending_reads:
+            return "No pending emails to mark as read."
+        email_ids = list(self._pending_reads)
+        self._pending_reads.clear()
+        result = await self.batch_mark_as_read(email_ids)
+        logger.info(f"Flushed deferred reads: {result}")
+        return result
+
+def log_startup_failure(task: asyncio.Task) -> None:
+    """Log a failed background GmailService.start() even if no tool call ever awaits it"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Gmail service startup failed: {task.exception()}")
+
+async def run_sse_server(server: Server, init_options: InitializationOptions, host: str, port: int) -> None:
+    """
+    Serve MCP over SSE so that agents can attach to one long-lived, already
+    authenticated server instead of spawning a new process for every run.
+    Every client connection gets its own session on the shared server.
+    """
+    from mcp.server.sse import SseServerTransport
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+    import uvicorn
+
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, init_options)
+        return Response()
+
+    app = Starlette(routes=[
+        Route("/sse", endpoint=handle_sse),
+        Mount("/messages/", app=sse.handle_post_message),
+    ])
+    logger.info(f"Serving MCP over SSE at http://{host}:{port}/sse")
+    await uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="info")).serve()
+
 async def main(creds_file_path: str,
-               token_path: str):
+               token_path: str,
+               max_workers: int = DEFAULT_MAX_WORKERS,
+               request_timeout: float | None = DEFAULT_REQUEST_TIMEOUT,
+               cache_path: str | None = None,
+               transport: str = 'stdio',
+               host: str = DEFAULT_HOST,
+               port: int = DEFAULT_PORT):
     
     logger.info("Initializing GmailService")
-    gmail_service = GmailService(creds_file_path, token_path)
+    gmail_service = GmailService(creds_file_path, token_path,
+                                 max_workers=max_workers,
+                                 request_timeout=request_timeout,
+                                 cache_path=cache_path)
     server = Server("gmail")
+    startup = asyncio.create_task(gmail_service.start())
+    startup.add_done_callback(log_startup_failure)
 
-    # Print startup signal
-    print("SERVER_READY", flush=True)
+    # Print startup signal; stdout carries the MCP protocol in stdio mode, so use stderr
+    print("SERVER_READY", file=sys.stderr, flush=True)
 
     @server.list_prompts()
     async def list_prompts() -> list[types.Prompt]:
@@ -392,7 +1061,12 @@ async def main(creds_file_path: str,
                 description="Retrieve unread emails",
                 inputSchema={
                     "type": "object",
-                    "properties": {},
+                    "properties": {
+                        "include_content": {
+                            "type": "boolean",
+                            "description": "Also fetch subject, sender, date and body of every unread email in bulk",
+                        },
+                    },
                     "required": []
                 },
             ),
@@ -403,10 +1077,31 @@ async def main(creds_file_path: str,
                     "type": "object",
                     "properties": {
                         "email_id": {"type": "string", "description": "Email ID to read"},
+                        "defer_mark_as_read": {
+                            "type": "boolean",
+                            "description": "Mark the email as read in a later batch together with other reads",
+                        },
+                        "max_body_bytes": {
+                            "type": "integer",
+                            "description": f"Maximum size of the returned body in bytes (default {MAX_BODY_BYTES})",
+                        },
                     },
                     "required": ["email_id"],
                 },
             ),
+            types.Tool(
+                name="get-email-attachment",
+                description="Download an attachment listed by read-email",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "email_id": {"type": "string", "description": "Email ID the attachment belongs to"},
+                        "attachment_id": {"type": "string", "description": "Attachment ID returned by read-email"},
+                        "mime_type": {"type": "string", "description": "MIME type of the attachment"},
+                    },
+                    "required": ["email_id", "attachment_id"],
+                },
+            ),
             types.Tool(
                 name="mark-email-as-read",
                 description="Marks a specific email as read",
@@ -418,6 +1113,36 @@ async def main(creds_file_path: str,
                     "required": ["email_id"],
                 },
             ),
+            types.Tool(
+                name="batch-mark-as-read",
+                description="Marks many emails as read at once",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "email_ids": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Email IDs to mark as read",
+                        },
+                    },
+                    "required": ["email_ids"],
+                },
+            ),
+            types.Tool(
+                name="batch-trash-emails",
+                description="Moves many emails to trash at once. Requires confirmation.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "email_ids": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Email IDs to trash",
+                        },
+                    },
+                    "required": ["email_ids"],
+                },
+            ),
             types.Tool(
                 name="open-email",
                 description="Open the given email in a browser window",
@@ -451,6 +1176,12 @@ async def main(creds_file_path: str,
                             "items": {"type": "number"},  # <- more portable and works
                             "description": "List of numbers to exponentiate and sum",
                         },
+                        "mode": {
+                            "type": "string",
+                            "enum": list(EXP_SUM_MODES),
+                            "description": "auto (default): a float, or a decimal string when the sum overflows a float; "
+                                           "log: the natural log of the sum; decimal: always a decimal string",
+                        },
                     },
                     "required": ["int_list"],
                 },
@@ -461,6 +1192,9 @@ async def main(creds_file_path: str,
     async def handle_call_tool(
         name: str, arguments: dict | None
     ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+        # Credentials and the API client are loaded in the background after startup
+        if name not in ("strings_to_chars_to_int", "int_list_to_exponential_sum"):
+            await startup
 
         if name == "send-email":
             recipient = arguments.get("recipient_id")
@@ -490,7 +1224,8 @@ async def main(creds_file_path: str,
             return [types.TextContent(type="text", text=response_text)]
 
         if name == "get-unread-emails":
-            unread_emails = await gmail_service.get_unread_emails()
+            include_content = bool((arguments or {}).get("include_content", False))
+            unread_emails = await gmail_service.get_unread_emails(include_content=include_content)
             return [types.TextContent(type="text", text=str(unread_emails),artifact={"type": "json", "data": unread_emails} )]
         
         if name == "read-email":
@@ -498,9 +1233,33 @@ async def main(creds_file_path: str,
             if not email_id:
                 raise ValueError("Missing email ID parameter")
                 
-            retrieved_email = await gmail_service.read_email(email_id)
+            defer_mark_as_read = bool(arguments.get("defer_mark_as_read", False))
+            max_body_bytes = int(arguments.get("max_body_bytes") or MAX_BODY_BYTES)
+            retrieved_email = await gmail_service.read_email(email_id, defer_mark_as_read=defer_mark_as_read,
+                                                             max_body_bytes=max_body_bytes)
             return [types.TextContent(type="text", text=str(retrieved_email),artifact={"type": "dictionary", "data": retrieved_email} )]
 
+        if name == "get-email-attachment":
+            email_id = arguments.get("email_id")
+            if not email_id:
+                raise ValueError("Missing email ID parameter")
+            attachment_id = arguments.get("attachment_id")
+            if not attachment_id:
+                raise ValueError("Missing attachment ID parameter")
+
+            attachment = await gmail_service.get_attachment(email_id, attachment_id)
+            if isinstance(attachment, str):
+                return [types.TextContent(type="text", text=attachment)]
+            blob = base64.b64encode(urlsafe_b64decode(attachment['data'])).decode()
+            return [types.EmbeddedResource(
+                type="resource",
+                resource=types.BlobResourceContents(
+                    uri=f"gmail://messages/{email_id}/attachments/{attachment_id}",
+                    mimeType=arguments.get("mime_type") or "application/octet-stream",
+                    blob=blob,
+                ),
+            )]
+
         if name == "open-email":
             email_id = arguments.get("email_id")
             if not email_id:
@@ -524,6 +1283,22 @@ async def main(creds_file_path: str,
                 
             msg = await gmail_service.mark_email_as_read(email_id)
             return [types.TextContent(type="text", text=str(msg))]
+
+        if name == "batch-mark-as-read":
+            email_ids = arguments.get("email_ids")
+            if not email_ids:
+                raise ValueError("Missing email IDs parameter")
+
+            msg = await gmail_service.batch_mark_as_read(email_ids)
+            return [types.TextContent(type="text", text=str(msg))]
+
+        if name == "batch-trash-emails":
+            email_ids = arguments.get("email_ids")
+            if not email_ids:
+                raise ValueError("Missing email IDs parameter")
+
+            msg = await gmail_service.batch_trash_emails(email_ids)
+            return [types.TextContent(type="text", text=str(msg))]
         elif name == "strings_to_chars_to_int":
             string = arguments.get("string")
             if not string:
@@ -534,25 +1309,30 @@ async def main(creds_file_path: str,
             int_list = arguments.get("int_list")
             if not int_list:
                 raise ValueError("Missing int_list parameter")
-            result = int_list_to_exponential_sum(int_list)
+            result = int_list_to_exponential_sum(int_list, arguments.get("mode", "auto"))
             return [types.TextContent(type="text", text=str(result))]
         else:
             logger.error(f"Unknown tool: {name}")
             raise ValueError(f"Unknown tool: {name}")
 
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="gmail",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
+    init_options = InitializationOptions(
+        server_name="gmail",
+        server_version="0.1.0",
+        capabilities=server.get_capabilities(
+            notification_options=NotificationOptions(),
+            experimental_capabilities={},
+        ),
+    )
+
+    try:
+        if transport == 'sse':
+            await run_sse_server(server, init_options, host, port)
+        else:
+            async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, init_options)
+    finally:
+        # Do not lose read markers still waiting for their batch
+        await gmail_service.close()
 
 if __name__ == "__main__":
     try:    
@@ -564,12 +1344,36 @@ if __name__ == "__main__":
         parser.add_argument('--token-path',
                         required=True,
                        help='File location to store and retrieve access and refresh tokens for application')
+        parser.add_argument('--max-workers',
+                        type=int,
+                        default=DEFAULT_MAX_WORKERS,
+                       help='Number of threads used to run Gmail API calls concurrently')
+        parser.add_argument('--request-timeout',
+                        type=float,
+                        default=DEFAULT_REQUEST_TIMEOUT,
+                       help='Seconds to wait for a single Gmail API call')
+        parser.add_argument('--cache-path',
+                        default=None,
+                       help='SQLite file used to cache emails and unread listings between calls')
+        parser.add_argument('--transport',
+                        choices=['stdio', 'sse'],
+                        default='stdio',
+                       help='Serve over stdio for a single client, or over SSE as a persistent server')
+        parser.add_argument('--host',
+                        default=DEFAULT_HOST,
+                       help='Host to listen on with the SSE transport')
+        parser.add_argument('--port',
+                        type=int,
+                        default=DEFAULT_PORT,
+                       help='Port to listen on with the SSE transport')
     
         args = parser.parse_args()
 
-        asyncio.run(main(args.creds_file_path, args.token_path))
+        asyncio.run(main(args.creds_file_path, args.token_path,
+                         args.max_workers, args.request_timeout, args.cache_path,
+                         args.transport, args.host, args.port))
     except Exception as e:
         import traceback
         logger.error("FATAL ERROR IN SERVER:")
         logger.error(traceback.format_exc())
-        print("FATAL SERVER ERROR", flush=True)    
\ No newline at end of file
+        print("FATAL SERVER ERROR", file=sys.stderr, flush=True)    
\ No newline at end of file
@@ -2,13 +2,19 @@ import os
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
-from mcp.server.fastmcp import FastMCP
+from mcp.client.sse import sse_client
 import asyncio
 import google.generativeai as genai
-from concurrent.futures import TimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from functools import partial
 import traceback
 import time
+import hashlib
+import sqlite3
+import threading
+import gzip
+from collections import OrderedDict, deque
+import random
 import logging
 from datetime import datetime
 import win32gui
@@ -21,8 +27,8 @@ from pywinauto import Application
 from mcp.types import TextContent
 import argparse
 import sys
-import multiprocessing
-import subprocess
+import json
+from contextlib import asynccontextmanager
 
 # Configure logging
 log_dir = "logs"
@@ -56,238 +62,668 @@ recipient_email = os.getenv("GMAIL_RECIPIENT_EMAIL")
 print(f"Recipient email loaded: {'Yes' if recipient_email else 'No'}")  # Will print Yes/No without exposing the email
 
 max_iterations = 3
-last_response = None
-iteration = 0
-iteration_response = []
+# Prompt size limits for the agent conversation
+PROMPT_TOKEN_BUDGET = 4000  # Estimated tokens allowed in one prompt
+RECENT_STEPS = 3            # Most recent steps always sent verbatim
+STEP_SUMMARY_CHARS = 200    # Older steps are truncated to this many characters
+# Number of queries run at the same time by the batch runner
+DEFAULT_CONCURRENCY = 8
 
-async def generate_with_timeout(client, prompt, timeout=30):
-    """Generate content with a timeout"""
+# Tools whose arguments are rewritten from earlier results in the same LLM response;
+# they run only after every earlier call has finished
+BARRIER_TOOLS = {"send-email"}
+
+# Appended to the system prompt when tools are also passed as native function declarations
+NATIVE_CALLING_NOTE = """
+    Prefer calling the tools directly through function calling. FUNCTION_CALL lines are still accepted.
+    """
+
+DEFAULT_QUERY = """Find the ASCII values of characters in INDIA, calculate the sum of exponentials of those values, and send the results via email."""
+
+# Models tried in order, each with its own retries, until one answers within the deadline
+LLM_MODELS = [name.strip() for name in os.getenv("GEMINI_MODELS", "gemini-1.5-pro,gemini-1.5-flash").split(",") if name.strip()]
+LLM_MAX_WORKERS = 4         # Threads running blocking generate_content calls
+LLM_ATTEMPT_TIMEOUT = 20    # Seconds a single model call may take before moving to the next model
+LLM_RETRIES = 2             # Extra attempts per model after a failed call
+LLM_BACKOFF_BASE = 0.5      # First retry waits up to this many seconds, doubling per attempt
+LLM_BACKOFF_MAX = 8.0
+
+LLM_CACHE_MAX_ENTRIES = 256        # Responses kept in memory
+LLM_CACHE_MAX_DISK_ENTRIES = 10000 # Responses kept in the SQLite file
+
+class CachedResponse:
+    """An LLM response reduced to what the agent reads: its text and native function calls"""
+
+    def __init__(self, text, function_calls=None):
+        self.text = text
+        self.function_calls = [tuple(call) for call in function_calls or []]
+
+    def to_json(self):
+        return json.dumps({"text": self.text, "function_calls": self.function_calls})
+
+    @classmethod
+    def from_json(cls, data):
+        item = json.loads(data)
+        return cls(item["text"], item["function_calls"])
+
+class ResponseCache:
+    """
+    LRU cache of LLM responses keyed by model chain, generation parameters and prompt hash.
+    Entries live in memory and, when path is given, in a SQLite file shared across runs.
+    Entries older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, path=None, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=None,
+                 max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(models, prompt, generation_config=None, tools=None):
+        """Hash everything that affects the response into a cache key"""
+        key_data = json.dumps({
+            "models": list(models),
+            "generation_config": generation_config,
+            "tools": tools,
+            "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, response FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and not self._expired(row[0]):
+                    entry = (row[0], CachedResponse.from_json(row[1]))
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, response):
+        """Store a CachedResponse under key"""
+        created = time.time()
+        with self._lock:
+            self._remember(key, (created, response))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, created, response) VALUES (?, ?, ?)",
+                    (key, created, response.to_json())
+                )
+                self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key, entry):
+        """Add an entry to the in-memory LRU, evicting the least recently used ones"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drop expired rows and keep at most max_disk_entries newest rows on disk"""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM llm_responses WHERE created < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM llm_responses WHERE key NOT IN "
+            "(SELECT key FROM llm_responses ORDER BY created DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self):
+        """Hit/miss counters and the number of entries held in memory"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class LLMClient:
+    """
+    Gemini client that builds each model once and runs calls on a bounded executor.
+    Failed calls are retried with exponential backoff and full jitter, then the next
+    model in the chain is tried; all attempts share one total deadline. With a ResponseCache
+    identical requests are answered from the cache without calling the model.
+    """
+
+    def __init__(self, models=LLM_MODELS, model_factory=None, max_workers=LLM_MAX_WORKERS,
+                 attempt_timeout=LLM_ATTEMPT_TIMEOUT, retries=LLM_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 cache=None, generation_config=None):
+        self.models = list(models)
+        self.cache = cache
+        self.generation_config = generation_config
+        self.model_factory = model_factory or genai.GenerativeModel
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._model_cache = {}
+
+    def _model(self, model_name):
+        """Return the cached model object for model_name"""
+        if model_name not in self._model_cache:
+            self._model_cache[model_name] = self.model_factory(model_name)
+        return self._model_cache[model_name]
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff delay for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def generate(self, prompt, timeout=30, tools=None):
+        """
+        Generate content for prompt, trying the model chain until the total timeout expires.
+        tools holds Gemini function declarations for native function calling.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_error = None
+        request_options = {"tools": tools} if tools else {}
+        if self.generation_config:
+            request_options["generation_config"] = self.generation_config
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.models, prompt, self.generation_config, tools)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("LLM response served from cache")
+                return cached
+
+        for model_name in self.models:
+            model = self._model(model_name)
+            for attempt in range(self.retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"LLM generation did not complete within {timeout}s") from last_error
+                try:
+                    response = await asyncio.wait_for(
+                        loop.run_in_executor(self._executor, partial(model.generate_content, contents=prompt, **request_options)),
+                        timeout=min(self.attempt_timeout, remaining)
+                    )
+                    logger.info(f"LLM generation completed with {model_name} (attempt {attempt + 1})")
+                    if cache_key is not None:
+                        self.cache.put(cache_key, CachedResponse(get_response_text(response),
+                                                                 extract_function_calls(response)))
+                    return response
+                except asyncio.TimeoutError as e:
+                    # A slow model is unlikely to be faster on retry, move down the chain
+                    logger.error(f"LLM generation with {model_name} timed out")
+                    last_error = e
+                    break
+                except Exception as e:
+                    logger.error(f"Error in LLM generation with {model_name} (attempt {attempt + 1}): {e}")
+                    last_error = e
+                    if attempt < self.retries:
+                        delay = min(self._backoff(attempt), max(deadline - loop.time(), 0))
+                        await asyncio.sleep(delay)
+            logger.info(f"Giving up on {model_name}")
+
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise TimeoutError(f"LLM generation did not complete within {timeout}s") from last_error
+        raise last_error or RuntimeError("No LLM models configured")
+
+    def close(self):
+        """Shut down the executor used for model calls"""
+        self._executor.shutdown(wait=False)
+
+_llm_client = None
+
+def get_llm_client():
+    """Return the shared LLMClient, creating it on first use"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+def set_llm_client(client):
+    """Replace the shared LLM client, e.g. with a recording or replaying wrapper"""
+    global _llm_client
+    _llm_client = client
+
+def configure_llm_cache(llm_cache=None, ttl=None):
+    """
+    Attach a ResponseCache to the shared LLM client. llm_cache is "memory" for an
+    in-memory cache or the path of a SQLite file that keeps responses across runs.
+    """
+    if not llm_cache:
+        return None
+    cache = ResponseCache(None if llm_cache == "memory" else llm_cache, ttl=ttl)
+    get_llm_client().cache = cache
+    logger.info(f"LLM response cache enabled: {llm_cache}")
+    return cache
+
+async def generate_with_timeout(client, prompt, timeout=30, tools=None):
+    """Generate content with a timeout, using the shared client unless one is given"""
     logger.info("Starting LLM generation...")
+    client = client or get_llm_client()
     try:
-        # Convert the synchronous generate_content call to run in a thread
-        loop = asyncio.get_event_loop()
-        
-        # Use gemini-pro model without the 'models/' prefix
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: model.generate_content(contents=prompt)
-            ),
-            timeout=timeout
-        )
-        logger.info("LLM generation completed")
-        return response
+        return await client.generate(prompt, timeout=timeout, tools=tools)
     except TimeoutError:
         logger.error("LLM generation timed out!")
         raise
-    except Exception as e:
-        logger.error(f"Error in LLM generation: {e}")
-        # If first attempt fails, try with gemini-1.5-pro
-        try:
-            logger.info("Trying with gemini-1.5-pro...")
-            model = genai.GenerativeModel('gemini-1.5-pro') 
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None, 
-                    lambda: model.generate_content(contents=prompt)
-                ),
-                timeout=timeout
-            )
-            logger.info("LLM generation completed with alternate model")
-            return response
-        except Exception as e2:
-            logger.error(f"Error with alternate model: {e2}")
-            raise
-
-def reset_state():
-    """Reset all global variables to their initial state"""
-    global last_response, iteration, iteration_response
-    last_response = None
-    iteration = 0
-    iteration_response = []
-
-async def wait_for_server_startup(process, timeout=30):
-    """Wait for server to start up with timeout"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if process.returncode is not None:
-            # Get the error output from the process
-            stderr = await process.stderr.read()
-            error_msg = stderr.decode() if stderr else "No error message available"
-            logger.error(f"Server process error output: {error_msg}")
-            raise Exception(f"Server process exited with code {process.returncode}. Error: {error_msg}")
-        
-        # Check if the process is still running
-        if process.returncode is None:
-            # Try to read any output to see if server is ready
-            try:
-                stdout = await process.stdout.read(1024)
-                if stdout:
-                    output = stdout.decode()
-                    logger.debug(f"Server output: {output}")
-                    # Check for the SERVER_READY signal
-                    if "SERVER_READY" in output:
-                        logger.info("Server signaled it is ready")
-                        return
-            except Exception as e:
-                logger.debug(f"Error reading stdout: {e}")
-        
-        await asyncio.sleep(0.1)
-    
-    # If we get here, the server didn't start in time
-    logger.error("Server startup timed out")
-    # Try to terminate the process gracefully
+
+@asynccontextmanager
+async def connect_to_server(server_params, server_url=None):
+    """
+    Yield the MCP read/write streams. With server_url the agent attaches to a
+    persistent server started with --transport sse, so it pays neither process
+    startup nor OAuth; otherwise a server process is spawned over stdio.
+    """
+    if server_url:
+        logger.info(f"Attaching to persistent MCP server at {server_url}")
+        async with sse_client(server_url) as streams:
+            yield streams
+    else:
+        logger.info("Starting server process...")
+        async with stdio_client(server_params) as streams:
+            yield streams
+
+# JSON schema keys understood by Gemini function declarations; everything else
+# (title, default, additionalProperties, ...) is dropped
+GEMINI_SCHEMA_KEYS = ("type", "description", "properties", "required", "items", "enum")
+
+def resolve_optional_schema(schema):
+    """Collapse an Optional anyOf (e.g. `list[float] | None`) into the schema of its non-null option"""
+    options = [option for option in schema.get("anyOf", []) if option.get("type") != "null"]
+    if "type" in schema or len(options) != 1:
+        return schema
+    resolved = {key: value for key, value in schema.items() if key != "anyOf"}
+    resolved.update(options[0])
+    return resolved
+
+def to_gemini_schema(schema):
+    """Convert an MCP tool JSON schema into the subset Gemini accepts"""
+    schema = resolve_optional_schema(schema)
+    converted = {key: schema[key] for key in GEMINI_SCHEMA_KEYS if key in schema}
+    converted.setdefault("type", "string")
+    if "properties" in converted:
+        converted["properties"] = {name: to_gemini_schema(prop) for name, prop in converted["properties"].items()}
+    if converted["type"] == "object" and not converted.get("properties"):
+        # Gemini rejects objects without properties; free-form objects are sent as JSON text
+        converted = {"type": "string", "description": (converted.get("description", "") + " JSON object").strip()}
+    if converted["type"] == "array":
+        # Untyped list parameters (e.g. `int_list: list`) are numeric in these tools
+        converted["items"] = to_gemini_schema(converted.get("items") or {"type": "number"})
+    return converted
+
+def to_function_declarations(tools):
+    """Build Gemini function declarations from the MCP tool list"""
+    declarations = []
+    for tool in tools:
+        declaration = {"name": tool.name, "description": tool.description or tool.name}
+        schema = tool.inputSchema or {}
+        if schema.get("properties"):
+            declaration["parameters"] = to_gemini_schema({**schema, "type": "object"})
+        declarations.append(declaration)
+    return [{"function_declarations": declarations}]
+
+def _response_parts(response):
+    """Return the content parts of the first candidate, or [] if there are none"""
     try:
-        process.terminate()
-        await asyncio.sleep(1)
-        if process.returncode is None:
-            process.kill()
-    except Exception as e:
-        logger.error(f"Error terminating process: {e}")
-    raise TimeoutError("Server startup timed out")
+        return list(response.candidates[0].content.parts)
+    except (AttributeError, IndexError):
+        return []
 
-async def main():
-    reset_state()  # Reset at the start of main
-    logger.info("Starting main execution...")
+def _to_plain(value):
+    """Convert proto map/repeated values from function call args into dicts and lists"""
+    if isinstance(value, (str, bytes)):
+        return value
+    if hasattr(value, "items"):
+        return {key: _to_plain(item) for key, item in value.items()}
+    if hasattr(value, "__iter__"):
+        return [_to_plain(item) for item in value]
+    return value
+
+def get_response_text(response):
+    """Return the text of a response, which has no .text when it only holds function calls"""
     try:
-        # Create a single MCP server connection
-        logger.info("Establishing connection to MCP server...")
-        
-        # Verify environment variables
-        creds_file_path = os.getenv("GMAIL_CREDS_FILE_PATH")
-        token_path = os.getenv("GMAIL_TOKEN_PATH")
-        
-        if not creds_file_path or not token_path:
-            logger.error("Missing required environment variables: GMAIL_CREDS_FILE_PATH or GMAIL_TOKEN_PATH")
-            print("Error: Missing required environment variables. Please check your .env file.")
-            return
-            
-        if not os.path.exists(creds_file_path):
-            logger.error(f"Credentials file not found: {creds_file_path}")
-            print(f"Error: Credentials file not found: {creds_file_path}")
-            return
-            
-        logger.debug(f"Using credentials file: {creds_file_path}")
-        logger.debug(f"Using token file: {token_path}")
-        
-        # Get the current directory and add it to Python path
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        if current_dir not in sys.path:
-            sys.path.append(current_dir)
-        
-        # Create server parameters
-        server_params = StdioServerParameters(
-            command=sys.executable,
-            args=["-u", "server.py", 
-                  "--creds-file-path", creds_file_path,
-                  "--token-path", token_path]
-        )
+        return response.text
+    except (ValueError, AttributeError):
+        return "".join(getattr(part, "text", "") or "" for part in _response_parts(response))
 
-        # Start the server process
-        logger.info("Starting server process...")
-        server_process = subprocess.Popen(
-            [server_params.command] + server_params.args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1
-        )        
-        
-        # Wait for server to start
-        logger.info("Waiting for server to start...")
+def extract_function_calls(response):
+    """Return the native function calls in a response as (name, arguments) pairs"""
+    if isinstance(response, CachedResponse):
+        return list(response.function_calls)
+    calls = []
+    for part in _response_parts(response):
+        function_call = getattr(part, "function_call", None)
+        if function_call and function_call.name:
+            calls.append((function_call.name, _to_plain(function_call.args or {})))
+    return calls
+
+def estimate_tokens(text):
+    """Rough token count for Gemini prompts (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+class ConversationState:
+    """
+    Steps of one agent run, each stored once. render() builds the prompt from the
+    system prompt, the query and the steps: the most recent steps are kept verbatim,
+    older ones are truncated and, if the prompt is still over budget, dropped oldest first.
+    """
+
+    def __init__(self, system_prompt, query, token_budget=PROMPT_TOKEN_BUDGET,
+                 recent_steps=RECENT_STEPS, summary_chars=STEP_SUMMARY_CHARS):
+        self.system_prompt = system_prompt
+        self.query = query
+        self.token_budget = token_budget
+        self.recent_steps = recent_steps
+        self.summary_chars = summary_chars
+        self.steps = []
+
+    def add_step(self, step):
+        """Record the outcome of one tool call"""
+        self.steps.append(step)
+
+    def _summarize(self, step):
+        """Truncate an older step to summary_chars"""
+        if len(step) <= self.summary_chars:
+            return step
+        return step[:self.summary_chars] + "..."
+
+    def render(self):
+        """Return the prompt for the next LLM call together with its estimated token count"""
+        header = f"{self.system_prompt}\n\nQuery: {self.query}"
+        if not self.steps:
+            return header, estimate_tokens(header)
+
+        split = max(len(self.steps) - self.recent_steps, 0)
+        older = [self._summarize(step) for step in self.steps[:split]]
+        recent = self.steps[split:]
+
+        omitted = 0
+        while True:
+            history = older[omitted:] + recent
+            if omitted:
+                history = [f"({omitted} earlier steps omitted)"] + history
+            prompt = header + "\n\n" + " ".join(history) + "  What should I do next?"
+            tokens = estimate_tokens(prompt)
+            if tokens <= self.token_budget or omitted >= len(older):
+                return prompt, tokens
+            omitted += 1
+
+TRUE_STRINGS = {"true", "1", "yes", "y", "on"}
+FALSE_STRINGS = {"false", "0", "no", "n", "off"}
+
+def _to_integer(value):
+    """Coerce a value to int, accepting integral floats such as 3.0"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"Expected an integer, got {value}")
+        return int(value)
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        raise ValueError(f"Expected an integer, got {value!r}") from None
+    return _to_integer(number)
+
+def _to_number(value):
+    """Coerce a value to a number, keeping integers as int"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Expected a number, got {value!r}") from None
+
+def _to_boolean(value):
+    """Coerce a value to bool from a bool, number or yes/no style string"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_STRINGS:
+        return True
+    if text in FALSE_STRINGS:
+        return False
+    raise ValueError(f"Expected a boolean, got {value}")
+
+def _to_untyped(value):
+    """Coerce a value with no declared type, preferring numbers over strings"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return _to_number(value)
+    except ValueError:
+        return value.strip()
+
+def _to_object(value):
+    """Coerce an object, which a FUNCTION_CALL line or a Gemini string field carries as JSON"""
+    if isinstance(value, str):
         try:
-            while True:
-                output = server_process.stdout.readline()
-                if not output:
-                    # Check if process ended prematurely
-                    if server_process.poll() is not None:
-                        error = server_process.stderr.read()
-                        logger.error(f"Server failed to start: {error}")
-                        raise Exception(f"Server failed to start: {error}")
-                    continue
-                    
-                logger.info(f"Server output: {output.strip()}")
-                if "SERVER_READY" in output:
-                    logger.info("Server is ready")
-                    break
-        except Exception as e:
-            logger.error(f"Error waiting for server: {e}")
-            if server_process.poll() is None:
-                server_process.terminate()
-            return
+            value = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Expected a JSON object, got '{value.strip()}'") from e
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected an object, got {value!r}")
+    return value
 
-        # print(server_process.list_tools())
+SCALAR_COERCERS = {
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "string": str,
+    "object": _to_object,
+}
 
+def _split_array(value):
+    """Split an array from a FUNCTION_CALL line: a JSON array, or comma-separated values"""
+    value = value.strip()
+    if value.startswith('['):
         try:
-            # Create MCP client
-            logger.info("Creating stdio client...")
-            # Use the server parameters for stdio client
-            async with stdio_client(server_params) as (read, write):
-                logger.info("stdio_client created successfully")
-                
-                logger.info("Creating session...")
-                async with ClientSession(read, write) as session:
-                    logger.info("Session created, initializing...")
-                    try:
-                        # Add timeout for session initialization
-                        await asyncio.wait_for(session.initialize(), timeout=30)
-                        logger.info("Session initialized successfully")
-                    except asyncio.TimeoutError:
-                        logger.error("Session initialization timed out")
-                        print("Error: Session initialization timed out. The server might be unresponsive.")
-                        return
-                    except Exception as e:
-                        logger.error(f"Failed to initialize session: {str(e)}")
-                        print(f"Error: Failed to initialize session: {str(e)}")
-                        return
-                
-                    # Get available tools
-                    logger.info("Requesting tool list...")
-                    tools_result = await session.list_tools()
-                    tools = tools_result.tools
-                    logger.info(f"Successfully retrieved {len(tools)} tools")
-
-                    # Create system prompt with available tools
-                    logger.info("Creating system prompt...")
-                    logger.info(f"Number of tools: {len(tools)}")
+            parsed = json.loads(value)
+            if isinstance(parsed, list):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+    return [item.strip().strip('[]') for item in value.strip('[]').split(',') if item.strip().strip('[]')]
+
+def _is_whole_array(value):
+    """True for an array token that holds the whole list, e.g. `[1,4,9]` or `64,128`"""
+    value = value.strip()
+    return value.startswith('[') or ',' in value
+
+def _compile_coercer(schema):
+    """Build a function converting one raw value into the type described by schema"""
+    schema = resolve_optional_schema(schema)
+    schema_type = schema.get("type")
+    if schema_type == "array":
+        # Untyped list items (e.g. `int_list: list`) are numeric in these tools
+        coerce_item = _compile_coercer(schema.get("items") or {"type": "number"})
+
+        def coerce_array(value):
+            if isinstance(value, str):
+                value = _split_array(value)
+            return [coerce_item(item) for item in value]
+        return coerce_array
+    return SCALAR_COERCERS.get(schema_type, _to_untyped)
+
+class ToolSpec:
+    """A tool with its input schema compiled into argument parsers"""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+        schema = tool.inputSchema or {}
+        self.required = set(schema.get("required", []))
+        # (name, coercer, is_array, has_default, default) in declaration order
+        self.params = [
+            (param_name, _compile_coercer(param_info), resolve_optional_schema(param_info).get("type") == "array",
+             "default" in param_info, param_info.get("default"))
+            for param_name, param_info in schema.get("properties", {}).items()
+        ]
+        # The first array parameter followed only by optional ones may take all remaining values
+        self.rest_index = next(
+            (index for index, (_, _, is_array, _, _) in enumerate(self.params)
+             if is_array and not any(name in self.required for name, *_ in self.params[index + 1:])),
+            None
+        )
+
+    def parse(self, params):
+        """
+        Convert positional string parameters from a FUNCTION_CALL line into arguments.
+        An array parameter followed only by optional ones consumes all remaining values
+        (e.g. `int_list_to_exponential_sum|73|78|68`) when it is the last parameter or its
+        value is a single item; a bracketed or comma-separated array such as `[1,4,9]` or
+        `64,128` leaves the following values to the optional parameters. Missing or empty
+        optional parameters take their schema default, and a missing required parameter
+        raises ValueError.
+        """
+        arguments = {}
+        consumed = False
+        for index, (param_name, coerce, is_array, has_default, default) in enumerate(self.params):
+            if consumed or index >= len(params) or (has_default and not params[index].strip()):
+                if has_default:
+                    arguments[param_name] = default
+                elif param_name in self.required:
+                    raise ValueError(f"Not enough parameters provided for {self.name}")
+                continue
+            if index == self.rest_index and (index == len(self.params) - 1 or not _is_whole_array(params[index])):
+                value = ','.join(params[index:])
+                consumed = True
+            else:
+                value = params[index]
+            try:
+                arguments[param_name] = coerce(value)
+            except ValueError as e:
+                raise ValueError(f"Invalid value for {self.name}.{param_name}: {e}") from e
+        return arguments
+
+    def coerce(self, arguments):
+        """Coerce a mapping of arguments, e.g. from a native function call, to the schema types"""
+        coerced = dict(arguments)
+        for param_name, coerce, _, has_default, default in self.params:
+            if param_name in coerced:
+                try:
+                    coerced[param_name] = coerce(coerced[param_name])
+                except ValueError as e:
+                    raise ValueError(f"Invalid value for {self.name}.{param_name}: {e}") from e
+            elif has_default:
+                coerced[param_name] = default
+            elif param_name in self.required:
+                raise ValueError(f"Missing required parameter {param_name} for {self.name}")
+        return coerced
+
+class ToolRegistry:
+    """Tools from list_tools indexed by name, each compiled once into a ToolSpec"""
+
+    def __init__(self, tools):
+        self.tools = list(tools)
+        self._specs = {tool.name: ToolSpec(tool) for tool in self.tools}
+        self._function_declarations = None
+
+    @property
+    def names(self):
+        return list(self._specs)
+
+    def get(self, name):
+        """Return the ToolSpec for name, raising ValueError for unknown tools"""
+        spec = self._specs.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return spec
+
+    def parse(self, name, params):
+        """Convert positional string parameters for tool name into arguments"""
+        return self.get(name).parse(params)
+
+    def coerce(self, name, arguments):
+        """Coerce a mapping of arguments for tool name to the schema types"""
+        return self.get(name).coerce(arguments)
+
+    def function_declarations(self):
+        """Gemini function declarations for all tools, built on first use"""
+        if self._function_declarations is None:
+            self._function_declarations = to_function_declarations(self.tools)
+        return self._function_declarations
+
+def describe_tools(tools):
+    """Format the tool list as numbered lines for the system prompt"""
+    try:
+        tools_description = []
+        for i, tool in enumerate(tools):
+            try:
+                # Get tool properties
+                params = tool.inputSchema
+                desc = getattr(tool, 'description', 'No description available')
+                name = getattr(tool, 'name', f'tool_{i}')
                 
-                    try:
-                        tools_description = []
-                        for i, tool in enumerate(tools):
-                            try:
-                                # Get tool properties
-                                params = tool.inputSchema
-                                desc = getattr(tool, 'description', 'No description available')
-                                name = getattr(tool, 'name', f'tool_{i}')
-                                
-                                # Format the input schema in a more readable way
-                                if 'properties' in params:
-                                    param_details = []
-                                    for param_name, param_info in params['properties'].items():
-                                        param_type = param_info.get('type', 'unknown')
-                                        param_details.append(f"{param_name}: {param_type}")
-                                    params_str = ', '.join(param_details)
-                                else:
-                                    params_str = 'no parameters'
-
-                                tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                                tools_description.append(tool_desc)
-                                logger.info(f"Added description for tool: {tool_desc}")
-                            except Exception as e:
-                                logger.error(f"Error processing tool {i}: {e}")
-                                tools_description.append(f"{i+1}. Error processing tool")
-                        
-                        tools_description = "\n".join(tools_description)
-                        logger.info("Successfully created tools description")
-                    except Exception as e:
-                        logger.error(f"Error creating tools description: {e}")
-                        tools_description = "Error loading tools"
-                    
-                    logger.info("Created system prompt...")
-                    
-                    system_prompt = f"""You are an AI agent that solves problems and performs calculations. You have access to various tools for calculations and email sending.
+                # Format the input schema in a more readable way
+                if 'properties' in params:
+                    param_details = []
+                    for param_name, param_info in params['properties'].items():
+                        param_type = param_info.get('type', 'unknown')
+                        param_details.append(f"{param_name}: {param_type}")
+                    params_str = ', '.join(param_details)
+                else:
+                    params_str = 'no parameters'
+
+                tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
+                tools_description.append(tool_desc)
+                logger.info(f"Added description for tool: {tool_desc}")
+            except Exception as e:
+                logger.error(f"Error processing tool {i}: {e}")
+                tools_description.append(f"{i+1}. Error processing tool")
+        
+        tools_description = "\n".join(tools_description)
+        logger.info("Successfully created tools description")
+    except Exception as e:
+        logger.error(f"Error creating tools description: {e}")
+        tools_description = "Error loading tools"
+    return tools_description
+
+def build_system_prompt(tools_description, function_calling="text"):
+    """Create the system prompt listing the available tools"""
+    system_prompt = f"""You are an AI agent that solves problems and performs calculations. You have access to various tools for calculations and email sending.
 
     Available tools:
     {tools_description}
@@ -311,199 +747,541 @@ async def main():
     - FUNCTION_CALL: int_list_to_exponential_sum|[73, 78, 68, 73, 65]
     - FUNCTION_CALL: send-email|recipient_id|subject|message
     """
+    if function_calling == "native":
+        system_prompt += NATIVE_CALLING_NOTE
+    return system_prompt
 
-                    query = """Find the ASCII values of characters in INDIA, calculate the sum of exponentials of those values, and send the results via email."""
-                    logger.info("Starting iteration loop...")
-                    
-                    # Use global iteration variables
-                    global iteration, last_response
-                    
-                    while iteration < max_iterations:
-                        logger.info(f"\n--- Iteration {iteration + 1} ---")
-                        if last_response is None:
-                            current_query = query
-                        else:
-                            current_query = current_query + "\n\n" + " ".join(iteration_response)
-                            current_query = current_query + "  What should I do next?"
-
-                        # Get model's response with timeout
-                        logger.info("Preparing to generate LLM response...")
-                        prompt = f"{system_prompt}\n\nQuery: {current_query}"
-                        try:
-                            response = await generate_with_timeout(None, prompt)
-                            response_text = response.text.strip()
-                            logger.info(f"LLM Response: {response_text}")
-                            
-                            # Split response into multiple lines and process each FUNCTION_CALL
-                            function_calls = [line.strip() for line in response_text.split('\n') 
-                                            if line.strip().startswith("FUNCTION_CALL:")]
-                            
-                            # Process each function call in sequence
-                            last_calculation_result = None  # Store most recent calculation result
-                            
-                            for function_call in function_calls:
-                                logger.info(f"\nProcessing function call: {function_call}")
-                                response_text = function_call
-                                
-                                if response_text.startswith("FUNCTION_CALL:"):
-                                    _, function_info = response_text.split(":", 1)
-                                    parts = [p.strip() for p in function_info.split("|")]
-                                    func_name, params = parts[0], parts[1:]
-                                    
-                                    logger.debug(f"\nDEBUG: Raw function info: {function_info}")
-                                    logger.debug(f"DEBUG: Split parts: {parts}")
-                                    logger.debug(f"DEBUG: Function name: {func_name}")
-                                    logger.debug(f"DEBUG: Raw parameters: {params}")
-                                    
-                                    # If this is send-email following a calculation, ensure we use the latest result
-                                    if func_name == "send-email" and last_calculation_result:
-                                        # Find the message parameter (typically the last one)
-                                        message_index = -1
-                                        if len(params) >= 3:  # We need at least recipient, subject, and message
-                                            message_index = 2  # Message is typically the third parameter
-                                            
-                                            # Check if the message seems to reference a calculation result
-                                            if "sum" in params[message_index].lower() or "exponential" in params[message_index].lower():
-                                                # Get current date and time
-                                                current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                                
-                                                # Update the message to include the correct calculation result with new format
-                                                logger.info(f"Updating email message with latest calculation result: {last_calculation_result}")
-                                                params[message_index] = f"""Hi User,
+def parse_function_call(function_call):
+    """
+    Split a FUNCTION_CALL line into the function name and its raw string parameters.
+    Native function calls arrive already split as (name, arguments mapping).
+    """
+    if isinstance(function_call, tuple):
+        return function_call
+    _, function_info = function_call.split(":", 1)
+    parts = [p.strip() for p in function_info.split("|")]
+    return parts[0], parts[1:]
+
+def plan_call_waves(function_calls):
+    """
+    Group FUNCTION_CALL lines into waves that run one after another. Calls in a wave have
+    no data dependency on each other and run concurrently; a barrier tool, whose arguments
+    are filled in from earlier results, gets a wave of its own after every earlier call.
+    """
+    waves = []
+    current_wave = []
+    for function_call in function_calls:
+        func_name, _ = parse_function_call(function_call)
+        if func_name in BARRIER_TOOLS:
+            if current_wave:
+                waves.append(current_wave)
+            waves.append([function_call])
+            current_wave = []
+        else:
+            current_wave.append(function_call)
+    if current_wave:
+        waves.append(current_wave)
+    return waves
+
+async def execute_function_call(session, registry, function_call, last_calculation_result=None):
+    """
+    Convert one FUNCTION_CALL line into tool arguments, call the tool over the session and
+    return (func_name, arguments, iteration_result, result_str).
+    """
+    logger.info(f"\nProcessing function call: {function_call}")
+    func_name, params = parse_function_call(function_call)
+    
+    logger.debug(f"\nDEBUG: Raw function call: {function_call}")
+    logger.debug(f"DEBUG: Function name: {func_name}")
+    logger.debug(f"DEBUG: Raw parameters: {params}")
+    
+    # If this is send-email following a calculation, ensure we use the latest result
+    if func_name == "send-email" and last_calculation_result and isinstance(params, list):
+        # Find the message parameter (typically the last one)
+        message_index = -1
+        if len(params) >= 3:  # We need at least recipient, subject, and message
+            message_index = 2  # Message is typically the third parameter
+    
+            # Check if the message seems to reference a calculation result
+            if "sum" in params[message_index].lower() or "exponential" in params[message_index].lower():
+                # Get current date and time
+                current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+                # Update the message to include the correct calculation result with new format
+                logger.info(f"Updating email message with latest calculation result: {last_calculation_result}")
+                params[message_index] = f"""Hi User,
 
 The problem statement was to find the 'Sum of exponentials of ASCII values of string [INDIA]'. This has been computed and here is the result:
 
 The sum of exponentials is: {last_calculation_result} 
 [Computed Date / Time: {current_datetime}]"""
-                                    
-                                    try:
-                                        # Find the matching tool to get its input schema
-                                        tool = next((t for t in tools if t.name == func_name), None)
-                                        if not tool:
-                                            logger.debug(f"DEBUG: Available tools: {[t.name for t in tools]}")
-                                            raise ValueError(f"Unknown tool: {func_name}")
-
-                                        logger.debug(f"DEBUG: Found tool: {tool.name}")
-                                        
-                                        # Prepare arguments based on tool schema
-                                        arguments = {}
-                                        schema_properties = tool.inputSchema.get('properties', {})
-                                        
-                                        for param_name, param_info in schema_properties.items():
-                                            if not params:
-                                                raise ValueError(f"Not enough parameters provided for {func_name}")
-                                            
-                                            value = params.pop(0)
-                                            param_type = param_info.get('type', 'string')
-                                            
-                                            # Special handling for recipient_id in send-email
-                                            if func_name == "send-email" and param_name == "recipient_id" and value == "recipient_id":
-                                                if recipient_email:
-                                                    arguments[param_name] = recipient_email
-                                                else:
-                                                    raise ValueError("No recipient email found in environment variables")
-                                            # Normal parameter processing
-                                            elif param_type == 'integer':
-                                                arguments[param_name] = int(value)
-                                            elif param_type == 'number':
-                                                arguments[param_name] = float(value)
-                                            elif param_type == 'array':
-                                                if isinstance(value, str):
-                                                    value = value.strip('[]').split(',')
-                                                arguments[param_name] = [int(x.strip()) for x in value]
-                                            else:
-                                                arguments[param_name] = str(value)
-
-                                        logger.debug(f"DEBUG: Final arguments: {arguments}")
-                                        
-                                        # Make sure email message contains the latest calculation result if needed
-                                        if func_name == "send-email" and "message" in arguments and last_calculation_result:
-                                            # Check if the message seems to reference a calculation result
-                                            if ("sum" in arguments["message"].lower() or 
-                                               "exponential" in arguments["message"].lower() or 
-                                               "calculation" in arguments["message"].lower()):
-                                                # Get current date and time
-                                                current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                                
-                                                # Format the email with the specified template
-                                                arguments["message"] = f"""Hi User,
+    
+    # Convert the parameters with the tool's compiled schema
+    spec = registry.get(func_name)
+    logger.debug(f"DEBUG: Found tool: {spec.name}")
+    arguments = spec.parse(params) if isinstance(params, list) else spec.coerce(params)
+    
+    # Special handling for recipient_id in send-email
+    if func_name == "send-email" and arguments.get("recipient_id") == "recipient_id":
+        if recipient_email:
+            arguments["recipient_id"] = recipient_email
+        else:
+            raise ValueError("No recipient email found in environment variables")
+
+    logger.debug(f"DEBUG: Final arguments: {arguments}")
+    
+    # Make sure email message contains the latest calculation result if needed
+    if func_name == "send-email" and "message" in arguments and last_calculation_result:
+        # Check if the message seems to reference a calculation result
+        if ("sum" in arguments["message"].lower() or 
+           "exponential" in arguments["message"].lower() or 
+           "calculation" in arguments["message"].lower()):
+            # Get current date and time
+            current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+            # Format the email with the specified template
+            arguments["message"] = f"""Hi User,
 
 The problem statement was to find the 'Sum of exponentials of ASCII values of string [INDIA]'. This has been computed and here is the result:
 
 The sum of exponentials is: {last_calculation_result} [Computed Date / Time: {current_datetime}]"""
-                                                
-                                                logger.info(f"Updated email message with calculation result and formatted template")
-                                        
-                                        # Call the tool
-                                        result = await session.call_tool(func_name, arguments=arguments)
-                                    
-                                        # Get the full result content
-                                        if hasattr(result, 'content'):
-                                            logger.debug(f"DEBUG: Result has content attribute")
-                                            # Handle multiple content items
-                                            if isinstance(result.content, list):
-                                                iteration_result = [
-                                                    item.text if hasattr(item, 'text') else str(item)
-                                                    for item in result.content
-                                                ]
-                                            else:
-                                                iteration_result = str(result.content)
-                                        else:
-                                            logger.debug(f"DEBUG: Result has no content attribute")
-                                            iteration_result = str(result)
-                                        
-                                        logger.debug(f"DEBUG: Final iteration result: {iteration_result}")
-                                        
-                                        # Format the response based on result type
-                                        if isinstance(iteration_result, list):
-                                            result_str = f"[{', '.join(iteration_result)}]"
-                                        else:
-                                            result_str = str(iteration_result)
-                                        
-                                        # Store the last result for possible use in next function calls
-                                        last_response = iteration_result
-                                        
-                                        # If this is a calculation function, store the result for potential email use
-                                        if func_name == "int_list_to_exponential_sum" or func_name == "strings_to_chars_to_int":
-                                            if isinstance(iteration_result, list) and iteration_result:
-                                                last_calculation_result = iteration_result[0]
-                                            else:
-                                                last_calculation_result = iteration_result
-                                            logger.info(f"Stored calculation result: {last_calculation_result}")
-                                        
-                                        iteration_response.append(
-                                            f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
-                                            f"and the function returned {result_str}."
-                                        )
-                                        
-                                    except Exception as e:
-                                        logger.error(f"DEBUG: Error in function call {func_name}: {e}")
-                                        traceback.print_exc()
-                                        continue  # Continue with next function call even if one fails
-                                    
-                            # Break the main loop after processing all function calls
-                            break
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to get LLM response: {e}")
-                            break
-
-                        if response_text.startswith("FINAL_ANSWER:"):
-                            logger.info("\n=== Agent Execution Complete ===")
-                            break
-
-                        iteration += 1
+    
+            logger.info(f"Updated email message with calculation result and formatted template")
+    
+    # Call the tool
+    result = await session.call_tool(func_name, arguments=arguments)
+    
+    # Get the full result content
+    if hasattr(result, 'content'):
+        logger.debug(f"DEBUG: Result has content attribute")
+        # Handle multiple content items
+        if isinstance(result.content, list):
+            iteration_result = [
+                item.text if hasattr(item, 'text') else str(item)
+                for item in result.content
+            ]
+        else:
+            iteration_result = str(result.content)
+    else:
+        logger.debug(f"DEBUG: Result has no content attribute")
+        iteration_result = str(result)
+    
+    logger.debug(f"DEBUG: Final iteration result: {iteration_result}")
+    
+    # Format the response based on result type
+    if isinstance(iteration_result, list):
+        result_str = f"[{', '.join(iteration_result)}]"
+    else:
+        result_str = str(iteration_result)
+    
+    return func_name, arguments, iteration_result, result_str
 
+async def run_agent(session, registry, system_prompt, query, function_calling="text"):
+    """
+    Run the agent loop for one query over an initialized session.
+    All loop state is local, so many queries can run concurrently on the same session.
+    With function_calling="native" the tool schemas are sent as Gemini function declarations
+    and structured calls are used, falling back to FUNCTION_CALL lines in the text.
+    Returns the outcome of the query together with the steps taken and the elapsed time.
+    """
+    function_declarations = registry.function_declarations() if function_calling == "native" else None
+    start_time = time.perf_counter()
+    iteration = 0
+    last_response = None
+    conversation = ConversationState(system_prompt, query)
+    prompt_token_counts = []
+    final_answer = None
+    error = None
+    # Most recent calculation result, filled into a later send-email message
+    last_calculation_result = None
+    logger.info("Starting iteration loop...")
+
+    while iteration < max_iterations:
+        logger.info(f"\n--- Iteration {iteration + 1} ---")
+        # Get model's response with timeout
+        logger.info("Preparing to generate LLM response...")
+        prompt, prompt_tokens = conversation.render()
+        prompt_token_counts.append(prompt_tokens)
+        logger.info(f"Prompt tokens: ~{prompt_tokens} ({len(conversation.steps)} steps, budget {conversation.token_budget})")
+        try:
+            response = await generate_with_timeout(None, prompt, tools=function_declarations)
+            response_text = get_response_text(response).strip()
+            logger.info(f"LLM Response: {response_text}")
+            final_answer = next((line.strip()[len("FINAL_ANSWER:"):].strip() for line in response_text.split('\n')
+                                 if line.strip().startswith("FINAL_ANSWER:")), final_answer)
+            
+            # Use native function calls when present, otherwise split response into lines and process each FUNCTION_CALL
+            function_calls = extract_function_calls(response)
+            if function_calls:
+                logger.info(f"Native function calls: {function_calls}")
+            else:
+                function_calls = [line.strip() for line in response_text.split('\n') 
+                                if line.strip().startswith("FUNCTION_CALL:")]
+            
+            # Run the calls in waves: independent calls go over the session concurrently, while
+            # barrier tools wait for every earlier call. Results are merged back in call order.
+            for wave in plan_call_waves(function_calls):
+                outcomes = await asyncio.gather(
+                    *(execute_function_call(session, registry, function_call, last_calculation_result)
+                      for function_call in wave),
+                    return_exceptions=True
+                )
+                for function_call, outcome in zip(wave, outcomes):
+                    if isinstance(outcome, Exception):
+                        logger.error(f"DEBUG: Error in function call {function_call}: {outcome}")
+                        traceback.print_exception(type(outcome), outcome, outcome.__traceback__)
+                        continue  # Continue with next function call even if one fails
+                    func_name, arguments, iteration_result, result_str = outcome
+                    
+                    # Store the last result for possible use in next function calls
+                    last_response = iteration_result
+                    
+                    # If this is a calculation function, store the result for potential email use
+                    if func_name == "int_list_to_exponential_sum" or func_name == "strings_to_chars_to_int":
+                        if isinstance(iteration_result, list) and iteration_result:
+                            last_calculation_result = iteration_result[0]
+                        else:
+                            last_calculation_result = iteration_result
+                        logger.info(f"Stored calculation result: {last_calculation_result}")
+                    
+                    conversation.add_step(
+                        f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
+                        f"and the function returned {result_str}."
+                    )
+            
         except Exception as e:
-            logger.error(f"Error in stdio_client or session creation: {str(e)}")
+            logger.error(f"Failed to get LLM response: {e}")
+            error = str(e)
+            break
+
+        # Prompt again with the new steps until the model gives its final answer
+        if any(line.strip().startswith("FINAL_ANSWER:") for line in response_text.split('\n')):
+            logger.info("\n=== Agent Execution Complete ===")
+            break
+
+        iteration += 1
+
+    return {
+        "query": query,
+        "final_answer": final_answer,
+        "steps": conversation.steps,
+        "prompt_tokens": prompt_token_counts,
+        # iteration is already max_iterations when the loop ran out of iterations
+        "iterations": min(iteration + 1, max_iterations),
+        "error": error,
+        "elapsed": round(time.perf_counter() - start_time, 3),
+    }
+
+def load_queries(queries_path):
+    """Read queries from a JSONL file, one {"id": ..., "query": ...} object or JSON string per line"""
+    queries = []
+    with open(queries_path) as queries_file:
+        for line_number, line in enumerate(queries_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            item.setdefault("id", line_number)
+            queries.append(item)
+    return queries
+
+async def run_batch(session, registry, system_prompt, queries, output_path, concurrency=DEFAULT_CONCURRENCY,
+                    function_calling="text"):
+    """
+    Run many queries as independent agent tasks over one shared session, at most
+    `concurrency` at a time, writing one JSON result line per query as it completes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    start_time = time.perf_counter()
+
+    with open(output_path, 'w') as output_file:
+        async def run_one(item):
+            async with semaphore:
+                logger.info(f"Running query {item['id']}")
+                try:
+                    result = await run_agent(session, registry, system_prompt, item["query"], function_calling)
+                except Exception as e:
+                    logger.error(f"Query {item['id']} failed: {e}")
+                    result = {"query": item["query"], "error": str(e)}
+            result = {"id": item["id"], **result}
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            return result
+
+        results = await asyncio.gather(*(run_one(item) for item in queries))
+
+    elapsed = time.perf_counter() - start_time
+    failed = sum(1 for result in results if result.get("error"))
+    logger.info(f"Batch complete: {len(results)} queries, {failed} failed, {elapsed:.2f}s total, "
+                f"{elapsed / max(len(results), 1):.3f}s per query")
+    return results
+
+def _open_trace(path, mode):
+    """Open a JSONL trace file as text, gzip-compressed when the path ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _prompt_key(prompt, tools=None):
+    """Hash identifying an LLM request in a trace"""
+    return hashlib.sha256(json.dumps([prompt, tools], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _tool_key(name, arguments):
+    """Identify a call_tool request in a trace"""
+    return json.dumps([name, arguments or {}], sort_keys=True, default=str)
+
+class TraceRecorder:
+    """Write every LLM call and MCP request of a session to a JSONL trace, one event per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = _open_trace(path, "w")
+        self._start = time.perf_counter()
+        self.events = 0
+
+    def record(self, kind, key, request, response, started):
+        """Append one event; started is the perf_counter value when the request was sent"""
+        now = time.perf_counter()
+        event = {
+            "kind": kind,
+            "key": key,
+            "start": round(started - self._start, 6),
+            "duration": round(now - started, 6),
+            "request": request,
+            "response": response,
+        }
+        self._file.write(json.dumps(event, default=str) + "\n")
+        self.events += 1
+
+    def close(self):
+        self._file.close()
+        logger.info(f"Recorded {self.events} events to {self.path}")
+
+class RecordingLLMClient:
+    """Wraps an LLM client and records each prompt with the response it produced"""
+
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+
+    async def generate(self, prompt, timeout=30, tools=None):
+        started = time.perf_counter()
+        response = await self.client.generate(prompt, timeout=timeout, tools=tools)
+        cached = CachedResponse(get_response_text(response), extract_function_calls(response))
+        self.recorder.record("llm", _prompt_key(prompt, tools), {"prompt": prompt},
+                             {"text": cached.text, "function_calls": cached.function_calls}, started)
+        return response
+
+class RecordingSession:
+    """Wraps a ClientSession and records tool listings and tool calls"""
+
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+
+    async def list_tools(self):
+        started = time.perf_counter()
+        result = await self.session.list_tools()
+        self.recorder.record("list_tools", "list_tools", {}, result.model_dump(mode="json"), started)
+        return result
+
+    async def call_tool(self, name, arguments=None):
+        started = time.perf_counter()
+        result = await self.session.call_tool(name, arguments=arguments)
+        self.recorder.record("tool", _tool_key(name, arguments), {"name": name, "arguments": arguments},
+                             result.model_dump(mode="json"), started)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+class ReplayLog:
+    """
+    Recorded events loaded from a trace. Requests are matched to recordings by their key;
+    when nothing matches exactly (e.g. a timestamp in an email body) the next unused
+    recording of the same kind, or tool name, is used. timing is "original" to wait
+    for the recorded duration of each request, or "zero" to answer immediately.
+    """
+
+    def __init__(self, path, timing="original"):
+        self.timing = timing
+        self._by_key = {}
+        self._by_group = {}
+        with _open_trace(path, "r") as trace_file:
+            for line in trace_file:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                event["used"] = False
+                self._by_key.setdefault((event["kind"], event["key"]), deque()).append(event)
+                self._by_group.setdefault(self._group(event["kind"], event["request"]), deque()).append(event)
+
+    @staticmethod
+    def _group(kind, request):
+        return (kind, request.get("name")) if kind == "tool" else (kind, None)
+
+    def _take(self, queue):
+        while queue and queue[0]["used"]:
+            queue.popleft()
+        if not queue:
+            return None
+        event = queue.popleft()
+        event["used"] = True
+        return event
+
+    async def next(self, kind, key, request):
+        """Return the recorded response for a request, waiting as long as it originally took"""
+        event = self._take(self._by_key.get((kind, key), deque()))
+        if event is None:
+            event = self._take(self._by_group.get(self._group(kind, request), deque()))
+        if event is None:
+            raise LookupError(f"No recorded {kind} event left for {request}")
+        if self.timing == "original":
+            await asyncio.sleep(event["duration"])
+        return event["response"]
+
+class ReplayLLMClient:
+    """Answers LLM requests from a ReplayLog instead of calling Gemini"""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    async def generate(self, prompt, timeout=30, tools=None):
+        response = await self.replay.next("llm", _prompt_key(prompt, tools), {"prompt": prompt})
+        return CachedResponse(response["text"], response["function_calls"])
+
+class ReplaySession:
+    """Stands in for a ClientSession, answering tool requests from a ReplayLog"""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    async def initialize(self):
+        return None
+
+    async def list_tools(self):
+        response = await self.replay.next("list_tools", "list_tools", {})
+        return types.ListToolsResult.model_validate(response)
+
+    async def call_tool(self, name, arguments=None):
+        response = await self.replay.next("tool", _tool_key(name, arguments), {"name": name, "arguments": arguments})
+        return types.CallToolResult.model_validate(response)
+
+async def run_session(session, queries_path=None, output_path="results.jsonl", concurrency=DEFAULT_CONCURRENCY,
+                      function_calling="text"):
+    """List the tools, build the system prompt and run the default query or a batch of queries"""
+    # Get available tools
+    logger.info("Requesting tool list...")
+    tools_result = await session.list_tools()
+    tools = tools_result.tools
+    logger.info(f"Successfully retrieved {len(tools)} tools")
+    # Compile every tool's input schema once for the whole run
+    registry = ToolRegistry(tools)
+
+    # Create system prompt with available tools
+    logger.info("Creating system prompt...")
+    logger.info(f"Number of tools: {len(tools)}")
+    tools_description = describe_tools(tools)
+    system_prompt = build_system_prompt(tools_description, function_calling)
+    logger.info("Created system prompt...")
+
+    if queries_path:
+        queries = load_queries(queries_path)
+        logger.info(f"Running {len(queries)} queries with concurrency {concurrency}")
+        await run_batch(session, registry, system_prompt, queries, output_path, concurrency,
+                        function_calling)
+        print(f"Results written to {output_path}")
+    else:
+        result = await run_agent(session, registry, system_prompt, DEFAULT_QUERY, function_calling)
+        logger.info(f"Agent finished in {result['elapsed']}s after {result['iterations']} iteration(s)")
+
+async def main(server_url=None, queries_path=None, output_path="results.jsonl", concurrency=DEFAULT_CONCURRENCY,
+               function_calling="text", llm_cache=None, llm_cache_ttl=None,
+               record_path=None, replay_path=None, replay_timing="original"):
+    logger.info("Starting main execution...")
+    cache = configure_llm_cache(llm_cache, llm_cache_ttl)
+    recorder = None
+    if record_path:
+        recorder = TraceRecorder(record_path)
+        set_llm_client(RecordingLLMClient(get_llm_client(), recorder))
+        logger.info(f"Recording session trace to {record_path}")
+    try:
+        if replay_path:
+            # Replay a recorded session without contacting Gemini or the MCP server
+            logger.info(f"Replaying session trace {replay_path} with {replay_timing} timing")
+            replay = ReplayLog(replay_path, replay_timing)
+            set_llm_client(ReplayLLMClient(replay))
+            await run_session(ReplaySession(replay), queries_path, output_path, concurrency, function_calling)
+            return
+
+        # Create a single MCP server connection
+        logger.info("Establishing connection to MCP server...")
+        server_params = None
+
+        if not server_url:
+            # Verify environment variables
+            creds_file_path = os.getenv("GMAIL_CREDS_FILE_PATH")
+            token_path = os.getenv("GMAIL_TOKEN_PATH")
+            
+            if not creds_file_path or not token_path:
+                logger.error("Missing required environment variables: GMAIL_CREDS_FILE_PATH or GMAIL_TOKEN_PATH")
+                print("Error: Missing required environment variables. Please check your .env file.")
+                return
+                
+            if not os.path.exists(creds_file_path):
+                logger.error(f"Credentials file not found: {creds_file_path}")
+                print(f"Error: Credentials file not found: {creds_file_path}")
+                return
+                
+            logger.debug(f"Using credentials file: {creds_file_path}")
+            logger.debug(f"Using token file: {token_path}")
+            
+            # Get the current directory and add it to Python path
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            if current_dir not in sys.path:
+                sys.path.append(current_dir)
+            
+            # Create server parameters
+            server_params = StdioServerParameters(
+                command=sys.executable,
+                args=["-u", os.path.join(current_dir, "server.py"),
+                      "--creds-file-path", creds_file_path,
+                      "--token-path", token_path]
+            )
+
+        try:
+            # Create MCP client
+            logger.info("Creating MCP client...")
+            async with connect_to_server(server_params, server_url) as (read, write):
+                logger.info("MCP client created successfully")
+                
+                logger.info("Creating session...")
+                async with ClientSession(read, write) as session:
+                    logger.info("Session created, initializing...")
+                    try:
+                        # Add timeout for session initialization
+                        await asyncio.wait_for(session.initialize(), timeout=30)
+                        logger.info("Session initialized successfully")
+                    except asyncio.TimeoutError:
+                        logger.error("Session initialization timed out")
+                        print("Error: Session initialization timed out. The server might be unresponsive.")
+                        return
+                    except Exception as e:
+                        logger.error(f"Failed to initialize session: {str(e)}")
+                        print(f"Error: Failed to initialize session: {str(e)}")
+                        return
+                
+                    if recorder is not None:
+                        session = RecordingSession(session, recorder)
+                    await run_session(session, queries_path, output_path, concurrency, function_calling)
+
+        except Exception as e:
+            logger.error(f"Error in MCP client or session creation: {str(e)}")
             logger.error(traceback.format_exc())  # NEW: Full traceback
             print(f"Error: Failed to create connection: {str(e)}")
             return
-        finally:
-            # Clean up server process
-            if server_process.poll() is None:
-                server_process.terminate()
-                server_process.wait()
 
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
@@ -511,12 +1289,51 @@ The sum of exponentials is: {last_calculation_result} [Computed Date / Time: {cu
         print(f"Error: {str(e)}")
         print("Check the log file for detailed error information.")
     finally:
-        reset_state()  # Reset at the end of main
+        if cache is not None:
+            logger.info(f"LLM cache stats: {cache.stats()}")
+            cache.close()
+        if recorder is not None:
+            recorder.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gmail MCP agent')
+    parser.add_argument('--server-url',
+                        default=os.getenv("MCP_SERVER_URL"),
+                        help='SSE endpoint of a running server (e.g. http://127.0.0.1:8000/sse); '
+                             'a server process is spawned when omitted')
+    parser.add_argument('--queries',
+                        help='JSONL file of queries to run as a batch instead of the default query')
+    parser.add_argument('--output',
+                        default='results.jsonl',
+                        help='JSONL file receiving one result per batch query')
+    parser.add_argument('--concurrency',
+                        type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help='Number of batch queries run at the same time')
+    parser.add_argument('--function-calling',
+                        choices=['text', 'native'],
+                        default='text',
+                        help='How the model calls tools: FUNCTION_CALL text lines, or native Gemini '
+                             'function calling with the text format as fallback')
+    parser.add_argument('--llm-cache',
+                        help='Cache LLM responses: "memory", or a SQLite file path to reuse them across runs')
+    parser.add_argument('--llm-cache-ttl',
+                        type=float,
+                        help='Seconds a cached LLM response stays valid (default: no expiry)')
+    parser.add_argument('--record',
+                        help='Write every LLM call and MCP tool call to this JSONL trace (gzip when it ends in .gz)')
+    parser.add_argument('--replay',
+                        help='Replay a recorded trace instead of calling Gemini and the Gmail server')
+    parser.add_argument('--replay-timing',
+                        choices=['original', 'zero'],
+                        default='original',
+                        help='Wait as long as each recorded call took, or answer immediately')
+    args = parser.parse_args()
+
     print("Starting application...")
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.server_url, args.queries, args.output, args.concurrency, args.function_calling,
+                         args.llm_cache, args.llm_cache_ttl, args.record, args.replay, args.replay_timing))
     except Exception as e:
         print(f"Fatal error: {str(e)}")
         print("Check the log file for detailed error information.")
@@ -0,0 +1,80 @@
+"""
+Benchmark: cost per element of the array tools against one scalar tool call per element.
+Every call goes through an in-memory MCP client session, so the JSON-RPC encoding, tool
+dispatch and result conversion are measured; only the stdio pipe is left out.
+
+    python bench_array_tools.py --values 10000 --scalar-calls 1000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+
+import numpy as np
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from example2 import mcp
+
+
+async def timed(session, calls):
+    """Seconds taken by calls, a list of (tool, arguments), run one after another over session"""
+    start = time.perf_counter()
+    for name, arguments in calls:
+        result = await session.call_tool(name, arguments=arguments)
+        if result.isError:
+            raise RuntimeError(f"{name} failed: {result.content[0].text}")
+    return time.perf_counter() - start
+
+
+def report(label, elapsed, elements):
+    print(f"{label:<40} {elapsed * 1000:>10.1f} {elapsed / elements * 1e6:>12.2f}")
+
+
+async def run(values, scalar_calls):
+    rng = random.Random(0)
+    ints = [rng.randint(1, 1000) for _ in range(values)]
+    b64 = base64.b64encode(np.asarray(ints, dtype="<f8").tobytes()).decode("ascii")
+
+    async with create_connected_server_and_client_session(mcp._mcp_server) as session:
+        print(f"{'calls':<40} {'total ms':>10} {'us/element':>12}")
+        for tool in ("sqrt", "sin"):
+            elapsed = await timed(session, [(tool, {"a": a}) for a in ints[:scalar_calls]])
+            report(f"{tool} x {scalar_calls} scalar calls", elapsed, scalar_calls)
+            elapsed = await timed(session, [("array_elementwise", {"operation": tool, "values": ints})])
+            report(f"array_elementwise {tool}, {values} as list", elapsed, values)
+            elapsed = await timed(session, [("array_elementwise",
+                                             {"operation": tool, "values_b64": b64, "encoding": "base64"})])
+            report(f"array_elementwise {tool}, {values} as base64", elapsed, values)
+
+        pairs = list(zip(ints[:scalar_calls], ints[1:scalar_calls + 1]))
+        elapsed = await timed(session, [("add", {"a": a, "b": b}) for a, b in pairs])
+        report(f"add x {len(pairs)} scalar calls", elapsed, len(pairs))
+        elapsed = await timed(session, [("array_elementwise", {"operation": "add", "values": ints, "operand": 1})])
+        report(f"array_elementwise add, {values} as list", elapsed, values)
+
+        elapsed = await timed(session, [("add_list", {"l": ints})])
+        report(f"add_list, {values} values", elapsed, values)
+        elapsed = await timed(session, [("array_reduce", {"operation": "sum", "values": ints})])
+        report(f"array_reduce sum, {values} as list", elapsed, values)
+        elapsed = await timed(session, [("array_reduce", {"operation": "sum", "values_b64": b64})])
+        report(f"array_reduce sum, {values} as base64", elapsed, values)
+
+    print(f"request size for {values} values: list {len(json.dumps(ints)) / 1024:.0f} KB, "
+          f"base64 {len(b64) / 1024:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Array tools vs scalar tools benchmark')
+    parser.add_argument('--values', type=int, default=10000, help='elements per array call')
+    parser.add_argument('--scalar-calls', type=int, default=1000,
+                        help='scalar calls timed; the cost per call is the same for any count')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args.values, args.scalar_calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: the big-integer tools (fibonacci_nth, fibonacci_numbers, factorial, power) for
+n up to 10^6, timed in-process without the worker pool. Each result is timed including its
+conversion to a decimal string, which used to dominate. The Fibonacci numbers are
+compared with the previous approach of adding them one by one, and requests over the
+size limits are timed to show the guards reject them before any work is done.
+
+    python bench_bigint.py --max-n 1000000 --before-max-n 100000
+"""
+import argparse
+import inspect
+import logging
+import sys
+import time
+
+from example2 import (FIB_DIGITS_PER_INDEX, FIB_MAX_PAGE_SIZE, MAX_RESULT_DIGITS, factorial, fibonacci_nth,
+                      fibonacci_numbers, int_to_decimal_string, power)
+
+# The tools without their cache and worker pool wrappers
+factorial, fibonacci_nth, fibonacci_numbers, power = (
+    inspect.unwrap(tool) for tool in (factorial, fibonacci_nth, fibonacci_numbers, power))
+
+
+def fibonacci_before(n):
+    """F(n) by repeated addition, as fibonacci_numbers computed every term"""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except ValueError as e:
+        result = f"ValueError: {e}"
+    return time.perf_counter() - start, result
+
+
+def describe(result):
+    if isinstance(result, int):
+        return f"{result.bit_length()} bits"
+    if isinstance(result, dict):
+        return f"page of {len(result['values'])}"
+    if isinstance(result, str) and result[:1].isdigit():
+        return f"{len(result)} digits"
+    return str(result)[:60]
+
+
+def report(label, elapsed, result=""):
+    print(f"{label:<40} {elapsed * 1000:>10.2f}  {describe(result)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Big-integer tool benchmark')
+    parser.add_argument('--max-n', type=int, default=1000000)
+    parser.add_argument('--before-max-n', type=int, default=100000,
+                        help='largest n for the one-by-one Fibonacci loop, which is quadratic')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    sys.set_int_max_str_digits(0)
+
+    sizes = [n for n in (10**3, 10**4, 10**5, 10**6) if n <= args.max_n]
+    print(f"{'call':<40} {'ms':>10}  result")
+    for n in sizes:
+        report(f"fibonacci_nth({n})", *timed(fibonacci_nth, n))
+        if n <= args.before_max_n:
+            elapsed, value = timed(fibonacci_before, n)
+            str_elapsed, text = timed(str, value)
+            report(f"  repeated addition + str() (before)", elapsed + str_elapsed, text)
+        report(f"factorial({n})", *timed(factorial, n))
+        report(f"power(3, {n})", *timed(power, 3, n))
+        # The last page of the largest size the digit limit allows
+        page_size = max(1, min(FIB_MAX_PAGE_SIZE, n, int(MAX_RESULT_DIGITS / (FIB_DIGITS_PER_INDEX * n))))
+        report(f"fibonacci_numbers({n}, last page)", *timed(fibonacci_numbers, n, start=n - page_size,
+                                                               page_size=page_size))
+
+    big = 3 ** args.max_n
+    report(f"str(3 ** {args.max_n})", *timed(str, big))
+    report(f"int_to_decimal_string(3 ** {args.max_n})", *timed(int_to_decimal_string, big))
+
+    print(f"-- guards (limit {MAX_RESULT_DIGITS} digits)")
+    report("factorial(10**7)", *timed(factorial, 10**7))
+    report("power(10, 10**7)", *timed(power, 10, 10**7))
+    report("fibonacci_nth(10**8)", *timed(fibonacci_nth, 10**8))
+    report("fibonacci_numbers(10**6), unpaged", *timed(fibonacci_numbers, 10**6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: int_list_to_exponential_sum and array_reduce exponential_sum on long lists.
+Inputs are character codes of synthetic text (the agent's use) and larger values whose
+sum overflows a float. The previous pure-Python sum of math.exp is timed where it can
+run at all; above ~709 it raised OverflowError.
+
+    python bench_exp_sum.py --sizes 1000,100000,1000000
+"""
+import argparse
+import base64
+import logging
+import math
+import random
+import time
+
+import numpy as np
+
+from example2 import array_reduce, int_list_to_exponential_sum
+
+
+def exp_sum_before(int_list):
+    """int_list_to_exponential_sum before the log-sum-exp rewrite"""
+    return sum(math.exp(i) for i in int_list)
+
+
+def measure(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except OverflowError:
+        result = "OverflowError"
+    elapsed = time.perf_counter() - start
+    if isinstance(result, dict):
+        result = result["result"]
+    print(f"  {label:<36} {elapsed * 1000:>10.1f}  {str(result)[:34]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exponential sum benchmark on long lists')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='comma-separated list lengths')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    rng = random.Random(0)
+    print(f"  {'call':<36} {'ms':>10}  result")
+    for size in (int(s) for s in args.sizes.split(',')):
+        text_codes = [rng.randint(32, 126) for _ in range(size)]
+        large = [rng.randint(0, 1000) for _ in range(size)]
+        for name, values in (("character codes 32..126", text_codes), ("values 0..1000", large)):
+            print(f"{size} {name}")
+            b64 = base64.b64encode(np.asarray(values, dtype="<f8").tobytes()).decode("ascii")
+            measure("sum(math.exp) (before)", exp_sum_before, values)
+            measure("int_list_to_exponential_sum auto", int_list_to_exponential_sum, values)
+            measure("int_list_to_exponential_sum log", int_list_to_exponential_sum, values, mode="log")
+            measure("int_list_to_exponential_sum decimal", int_list_to_exponential_sum, values, mode="decimal")
+            measure("array_reduce, list", array_reduce, "exponential_sum", values=values)
+            measure("array_reduce, base64", array_reduce, "exponential_sum", values_b64=b64)
+
+
+if __name__ == '__main__':
+    main()
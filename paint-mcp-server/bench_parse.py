@@ -0,0 +1,109 @@
+"""
+Benchmark: FUNCTION_CALL parameter parsing throughput of the agent. Compares the
+ToolRegistry of talk2mcp-2.py (schemas compiled once, tools indexed by name) with the
+previous per-call loop (linear scan of the tool list, schema re-read and an if/elif
+type chain on every call). Tools come from this server's list_tools; --extra-tools
+puts that many synthetic tools in front of them, like a larger server would.
+The agent script imports the Windows automation modules, so this runs where the agent does.
+
+    python bench_parse.py --calls 200000 --extra-tools 0,100
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+
+from mcp.types import Tool
+
+from example2 import mcp
+
+SAMPLE_CALLS = [
+    "add|3|4",
+    "power|2|10",
+    "sqrt|49",
+    "fibonacci_nth|90",
+    "strings_to_chars_to_int|INDIA",
+    "int_list_to_exponential_sum|73|78|68|73|65",
+    "add_list|[1,2,3,4,5,6,7,8]",
+    "draw_rectangle|780|380|1140|700",
+]
+
+
+def load_agent():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "talk2mcp-2.py")
+    spec = importlib.util.spec_from_file_location("talk2mcp2", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_linear(tools, func_name, params):
+    """The agent loop before ToolRegistry, minus its debug prints"""
+    params = list(params)
+    tool = next((t for t in tools if t.name == func_name), None)
+    if not tool:
+        raise ValueError(f"Unknown tool: {func_name}")
+    arguments = {}
+    for param_name, param_info in tool.inputSchema.get('properties', {}).items():
+        if not params:
+            # Later optional parameters (e.g. mode) did not exist before the registry
+            break
+        value = params.pop(0)
+        param_type = param_info.get('type', 'string')
+        if param_type == 'integer':
+            arguments[param_name] = int(value)
+        elif param_type == 'number':
+            arguments[param_name] = float(value)
+        elif param_type == 'array':
+            if func_name == "int_list_to_exponential_sum":
+                arguments[param_name] = [int(value)] + [int(p.strip()) for p in params]
+                params.clear()
+            else:
+                value = value.strip('[]').split(',')
+                arguments[param_name] = [int(x.strip()) for x in value]
+        else:
+            arguments[param_name] = str(value)
+    return arguments
+
+
+def synthetic_tools(count):
+    schema = {"type": "object", "properties": {"a": {"type": "integer"}}, "required": ["a"]}
+    return [Tool(name=f"extra_{i}", description="Synthetic tool", inputSchema=schema) for i in range(count)]
+
+
+def measure(label, parse, calls):
+    start = time.perf_counter()
+    for func_name, params in calls:
+        parse(func_name, params)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {len(calls) / elapsed:>12,.0f} {elapsed / len(calls) * 1e6:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FUNCTION_CALL parse throughput benchmark')
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--extra-tools', default='0,100', help='comma-separated synthetic tool counts')
+    args = parser.parse_args()
+
+    agent = load_agent()
+    logging.disable(logging.CRITICAL)
+    server_tools = asyncio.run(mcp.list_tools())
+    parsed = [line.split('|') for line in SAMPLE_CALLS]
+    calls = [(parts[0], parts[1:]) for parts in parsed] * (args.calls // len(parsed))
+
+    print(f"{len(calls)} calls over {len(SAMPLE_CALLS)} call shapes")
+    print(f"{'parser':<34} {'calls/s':>12} {'us/call':>8}")
+    for extra in (int(n) for n in args.extra_tools.split(',')):
+        tools = synthetic_tools(extra) + server_tools
+        start = time.perf_counter()
+        registry = agent.ToolRegistry(tools)
+        compile_ms = (time.perf_counter() - start) * 1000
+        print(f"-- {len(tools)} tools (registry compiled in {compile_ms:.1f} ms)")
+        measure("linear scan + if/elif (before)", lambda name, params: parse_linear(tools, name, params), calls)
+        measure("ToolRegistry.parse", registry.parse, calls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,537 @@
+# Canvas backends for the Paint tools of example2.py
+import asyncio
+import logging
+import os
+import sys
+import time
+from PIL import Image as PILImage, ImageColor, ImageDraw, ImageFont
+
+# pywinauto and pywin32 only exist on Windows; PaintCanvas needs them, PillowCanvas does not
+try:
+    from pywinauto.application import Application
+    import win32gui
+    import win32con
+except ImportError:
+    Application = None
+    win32gui = None
+    win32con = None
+
+logger = logging.getLogger(__name__)
+
+# Size and background of the headless canvas
+CANVAS_WIDTH = int(os.getenv("CANVAS_WIDTH", "1280"))
+CANVAS_HEIGHT = int(os.getenv("CANVAS_HEIGHT", "720"))
+CANVAS_BACKGROUND = "white"
+
+# Where add_text puts text and in which color; matches what the Paint automation clicks
+DEFAULT_TEXT_POSITION = (500, 300)
+DEFAULT_TEXT_COLOR = "green"
+DEFAULT_OUTLINE_COLOR = "black"
+
+# Primitives draw_scene understands, with their required fields
+SCENE_PRIMITIVES = {
+    "rectangle": ("x1", "y1", "x2", "y2"),
+    "line": ("x1", "y1", "x2", "y2"),
+    "ellipse": ("x1", "y1", "x2", "y2"),
+    "text": ("x", "y", "text"),
+}
+MAX_SCENE_PRIMITIVES = 5000
+# Optional style fields of draw_scene primitives
+SCENE_STYLES = ("color", "fill", "width", "font_size")
+
+
+def validate_primitive(index, primitive):
+    """
+    Check one draw_scene primitive and fill in its defaults: color, fill (rectangle and ellipse),
+    width (shapes) and font_size (text). Raises ValueError naming the primitive's index.
+    """
+    if not isinstance(primitive, dict):
+        raise ValueError(f"Primitive {index} must be an object, got {type(primitive).__name__}")
+    kind = primitive.get("type")
+    if kind not in SCENE_PRIMITIVES:
+        raise ValueError(f"Primitive {index} has unknown type {kind!r}, expected one of {', '.join(SCENE_PRIMITIVES)}")
+    missing = [key for key in SCENE_PRIMITIVES[kind] if key not in primitive]
+    if missing:
+        raise ValueError(f"Primitive {index} ({kind}) is missing {', '.join(missing)}")
+    try:
+        normalized = {"type": kind}
+        for key in SCENE_PRIMITIVES[kind]:
+            normalized[key] = str(primitive[key]) if key == "text" else int(primitive[key])
+        default_color = DEFAULT_TEXT_COLOR if kind == "text" else DEFAULT_OUTLINE_COLOR
+        normalized["color"] = primitive.get("color") or default_color
+        ImageColor.getrgb(normalized["color"])
+        if kind == "text":
+            normalized["font_size"] = int(primitive["font_size"]) if primitive.get("font_size") else None
+        else:
+            normalized["width"] = int(primitive.get("width") or 1)
+        if kind in ("rectangle", "ellipse"):
+            normalized["fill"] = primitive.get("fill")
+            if normalized["fill"]:
+                ImageColor.getrgb(normalized["fill"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Primitive {index} ({kind}): {e}") from e
+    return normalized
+
+def validate_scene(primitives, supported_types=tuple(SCENE_PRIMITIVES)):
+    """
+    Validate a whole scene before anything is drawn. Primitives of a type outside
+    supported_types (what the canvas backend can draw) are rejected as well.
+    """
+    if len(primitives) > MAX_SCENE_PRIMITIVES:
+        raise ValueError(f"A scene can have at most {MAX_SCENE_PRIMITIVES} primitives, got {len(primitives)}")
+    scene = [validate_primitive(index, primitive) for index, primitive in enumerate(primitives)]
+    unsupported = [f"{index} ({primitive['type']})" for index, primitive in enumerate(scene)
+                   if primitive["type"] not in supported_types]
+    if unsupported:
+        raise ValueError(f"This canvas can only draw {', '.join(supported_types)}; "
+                         f"unsupported primitive(s): {', '.join(unsupported[:10])}")
+    return scene
+
+def ignored_styles(primitives, supported_styles):
+    """Style fields set in primitives that a backend honoring only supported_styles ignores"""
+    return sorted({key for primitive in primitives for key in SCENE_STYLES
+                   if key not in supported_styles and primitive.get(key)})
+
+
+class CanvasBackend:
+    """A drawing surface the Paint tools render on"""
+    name = "base"
+    # Primitive types draw_scene can render, and the style fields it honors
+    supported_primitives = tuple(SCENE_PRIMITIVES)
+    supported_styles = SCENE_STYLES
+
+    @property
+    def is_open(self):
+        raise NotImplementedError
+
+    async def open(self):
+        """Start with a blank canvas"""
+        raise NotImplementedError
+
+    async def draw_rectangle(self, x1, y1, x2, y2):
+        raise NotImplementedError
+
+    async def draw_line(self, x1, y1, x2, y2):
+        raise NotImplementedError(f"The {self.name} canvas cannot draw lines")
+
+    async def draw_ellipse(self, x1, y1, x2, y2):
+        raise NotImplementedError(f"The {self.name} canvas cannot draw ellipses")
+
+    async def add_text(self, text, x=None, y=None):
+        """Write text, at DEFAULT_TEXT_POSITION unless x and y are given. Returns the position used"""
+        raise NotImplementedError
+
+    async def draw_scene(self, primitives):
+        """
+        Draw primitives already checked by validate_scene, one operation each.
+        Backends that can render a whole scene at once override this.
+        """
+        for primitive in primitives:
+            if primitive["type"] == "text":
+                await self.add_text(primitive["text"], primitive["x"], primitive["y"])
+            else:
+                draw = getattr(self, f"draw_{primitive['type']}")
+                await draw(primitive["x1"], primitive["y1"], primitive["x2"], primitive["y2"])
+
+    async def get_image(self):
+        """Current contents of the canvas as a PIL image"""
+        raise NotImplementedError
+
+    async def save(self, path):
+        image = await self.get_image()
+        image.save(path)
+        return path
+
+
+class PillowCanvas(CanvasBackend):
+    """Headless canvas that renders into an in-memory image"""
+    name = "pillow"
+
+    def __init__(self, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, background=CANVAS_BACKGROUND):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.image = None
+        self._draw = None
+        self._fonts = {None: ImageFont.load_default()}
+
+    @property
+    def is_open(self):
+        return self.image is not None
+
+    async def open(self):
+        self.image = PILImage.new("RGB", (self.width, self.height), self.background)
+        self._draw = ImageDraw.Draw(self.image)
+
+    def _font(self, size):
+        if size not in self._fonts:
+            self._fonts[size] = ImageFont.load_default(size)
+        return self._fonts[size]
+
+    def _render(self, primitive):
+        """Draw one validated primitive onto the image"""
+        kind = primitive["type"]
+        if kind == "text":
+            self._draw.text((primitive["x"], primitive["y"]), primitive["text"],
+                            fill=primitive["color"], font=self._font(primitive["font_size"]))
+            return
+        x1, y1, x2, y2 = primitive["x1"], primitive["y1"], primitive["x2"], primitive["y2"]
+        if kind == "line":
+            self._draw.line((x1, y1, x2, y2), fill=primitive["color"], width=primitive["width"])
+            return
+        box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        shape = self._draw.rectangle if kind == "rectangle" else self._draw.ellipse
+        shape(box, outline=primitive["color"], fill=primitive["fill"], width=primitive["width"])
+
+    async def draw_rectangle(self, x1, y1, x2, y2):
+        self._render(validate_primitive(0, {"type": "rectangle", "x1": x1, "y1": y1, "x2": x2, "y2": y2}))
+
+    async def draw_line(self, x1, y1, x2, y2):
+        self._render(validate_primitive(0, {"type": "line", "x1": x1, "y1": y1, "x2": x2, "y2": y2}))
+
+    async def draw_ellipse(self, x1, y1, x2, y2):
+        self._render(validate_primitive(0, {"type": "ellipse", "x1": x1, "y1": y1, "x2": x2, "y2": y2}))
+
+    async def add_text(self, text, x=None, y=None):
+        if x is None or y is None:
+            x, y = DEFAULT_TEXT_POSITION
+        self._render(validate_primitive(0, {"type": "text", "x": x, "y": y, "text": text}))
+        return x, y
+
+    async def draw_scene(self, primitives):
+        # Everything is drawn in one pass on the same ImageDraw
+        for primitive in primitives:
+            self._render(primitive)
+
+    async def get_image(self):
+        return self.image.copy()
+
+
+# UI AUTOMATION
+
+# Seconds to wait for Paint to start, and for any other UI step to be ready
+PAINT_START_TIMEOUT = float(os.getenv("PAINT_START_TIMEOUT", "15"))
+UI_WAIT_TIMEOUT = float(os.getenv("UI_WAIT_TIMEOUT", "5"))
+# Seconds between two checks of a readiness condition
+UI_POLL_INTERVAL = 0.05
+# Milliseconds a window may take to answer the WM_NULL idle probe
+IDLE_PROBE_MS = 50
+
+# Toolbar positions in the maximized Paint window
+RECTANGLE_TOOL_COORDS = (445, 70)
+TEXT_TOOL_COORDS = (290, 70)
+GREEN_COLOR_COORDS = (895, 61)
+# Clicking here ends text entry
+TEXT_DONE_COORDS = (50, 50)
+
+
+async def wait_until(condition, timeout=UI_WAIT_TIMEOUT, interval=UI_POLL_INTERVAL, description="condition"):
+    """
+    Poll condition() until it returns something truthy and return that, sleeping on the
+    event loop in between. Raises TimeoutError after timeout seconds
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        if loop.time() >= deadline:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {description}")
+        await asyncio.sleep(interval)
+
+
+class UiDriver:
+    """Low-level Paint UI operations PaintCanvas is built on. All of them return immediately"""
+
+    def start(self):
+        raise NotImplementedError
+
+    def window_exists(self):
+        raise NotImplementedError
+
+    def maximize(self):
+        raise NotImplementedError
+
+    def is_maximized(self):
+        raise NotImplementedError
+
+    def has_focus(self):
+        raise NotImplementedError
+
+    def set_focus(self):
+        raise NotImplementedError
+
+    def click_window(self, coords):
+        raise NotImplementedError
+
+    def click_canvas(self, coords):
+        raise NotImplementedError
+
+    def press_canvas(self, coords):
+        raise NotImplementedError
+
+    def release_canvas(self, coords):
+        raise NotImplementedError
+
+    def type_keys(self, text):
+        raise NotImplementedError
+
+    def is_idle(self):
+        """True once Paint has processed its pending messages"""
+        raise NotImplementedError
+
+    def canvas_rect(self):
+        """(left, top, right, bottom) of the canvas on screen"""
+        raise NotImplementedError
+
+    def capture_canvas(self):
+        raise NotImplementedError
+
+
+class PywinautoDriver(UiDriver):
+    """Drives mspaint.exe through pywinauto and pywin32"""
+
+    def __init__(self):
+        if Application is None:
+            raise RuntimeError("The paint canvas needs Windows with pywinauto and pywin32 installed")
+        self.app = None
+
+    def _window(self):
+        return self.app.window(class_name='MSPaintApp')
+
+    def _canvas(self):
+        return self._window().child_window(class_name='MSPaintView')
+
+    def start(self):
+        # Return right away; PaintCanvas waits for the window itself without blocking the event loop
+        self.app = Application().start('mspaint.exe', wait_for_idle=False)
+
+    def window_exists(self):
+        return self.app is not None and self._window().exists(timeout=0)
+
+    def maximize(self):
+        win32gui.ShowWindow(self._window().handle, win32con.SW_MAXIMIZE)
+
+    def is_maximized(self):
+        return win32gui.GetWindowPlacement(self._window().handle)[1] == win32con.SW_SHOWMAXIMIZED
+
+    def has_focus(self):
+        return self._window().has_focus()
+
+    def set_focus(self):
+        self._window().set_focus()
+
+    def click_window(self, coords):
+        self._window().click_input(coords=coords)
+
+    def click_canvas(self, coords):
+        self._canvas().click_input(coords=coords)
+
+    def press_canvas(self, coords):
+        self._canvas().press_mouse_input(coords=coords)
+
+    def release_canvas(self, coords):
+        self._canvas().release_mouse_input(coords=coords)
+
+    def type_keys(self, text):
+        self._window().type_keys(text, with_spaces=True)
+
+    def is_idle(self):
+        # A hung or busy window does not answer WM_NULL within IDLE_PROBE_MS
+        try:
+            win32gui.SendMessageTimeout(self._window().handle, win32con.WM_NULL, 0, 0,
+                                        win32con.SMTO_ABORTIFHUNG, IDLE_PROBE_MS)
+            return True
+        except win32gui.error:
+            return False
+
+    def canvas_rect(self):
+        rect = self._canvas().rectangle()
+        return rect.left, rect.top, rect.right, rect.bottom
+
+    def capture_canvas(self):
+        from PIL import ImageGrab
+        return ImageGrab.grab(bbox=self.canvas_rect())
+
+
+class FakeUiDriver(UiDriver):
+    """
+    Stand-in for Paint that records every action. The window appears startup_delay seconds
+    after start(), and each action keeps it busy for busy_delay seconds
+    """
+
+    def __init__(self, startup_delay=0.2, busy_delay=0.02, width=CANVAS_WIDTH, height=CANVAS_HEIGHT):
+        self.startup_delay = startup_delay
+        self.busy_delay = busy_delay
+        self.width = width
+        self.height = height
+        self.actions = []
+        self.maximized = False
+        self.focused = False
+        self._window_at = None
+        self._busy_until = 0.0
+
+    def _act(self, *action):
+        self.actions.append(action)
+        self._busy_until = time.monotonic() + self.busy_delay
+
+    def start(self):
+        self.actions.append(("start",))
+        self._window_at = time.monotonic() + self.startup_delay
+
+    def window_exists(self):
+        return self._window_at is not None and time.monotonic() >= self._window_at
+
+    def maximize(self):
+        self._act("maximize")
+        self.maximized = True
+
+    def is_maximized(self):
+        return self.maximized and self.is_idle()
+
+    def has_focus(self):
+        return self.focused
+
+    def set_focus(self):
+        self._act("set_focus")
+        self.focused = True
+
+    def click_window(self, coords):
+        self._act("click_window", coords)
+
+    def click_canvas(self, coords):
+        self._act("click_canvas", coords)
+
+    def press_canvas(self, coords):
+        self._act("press_canvas", coords)
+
+    def release_canvas(self, coords):
+        self._act("release_canvas", coords)
+
+    def type_keys(self, text):
+        self._act("type_keys", text)
+
+    def is_idle(self):
+        return time.monotonic() >= self._busy_until
+
+    def canvas_rect(self):
+        return 0, 0, self.width, self.height
+
+    def capture_canvas(self):
+        return PILImage.new("RGB", (self.width, self.height), CANVAS_BACKGROUND)
+
+
+class PaintCanvas(CanvasBackend):
+    """Microsoft Paint, where every UI step waits for Paint to be ready instead of sleeping"""
+    name = "paint"
+    # Paint's default rectangle tool and green text only; no lines, ellipses or styles
+    supported_primitives = ("rectangle", "text")
+    supported_styles = ()
+
+    def __init__(self, driver=None, timeout=UI_WAIT_TIMEOUT):
+        self.driver = driver or PywinautoDriver()
+        self.timeout = timeout
+        self.opened = False
+
+    @property
+    def is_open(self):
+        return self.opened
+
+    async def _wait(self, condition, description, timeout=None):
+        return await wait_until(condition, timeout or self.timeout, description=description)
+
+    async def _idle(self, step):
+        await self._wait(self.driver.is_idle, f"Paint to become idle after {step}")
+
+    async def _focus(self):
+        # Ensure Paint window is active
+        if not self.driver.has_focus():
+            self.driver.set_focus()
+            await self._wait(self.driver.has_focus, "Paint window focus")
+
+    async def open(self):
+        logger.debug("Starting Paint opening operation")
+        self.driver.start()
+        await self._wait(self.driver.window_exists, "Paint window", PAINT_START_TIMEOUT)
+
+        self.driver.maximize()
+        await self._wait(self.driver.is_maximized, "Paint window to maximize")
+        await self._idle("maximizing")
+        logger.debug(f"Canvas rectangle: {self.driver.canvas_rect()}")
+        self.opened = True
+
+    async def draw_rectangle(self, x1, y1, x2, y2):
+        logger.debug("Starting rectangle drawing operation")
+        await self._focus()
+
+        # Click Rectangle tool
+        self.driver.click_window(RECTANGLE_TOOL_COORDS)
+        await self._idle("selecting the rectangle tool")
+
+        # Draw rectangle - coordinates are relative to the canvas
+        logger.debug(f"Drawing rectangle from ({x1},{y1}) to ({x2},{y2})")
+        self.driver.click_canvas((x1, y1))
+        await self._idle("clicking the canvas")
+        self.driver.press_canvas((x1, y1))
+        await self._idle("pressing the mouse")
+        self.driver.release_canvas((x2, y2))
+        await self._idle("releasing the mouse")
+
+    async def add_text(self, text, x=None, y=None):
+        logger.debug("Starting text addition operation")
+        await self._focus()
+
+        # Select green color, then the Text tool
+        self.driver.click_window(GREEN_COLOR_COORDS)
+        await self._idle("selecting green")
+        self.driver.click_window(TEXT_TOOL_COORDS)
+        await self._idle("selecting the text tool")
+
+        # Click to start typing
+        if x is None or y is None:
+            x, y = DEFAULT_TEXT_POSITION
+        logger.debug(f"Clicking for text at ({x}, {y})")
+        self.driver.click_canvas((x, y))
+        await self._idle("placing the text box")
+
+        # type_keys paces its keystrokes itself, so keep it off the event loop
+        logger.debug(f"Typing text: '{text}'")
+        await asyncio.to_thread(self.driver.type_keys, text)
+        await self._idle("typing")
+
+        # Click outside to finish
+        self.driver.click_canvas(TEXT_DONE_COORDS)
+        await self._idle("finishing the text")
+        return x, y
+
+    async def get_image(self):
+        return self.driver.capture_canvas()
+
+
+class FakePaintCanvas(PaintCanvas):
+    """PaintCanvas on a FakeUiDriver, to exercise the automation flow without Windows"""
+    name = "paint-fake"
+
+    def __init__(self):
+        super().__init__(FakeUiDriver())
+
+
+# Backends selectable with --canvas or CANVAS_BACKEND
+CANVAS_BACKENDS = {
+    PillowCanvas.name: PillowCanvas,
+    PaintCanvas.name: PaintCanvas,
+    FakePaintCanvas.name: FakePaintCanvas,
+}
+
+def default_backend_name():
+    """CANVAS_BACKEND if set, otherwise paint on Windows and pillow elsewhere"""
+    return os.getenv("CANVAS_BACKEND") or ("paint" if sys.platform == "win32" else "pillow")
+
+def create_canvas(name=None):
+    """Instantiate a canvas backend by name"""
+    name = name or default_backend_name()
+    if name not in CANVAS_BACKENDS:
+        raise ValueError(f"Unknown canvas backend '{name}', expected one of {', '.join(CANVAS_BACKENDS)}")
+    logger.info(f"Using canvas backend: {name}")
+    return CANVAS_BACKENDS[name]()
@@ -1,20 +1,31 @@
 # basic import 
-from mcp.server.fastmcp import FastMCP, Image
+from mcp.server.fastmcp import FastMCP, Image, Context
 from mcp.server.fastmcp.prompts import base
 from mcp.types import TextContent
 from mcp import types
-from PIL import Image as PILImage
+import numpy as np
 import math
+import decimal
+from decimal import Decimal, localcontext
+import base64
+import io
+import json
+import hashlib
+import functools
+import inspect
+import asyncio
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 import sys
-from pywinauto.application import Application
-import win32gui
-import win32con
-import time
-from win32api import GetSystemMetrics
 import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from canvas import create_canvas, ignored_styles, validate_scene
+from thumbnails import generate_thumbnails, find_images, thumbnail_batch, validate_request, write_index, DEFAULT_THUMBNAIL_SIZE, THUMBNAIL_CACHE_DIR
 
 
 
@@ -44,6 +55,325 @@ logger = logging.getLogger(__name__)
 # instantiate an MCP server client
 mcp = FastMCP("Calculator")
 
+# RESULT CACHING FOR PURE TOOLS
+
+# Entries kept per tool, and the largest result (in bytes) worth keeping
+TOOL_CACHE_MAXSIZE = 128
+TOOL_CACHE_MAX_VALUE_BYTES = 1024 * 1024
+# Calls with a list argument longer than this bypass the cache; encoding the key would cost more than it saves
+TOOL_CACHE_MAX_KEY_ITEMS = 10000
+
+# Caches of every @cached_tool function, by tool name
+_TOOL_CACHES = {}
+
+def _value_size(value):
+    """Approximate size in bytes of a tool result"""
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, int):
+        return (value.bit_length() + 7) // 8 or 1
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_value_size(k) + _value_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+def cached_tool(maxsize=TOOL_CACHE_MAXSIZE, max_value_bytes=TOOL_CACHE_MAX_VALUE_BYTES):
+    """
+    Memoize a pure tool with a bounded LRU cache. Place it below @mcp.tool().
+    Results larger than max_value_bytes (e.g. huge factorials) are returned but not kept.
+    Never use it on tools with side effects such as open_paint.
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        stats = {"hits": 0, "misses": 0, "evictions": 0, "skipped_too_large": 0}
+        _TOOL_CACHES[func.__name__] = (cache, stats, maxsize)
+
+        def cache_key(args, kwargs):
+            """Key of a call, or None when the call should bypass the cache"""
+            if any(isinstance(value, (list, tuple)) and len(value) > TOOL_CACHE_MAX_KEY_ITEMS
+                   for value in (*args, *kwargs.values())):
+                stats["skipped_too_large"] += 1
+                return None
+            return hashlib.sha256(json.dumps([args, kwargs], sort_keys=True, default=repr).encode()).hexdigest()
+
+        def lookup(key):
+            if key in cache:
+                cache.move_to_end(key)
+                stats["hits"] += 1
+                logger.info(f"CACHE HIT: {func.__name__}")
+                return True, cache[key]
+            stats["misses"] += 1
+            return False, None
+
+        def store(key, result):
+            if _value_size(result) > max_value_bytes:
+                stats["skipped_too_large"] += 1
+                return
+            cache[key] = result
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+                stats["evictions"] += 1
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = cache_key(args, kwargs)
+                if key is None:
+                    return await func(*args, **kwargs)
+                hit, result = lookup(key)
+                if not hit:
+                    result = await func(*args, **kwargs)
+                    store(key, result)
+                return result
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = cache_key(args, kwargs)
+                if key is None:
+                    return func(*args, **kwargs)
+                hit, result = lookup(key)
+                if not hit:
+                    result = func(*args, **kwargs)
+                    store(key, result)
+                return result
+
+        return wrapper
+    return decorator
+
+# PROCESS POOL FOR CPU-BOUND TOOLS
+
+# Seconds a @cpu_bound tool may run before it is abandoned, and the number of worker processes
+CPU_TOOL_TIMEOUT = float(os.getenv("CPU_TOOL_TIMEOUT", "30"))
+CPU_POOL_PROCESSES = int(os.getenv("CPU_POOL_PROCESSES", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+# Undecorated functions of every @cpu_bound tool, by name. Workers look them up here,
+# because the module-level names refer to the async wrappers, which cannot be pickled
+_CPU_BOUND_FUNCS = {}
+
+# Queue on which a worker reports each job it picks up, set by _init_worker in every worker
+_started_queue = None
+
+def _init_worker(started_queue):
+    global _started_queue
+    _started_queue = started_queue
+
+def _run_registered(job_id, attempt, name, args, kwargs):
+    """Entry point in the worker process: report the job as started, then run the registered function"""
+    _started_queue.put((job_id, attempt))
+    return _CPU_BOUND_FUNCS[name](*args, **kwargs)
+
+def _settle(future, result, error):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class CpuJob:
+    """A call in the CPU pool. Its timeout runs from the moment a worker picks it up"""
+    def __init__(self, name, args, kwargs, timeout, loop):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.future = loop.create_future()
+        self.expired = loop.create_future()
+        # Bumped on every (re)submission, so start reports from a terminated pool are ignored
+        self.attempt = 0
+        self.timer = None
+
+    def stop_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+class CpuPool:
+    """
+    multiprocessing.Pool for @cpu_bound tools.
+    A pool cannot stop a single job, so a job that times out or is cancelled is abandoned by
+    terminating the workers; the other jobs still in flight are resubmitted to a fresh pool.
+    A job's timeout only counts time spent running on a worker: not time waiting in the queue,
+    and not the time a resubmitted job waits for the fresh pool to start.
+    """
+    def __init__(self, processes=CPU_POOL_PROCESSES):
+        self.processes = processes
+        self._pool = None
+        self._stop_watcher = None
+        self._jobs = {}
+        self._next_id = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "cancelled": 0, "restarts": 0}
+
+    def start(self):
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            started_queue = context.Queue()
+            self._pool = context.Pool(self.processes, initializer=_init_worker, initargs=(started_queue,))
+            self._stop_watcher = threading.Event()
+            threading.Thread(target=self._watch_started, args=(started_queue, self._stop_watcher),
+                             name="cpu-pool-started", daemon=True).start()
+            logger.info(f"Started CPU pool with {self.processes} processes")
+        return self._pool
+
+    def _watch_started(self, started_queue, stop):
+        """Thread forwarding start reports of the workers to the event loop of each job"""
+        while not stop.is_set():
+            try:
+                job_id, attempt = started_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.future.get_loop().call_soon_threadsafe(self._job_started, job_id, attempt)
+        started_queue.close()
+
+    def _job_started(self, job_id, attempt):
+        """A worker picked up the job: start its timeout"""
+        job = self._jobs.get(job_id)
+        if job is None or job.attempt != attempt or job.future.done():
+            return
+        job.stop_timer()
+        job.timer = job.future.get_loop().call_later(job.timeout, _settle, job.expired, True, None)
+
+    def _submit(self, job_id):
+        job = self._jobs[job_id]
+        job.stop_timer()
+        job.attempt += 1
+        loop = job.future.get_loop()
+        self.start().apply_async(
+            _run_registered, (job_id, job.attempt, job.name, job.args, job.kwargs),
+            callback=lambda result: loop.call_soon_threadsafe(_settle, job.future, result, None),
+            error_callback=lambda error: loop.call_soon_threadsafe(_settle, job.future, None, error),
+        )
+
+    def _stop(self):
+        """Detach the current pool and its watcher thread, returning the pool"""
+        old_pool, self._pool = self._pool, None
+        self._stop_watcher.set()
+        return old_pool
+
+    def _abandon(self, job_id):
+        """Drop a job and restart the workers so it stops running"""
+        job = self._jobs.pop(job_id)
+        job.stop_timer()
+        if self._pool is None or (job.future.done() and not job.future.cancelled()):
+            return
+        old_pool = self._stop()
+        self.stats["restarts"] += 1
+        logger.warning(f"Restarting CPU pool, resubmitting {len(self._jobs)} other job(s)")
+        for other_id in list(self._jobs):
+            self._submit(other_id)
+        # terminate() joins the workers; keep that off the event loop
+        job.future.get_loop().run_in_executor(None, old_pool.terminate)
+
+    async def run(self, name, args, kwargs, timeout):
+        job = CpuJob(name, args, kwargs, timeout, asyncio.get_running_loop())
+        job_id = self._next_id
+        self._next_id += 1
+        self._jobs[job_id] = job
+        self.stats["submitted"] += 1
+        try:
+            self._submit(job_id)
+            await asyncio.wait((job.future, job.expired), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            self._abandon(job_id)
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            self._jobs.pop(job_id, None)
+            raise
+        if not job.future.done():
+            self.stats["timeouts"] += 1
+            self._abandon(job_id)
+            raise TimeoutError(f"{name} did not finish within {timeout} seconds")
+        job.stop_timer()
+        self._jobs.pop(job_id, None)
+        if job.future.exception() is not None:
+            self.stats["failed"] += 1
+            raise job.future.exception()
+        self.stats["completed"] += 1
+        return job.future.result()
+
+    def close(self):
+        if self._pool is not None:
+            self._stop().terminate()
+
+_cpu_pool = CpuPool()
+
+def cpu_bound(timeout=CPU_TOOL_TIMEOUT):
+    """
+    Run a tool in the CPU pool so it does not block the event loop. Place it below
+    @cached_tool() so cache hits never reach the pool. Arguments and results must be picklable.
+    """
+    def decorator(func):
+        _CPU_BOUND_FUNCS[func.__name__] = func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await _cpu_pool.run(func.__name__, args, kwargs, timeout)
+
+        return wrapper
+    return decorator
+
+# BIG INTEGER RESULTS
+
+# Refuse results longer than this many decimal digits; the estimate is checked before any work is done
+MAX_RESULT_DIGITS = 1_000_000
+# Ints up to this many bits are returned as numbers, larger ones as decimal strings
+# (Python refuses str() of ints above 4300 digits)
+INT_RESULT_MAX_BITS = 13000
+# Largest page fibonacci_numbers will return in paged mode
+FIB_MAX_PAGE_SIZE = 10000
+# log10 of the golden ratio, i.e. decimal digits added per Fibonacci index
+FIB_DIGITS_PER_INDEX = 0.20898764024997873
+
+def _check_result_digits(digits, what):
+    """Raise ValueError if an estimated result size is over MAX_RESULT_DIGITS"""
+    if digits > MAX_RESULT_DIGITS:
+        raise ValueError(f"{what} would have about {int(digits)} digits, over the limit of {MAX_RESULT_DIGITS}")
+
+def int_to_decimal_string(n):
+    """Decimal string of an int of any size, splitting it in halves so the conversion stays subquadratic"""
+    with localcontext() as ctx:
+        ctx.prec = decimal.MAX_PREC
+        ctx.Emax = decimal.MAX_EMAX
+        ctx.Emin = decimal.MIN_EMIN
+        ctx.traps[decimal.Inexact] = True
+
+        @functools.lru_cache(maxsize=None)
+        def power_of_two(bits):
+            return Decimal(2) ** bits
+
+        def convert(value, bits):
+            if bits <= 4096:
+                return Decimal(value)
+            low_bits = bits >> 1
+            high = value >> low_bits
+            low = value - (high << low_bits)
+            return convert(high, bits - low_bits) * power_of_two(low_bits) + convert(low, low_bits)
+
+        result = convert(abs(n), n.bit_length())
+    return ("-" if n < 0 else "") + str(result)
+
+def _format_int(n):
+    """Return n itself when it is small enough to serialize, otherwise its decimal string"""
+    if n.bit_length() <= INT_RESULT_MAX_BITS:
+        return n
+    return int_to_decimal_string(n)
+
+def _fib_pair(n):
+    """Return (F(n), F(n+1)) by fast doubling"""
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        a, b = (d, c + d) if bit == "1" else (c, d)
+    return a, b
+
 # DEFINE TOOLS
 
 #addition tool
@@ -82,9 +412,14 @@ def divide(a: int, b: int) -> float:
 
 # power tool
 @mcp.tool()
+@cached_tool()
+@cpu_bound()
 def power(a: int, b: int) -> int:
-    """Power of two numbers"""
+    """Power of two numbers. Results above INT_RESULT_MAX_BITS come back as decimal strings"""
     logger.info("CALLED: power(a: int, b: int) -> int:")
+    if b > 0 and abs(a) > 1:
+        _check_result_digits(b * math.log10(abs(a)), f"{a} ** {b}")
+        return _format_int(a ** b)
     return int(a ** b)
 
 # square root tool
@@ -103,10 +438,15 @@ def cbrt(a: int) -> float:
 
 # factorial tool
 @mcp.tool()
+@cached_tool()
+@cpu_bound()
 def factorial(a: int) -> int:
-    """factorial of a number"""
+    """factorial of a number. Results above INT_RESULT_MAX_BITS come back as decimal strings"""
     logger.info("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+    if a < 0:
+        raise ValueError("factorial() not defined for negative values")
+    _check_result_digits(math.lgamma(a + 1) / math.log(10), f"{a}!")
+    return _format_int(math.factorial(a))
 
 # log tool
 @mcp.tool()
@@ -151,12 +491,70 @@ def mine(a: int, b: int) -> int:
     return int(a - b - b)
 
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
-    """Create a thumbnail from an image"""
-    logger.info("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+@cpu_bound()
+def create_thumbnail(image_path: str, sizes: list[int] | None = None, format: str = "png") -> list[Image]:
+    """Create thumbnails of an image, one per size in pixels (default 100), as png or webp"""
+    logger.info("CALLED: create_thumbnail(image_path: str, sizes: list[int] | None = None, format: str = \"png\") -> list[Image]:")
+    paths = generate_thumbnails(image_path, sizes or [DEFAULT_THUMBNAIL_SIZE], format)
+    return [Image(path=paths[size]) for size in (sizes or [DEFAULT_THUMBNAIL_SIZE])]
+
+# Worker processes of create_thumbnails, and the most images sent to a worker at once
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", str(os.cpu_count() or 1)))
+THUMBNAIL_CHUNK_SIZE = 64
+# Failed images listed in the create_thumbnails result; the index has all of them
+THUMBNAIL_ERRORS_SHOWN = 10
+
+@mcp.tool()
+async def create_thumbnails(source: str, ctx: Context, sizes: list[int] | None = None, format: str = "png",
+                            recursive: bool = False, index_path: str = "") -> dict:
+    """
+    Create thumbnails of every image in a directory or matching a glob, in parallel, and write
+    a JSON index mapping each image to its thumbnail files (by default in the thumbnail cache).
+    Reports progress after each batch
+    """
+    logger.info("CALLED: create_thumbnails(source: str, sizes: list[int] | None = None, format: str = \"png\", recursive: bool = False, index_path: str = \"\") -> dict:")
+    sizes = sizes or [DEFAULT_THUMBNAIL_SIZE]
+    validate_request(sizes, format)
+    image_paths = await asyncio.to_thread(find_images, source, recursive)
+    total = len(image_paths)
+    if not index_path:
+        index_path = os.path.join(THUMBNAIL_CACHE_DIR, f"index-{hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:12]}.json")
+
+    # Small enough chunks that every worker gets several, large enough to amortize IPC
+    chunk_size = max(1, min(THUMBNAIL_CHUNK_SIZE, total // (THUMBNAIL_WORKERS * 4)))
+    chunks = [image_paths[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    entries = []
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=max(1, min(THUMBNAIL_WORKERS, len(chunks))),
+                                   mp_context=multiprocessing.get_context("spawn"))
+    try:
+        jobs = [loop.run_in_executor(executor, thumbnail_batch, chunk, sizes, format) for chunk in chunks]
+        for job in asyncio.as_completed(jobs):
+            entries.extend(await job)
+            await ctx.report_progress(len(entries), total)
+    finally:
+        # On error or cancellation, drop the batches that have not started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    entries.sort(key=lambda entry: entry["source"])
+    errors = [entry for entry in entries if "error" in entry]
+    index = {
+        "source": source,
+        "sizes": sizes,
+        "format": format,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "images": [entry for entry in entries if "error" not in entry],
+        "errors": errors,
+    }
+    await asyncio.to_thread(write_index, index_path, index)
+    logger.info(f"Thumbnailed {total - len(errors)} of {total} images from {source}")
+    return {
+        "index": index_path,
+        "images": total,
+        "thumbnailed": total - len(errors),
+        "failed": len(errors),
+        "errors": errors[:THUMBNAIL_ERRORS_SHOWN],
+    }
 
 @mcp.tool()
 def strings_to_chars_to_int(string: str) -> list[int]:
@@ -164,72 +562,271 @@ def strings_to_chars_to_int(string: str) -> list[int]:
     logger.info("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
     return [int(ord(char)) for char in string]
 
+# EXPONENTIAL SUMS
+
+# Natural log of the largest float; sums of exponentials above it are returned as decimal strings
+LOG_FLOAT_MAX = math.log(sys.float_info.max)
+# Result modes of int_list_to_exponential_sum
+EXP_SUM_MODES = ("auto", "log", "decimal")
+# Significant digits of decimal exponential sums
+EXP_SUM_DECIMAL_DIGITS = 30
+# Lists up to this length get an exact Decimal sum; longer ones go through log-sum-exp
+EXP_SUM_EXACT_DECIMAL_LIMIT = 10000
+# Lists at least this long are summed with NumPy
+EXP_SUM_NUMPY_THRESHOLD = 1000
+
+def _log_sum_exp(values) -> float:
+    """Return log(sum(exp(v))) without overflowing, by factoring out the largest value"""
+    if isinstance(values, np.ndarray):
+        largest = values.max()
+        return float(largest + np.log(np.sum(np.exp(values - largest))))
+    largest = max(values)
+    return largest + math.log(math.fsum(math.exp(v - largest) for v in values))
+
+def _exp_sum_decimal(values, log_sum=None) -> str:
+    """Return sum(exp(v)) as a decimal string with EXP_SUM_DECIMAL_DIGITS significant digits"""
+    with localcontext() as ctx:
+        ctx.prec = EXP_SUM_DECIMAL_DIGITS
+        if len(values) <= EXP_SUM_EXACT_DECIMAL_LIMIT:
+            total = sum(Decimal(float(v)).exp() for v in values)
+        else:
+            # Long lists go through the float log-sum-exp, good to about 13 significant digits
+            total = Decimal(log_sum if log_sum is not None else _log_sum_exp(values)).exp()
+        return str(+total)
+
 @mcp.tool()
-def int_list_to_exponential_sum(int_list: list) -> float:
-    """Return sum of exponentials of numbers in a list"""
+@cached_tool()
+def int_list_to_exponential_sum(int_list: list, mode: str = "auto") -> float | str:
+    """Return sum of exponentials of numbers in a list. mode "auto" returns a float, or a decimal string when the sum overflows a float; "log" returns the natural log of the sum; "decimal" always returns a decimal string"""
     logger.info("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
-    return sum(math.exp(i) for i in int_list)
+    if mode not in EXP_SUM_MODES:
+        raise ValueError(f"Unknown mode {mode}; expected one of {', '.join(EXP_SUM_MODES)}")
+    if len(int_list) == 0:
+        if mode == "log":
+            raise ValueError("The log of an empty sum is undefined")
+        return "0" if mode == "decimal" else 0.0
+    vectorized = len(int_list) >= EXP_SUM_NUMPY_THRESHOLD
+    values = np.asarray(int_list, dtype=np.float64) if vectorized else [float(i) for i in int_list]
+    if mode == "decimal":
+        return _exp_sum_decimal(values)
+    # Python's max() would iterate a NumPy array element by element
+    largest = values.max() if vectorized else max(values)
+    if mode == "auto" and largest <= LOG_FLOAT_MAX:
+        if vectorized:
+            with np.errstate(over="ignore"):
+                total = float(np.sum(np.exp(values)))
+            if math.isfinite(total):
+                return total
+        else:
+            try:
+                return math.fsum(math.exp(v) for v in values)
+            except OverflowError:
+                pass  # Every term fits a float but their sum does not
+    log_sum = _log_sum_exp(values)
+    if mode == "log":
+        return log_sum
+    if log_sum <= LOG_FLOAT_MAX:
+        return math.exp(log_sum)
+    return _exp_sum_decimal(values, log_sum)
+
+@mcp.tool()
+@cached_tool()
+@cpu_bound()
+def fibonacci_numbers(n: int, start: int = 0, page_size: int = 0) -> list[int | str] | dict:
+    """
+    Return the first n Fibonacci Numbers.
+    With page_size > 0, return one page {start, values, next_start, total} of them instead;
+    next_start is None on the last page.
+    """
+    logger.info("CALLED: fibonacci_numbers(n: int, start: int = 0, page_size: int = 0) -> list[int | str] | dict:")
+    if page_size <= 0:
+        if n <= 0:
+            return []
+        _check_result_digits(FIB_DIGITS_PER_INDEX * n * n / 2, f"The first {n} Fibonacci numbers")
+        start, end = 0, n
+    else:
+        if page_size > FIB_MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be at most {FIB_MAX_PAGE_SIZE}")
+        if start < 0 or (start >= n and n > 0):
+            raise ValueError(f"start must be between 0 and {max(n - 1, 0)}")
+        end = min(n, start + page_size)
+        _check_result_digits(FIB_DIGITS_PER_INDEX * end * (end - start), f"Fibonacci numbers {start} to {end - 1}")
+    a, b = _fib_pair(start)
+    values = []
+    for _ in range(start, end):
+        values.append(_format_int(a))
+        a, b = b, a + b
+    if page_size <= 0:
+        return values
+    return {"start": start, "values": values, "next_start": end if end < n else None, "total": max(n, 0)}
 
 @mcp.tool()
-def fibonacci_numbers(n: int) -> list:
-    """Return the first n Fibonacci Numbers"""
-    logger.info("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
-        return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+@cached_tool()
+@cpu_bound()
+def fibonacci_nth(n: int) -> int:
+    """Return the nth Fibonacci Number, with F(0) = 0. Large results come back as decimal strings"""
+    logger.info("CALLED: fibonacci_nth(n: int) -> int:")
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    _check_result_digits(FIB_DIGITS_PER_INDEX * n, f"F({n})")
+    return _format_int(_fib_pair(n)[0])
+
+
+# ARRAY TOOLS: one call for a whole list of values instead of one call per value
+
+# Lanczos approximation of the gamma function (g = 7, 9 terms), good to about 13 significant digits
+LANCZOS_G = 7
+LANCZOS_COEFFICIENTS = (
+    0.99999999999980993, 676.5203681218851, -1259.1392167224028, 771.32342877765313,
+    -176.61502916214059, 12.507343278686905, -0.13857109526572012, 9.9843695780195716e-6,
+    1.5056327351493116e-7,
+)
+# n! for every n whose factorial fits a float; integer inputs are looked up here exactly
+FACTORIAL_TABLE = np.array([float(math.factorial(n)) for n in range(171)])
+
+def _gamma(x):
+    """Vectorized gamma function: inf past the float range, nan at the poles (0, -1, -2, ...)"""
+    reflect = x < 0.5
+    z = np.where(reflect, 1 - x, x) - 1
+    series = LANCZOS_COEFFICIENTS[0] + sum(c / (z + i) for i, c in enumerate(LANCZOS_COEFFICIENTS[1:], 1))
+    t = z + LANCZOS_G + 0.5
+    # t ** (z + 0.5) is split in two halves around exp(-t) so neither overflows before the product does
+    half_power = t ** ((z + 0.5) / 2)
+    gamma = np.sqrt(2 * np.pi) * half_power * np.exp(-t) * half_power * series
+    gamma = np.where(z > 171, np.inf, gamma)
+    # Reflection formula for x < 0.5: gamma(x) = pi / (sin(pi x) gamma(1 - x))
+    # sin(pi x) is taken on x minus its nearest integer, which is exact, to keep precision for large |x|
+    nearest = np.round(x)
+    sin_pi_x = np.sin(np.pi * (x - nearest)) * np.where(nearest % 2 == 0, 1.0, -1.0)
+    gamma = np.where(reflect, np.pi / (sin_pi_x * gamma), gamma)
+    return np.where((x <= 0) & (x == np.floor(x)), np.nan, gamma)
+
+def _factorial(a):
+    """Elementwise a! = gamma(a + 1), exact for the integers 0..170"""
+    result = _gamma(a + 1)
+    exact = (a >= 0) & (a < len(FACTORIAL_TABLE)) & (a == np.floor(a))
+    return np.where(exact, FACTORIAL_TABLE[np.where(exact, a, 0).astype(np.int64)], result)
+
+# Elementwise operations; binary ones take a scalar `operand` or a second array
+ELEMENTWISE_UNARY = {
+    "sqrt": np.sqrt,
+    "cbrt": np.cbrt,
+    "log": np.log,
+    "exp": np.exp,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "factorial": _factorial,
+}
+ELEMENTWISE_BINARY = {
+    "add": np.add,
+    "subtract": np.subtract,
+    "multiply": np.multiply,
+    "divide": np.divide,
+    "power": np.power,
+    "remainder": np.remainder,
+}
+def _exp_sum_reduction(array):
+    """sum(exp(a)) like int_list_to_exponential_sum: a float, or a decimal string once it overflows a float"""
+    if array.size == 0 or not np.all(np.isfinite(array)):
+        return np.sum(np.exp(array))
+    total = np.sum(np.exp(array))
+    if math.isfinite(total):
+        return total
+    log_sum = _log_sum_exp(array)
+    if log_sum <= LOG_FLOAT_MAX:
+        return math.exp(log_sum)
+    return _exp_sum_decimal(array, log_sum)
+
+REDUCTIONS = {
+    "sum": np.sum,
+    "product": np.prod,
+    "min": np.min,
+    "max": np.max,
+    "mean": np.mean,
+    "std": np.std,
+    "exponential_sum": _exp_sum_reduction,
+}
+
+def _decode_array(values=None, values_b64=None, name="values"):
+    """Build a float64 array from a list or a base64 buffer of little-endian float64s"""
+    if values_b64:
+        data = base64.b64decode(values_b64)
+        if len(data) % 8:
+            raise ValueError(f"{name}_b64 must hold little-endian float64 values (length multiple of 8)")
+        return np.frombuffer(data, dtype="<f8")
+    if values is None:
+        raise ValueError(f"Provide {name} or {name}_b64")
+    return np.asarray(values, dtype=np.float64)
+
+def _encode_array(array, encoding):
+    """Return an array as a JSON list or a base64 float64 buffer"""
+    if encoding == "base64":
+        return {"values_b64": base64.b64encode(np.ascontiguousarray(array, dtype="<f8").tobytes()).decode("ascii"),
+                "dtype": "float64", "count": int(array.size)}
+    return {"values": array.tolist(), "count": int(array.size)}
 
+@mcp.tool()
+def array_elementwise(operation: str, values: list[float] | None = None, values_b64: str | None = None,
+                      operand: float | None = None, other: list[float] | None = None,
+                      other_b64: str | None = None, encoding: str = "list") -> dict:
+    """Apply sqrt, cbrt, log, exp, sin, cos, tan, factorial, or add, subtract, multiply, divide, power, remainder (with a scalar operand or other array) to every value. Values come as a list or a base64 float64 buffer; encoding is "list" or "base64" for the result."""
+    logger.info(f"CALLED: array_elementwise(operation: {operation}) -> dict:")
+    array = _decode_array(values, values_b64)
+    with np.errstate(all="ignore"):
+        if operation in ELEMENTWISE_UNARY:
+            result = ELEMENTWISE_UNARY[operation](array)
+        elif operation in ELEMENTWISE_BINARY:
+            if operand is not None:
+                right = np.float64(operand)
+            else:
+                right = _decode_array(other, other_b64, name="other")
+                if right.shape != array.shape:
+                    raise ValueError(f"other has {right.size} values, expected {array.size}")
+            result = ELEMENTWISE_BINARY[operation](array, right)
+        else:
+            raise ValueError(f"Unknown operation {operation}; expected one of "
+                             f"{', '.join(list(ELEMENTWISE_UNARY) + list(ELEMENTWISE_BINARY))}")
+    # Non-finite results (log of 0, division by zero) are not valid JSON numbers
+    if encoding != "base64" and not np.all(np.isfinite(result)):
+        return {"values": [float(x) if math.isfinite(x) else str(x) for x in result.tolist()],
+                "count": int(result.size)}
+    return _encode_array(result, encoding)
+
+@mcp.tool()
+def array_reduce(operation: str, values: list[float] | None = None, values_b64: str | None = None) -> dict:
+    """Reduce a list of values with sum, product, min, max, mean, std or exponential_sum. Values come as a list or a base64 float64 buffer. exponential_sum past the float range comes back as a decimal string."""
+    logger.info(f"CALLED: array_reduce(operation: {operation}) -> dict:")
+    if operation not in REDUCTIONS:
+        raise ValueError(f"Unknown operation {operation}; expected one of {', '.join(REDUCTIONS)}")
+    array = _decode_array(values, values_b64)
+    if array.size == 0 and operation not in ("sum", "product", "exponential_sum"):
+        raise ValueError(f"Cannot compute {operation} of an empty array")
+    with np.errstate(all="ignore"):
+        result = REDUCTIONS[operation](array)
+    if isinstance(result, str):
+        return {"result": result, "count": int(array.size)}
+    result = float(result)
+    return {"result": result if math.isfinite(result) else str(result), "count": int(array.size)}
+
+# PAINT TOOLS
+
+# Canvas the Paint tools draw on; chosen with --canvas or CANVAS_BACKEND, created on first use otherwise
+canvas = None
+
+def get_canvas():
+    global canvas
+    if canvas is None:
+        canvas = create_canvas()
+    return canvas
 
 @mcp.tool()
 async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a rectangle in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
     try:
-        if not paint_app:
+        if not get_canvas().is_open:
             return {"content": [TextContent(type="text", text="Paint is not open. Please call open_paint first.")]}
-        
-        logger.debug("Starting rectangle drawing operation")
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Ensure Paint window is active
-        if not paint_window.has_focus():
-            paint_window.set_focus()
-            time.sleep(1)
-            
-        # Click Rectangle tool
-        logger.debug("Selecting rectangle tool")
-        paint_window.click_input(coords=(445, 70))
-        time.sleep(1)
-        
-        # Get canvas area
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        
-        # Log canvas position and size for debugging
-        canvas_rect = canvas.rectangle()
-        logger.debug(f"Canvas Rectangle: {canvas_rect}")
-        
-        # Draw rectangle with logging
-        logger.debug(f"Drawing rectangle from ({x1},{y1}) to ({x2},{y2})")
-
-        # Draw rectangle - coordinates should be relative to the Paint window
-        logger.debug(f"Clicking at: ({x1}, {y1})")
-        canvas.click_input(coords=(x1, y1))
-        time.sleep(1)
-
-        logger.debug(f"Pressing mouse at: ({x1}, {y1})")
-        canvas.press_mouse_input(coords=(x1, y1))
-        time.sleep(1)
-
-        logger.debug(f"Releasing mouse at: ({x2}, {y2})")
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(1)  
-
-        # logger.debug(f"Clicking at: ({x2}, {y2+40})")
-        # canvas.click_input(coords=(x2, y2+40))
-        # time.sleep(1)      
-
+        await canvas.draw_rectangle(x1, y1, x2, y2)
         return {
             "content": [TextContent(type="text", text=f"Rectangle drawn from ({x1},{y1}) to ({x2},{y2})")]
         }
@@ -240,47 +837,10 @@ async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
 @mcp.tool()
 async def add_text_in_paint(text: str) -> dict:
     """Add text in Paint"""
-    global paint_app
     try:
-        if not paint_app:
+        if not get_canvas().is_open:
             return {"content": [TextContent(type="text", text="Paint is not open. Please call open_paint first.")]}
-        
-        logger.debug("Starting text addition operation")
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Ensure Paint window is active
-        if not paint_window.has_focus():
-            paint_window.set_focus()
-            time.sleep(0.5)
-        
-        # Select green color
-        logger.debug("Selecting green color")
-        paint_window.click_input(coords=(895, 61))
-        time.sleep(0.5)
-        
-        # Select Text tool
-        logger.debug("Selecting text tool")
-        paint_window.click_input(coords=(290, 70))
-        time.sleep(0.5)
-        
-        # Get canvas
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        
-        # Click to start typing (inside rectangle)
-        text_x, text_y = 500, 300  # Adjusted coordinates
-        logger.debug(f"Clicking for text at ({text_x}, {text_y})")
-        canvas.click_input(coords=(text_x, text_y))
-        time.sleep(0.5)
-        
-        # Type text
-        logger.debug(f"Typing text: '{text}'")
-        paint_window.type_keys(text, with_spaces=True)
-        time.sleep(0.5)
-        
-        # Click outside to finish
-        canvas.click_input(coords=(50, 50))
-        time.sleep(0.5)
-
+        text_x, text_y = await canvas.add_text(text)
         return {
             "content": [TextContent(type="text", text=f"Text:'{text}' added at ({text_x},{text_y})")]
         }
@@ -288,41 +848,68 @@ async def add_text_in_paint(text: str) -> dict:
         logger.error(f"Error in add_text_in_paint: {str(e)}")
         return {"content": [TextContent(type="text", text=f"Error adding text: {str(e)}")]}
 
+@mcp.tool()
+async def draw_scene(primitives: list[dict]) -> dict:
+    """
+    Draw many shapes and labels in Paint in one call. Each primitive is an object with a type:
+    rectangle, line or ellipse with x1, y1, x2, y2 and optional color, fill and width,
+    or text with x, y, text and optional color and font_size.
+    The paint canvas draws only rectangles and text, in its default styles
+    """
+    logger.info("CALLED: draw_scene(primitives: list[dict]) -> dict:")
+    try:
+        if not get_canvas().is_open:
+            return {"content": [TextContent(type="text", text="Paint is not open. Please call open_paint first.")]}
+        scene = validate_scene(primitives, canvas.supported_primitives)
+        await canvas.draw_scene(scene)
+        counts = {}
+        for primitive in scene:
+            counts[primitive["type"]] = counts.get(primitive["type"], 0) + 1
+        summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+        message = f"Scene drawn with {len(scene)} primitives ({summary})"
+        ignored = ignored_styles(primitives, canvas.supported_styles)
+        if ignored:
+            message += f". The {canvas.name} canvas ignored {', '.join(ignored)}; default styles were used"
+        return {"content": [TextContent(type="text", text=message)]}
+    except Exception as e:
+        logger.error(f"Error in draw_scene: {str(e)}")
+        return {"content": [TextContent(type="text", text=f"Error drawing scene: {str(e)}")]}
+
 @mcp.tool()
 async def open_paint() -> dict:
     """Open Microsoft Paint maximized"""
-    global paint_app
     try:
-        logger.debug("Starting Paint opening operation")
-        paint_app = Application().start('mspaint.exe')
-        time.sleep(1)
-        
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Get initial window position
-        initial_rect = paint_window.rectangle()
-        logger.debug(f"Initial Paint window rectangle: {initial_rect}")
-        
-        # Maximize window
-        win32gui.ShowWindow(paint_window.handle, win32con.SW_MAXIMIZE)
-        time.sleep(0.5)
-        
-        # Get maximized position
-        max_rect = paint_window.rectangle()
-        logger.debug(f"Maximized Paint window rectangle: {max_rect}")
-        
-        # Get canvas
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        canvas_rect = canvas.rectangle()
-        logger.debug(f"Canvas rectangle: {canvas_rect}")
-        
+        await get_canvas().open()
+        if canvas.name == "paint":
+            message = "Paint opened successfully and maximized"
+        else:
+            message = f"Blank {canvas.name} canvas opened"
         return {
-            "content": [TextContent(type="text", text="Paint opened successfully and maximized")]
+            "content": [TextContent(type="text", text=message)]
         }
     except Exception as e:
         logger.error(f"Error in open_paint: {str(e)}")
         return {"content": [TextContent(type="text", text=f"Error opening Paint: {str(e)}")]}
 
+@mcp.tool()
+async def get_canvas_image() -> Image:
+    """Return the Paint canvas as a PNG image"""
+    logger.info("CALLED: get_canvas_image() -> Image:")
+    if not get_canvas().is_open:
+        raise ValueError("Paint is not open. Please call open_paint first.")
+    buffer = io.BytesIO()
+    (await canvas.get_image()).save(buffer, format="PNG")
+    return Image(data=buffer.getvalue(), format="png")
+
+@mcp.tool()
+async def save_canvas_image(path: str) -> dict:
+    """Save the Paint canvas to an image file at path"""
+    logger.info("CALLED: save_canvas_image(path: str) -> dict:")
+    if not get_canvas().is_open:
+        raise ValueError("Paint is not open. Please call open_paint first.")
+    await canvas.save(path)
+    return {"content": [TextContent(type="text", text=f"Canvas saved to {path}")]}
+
 
 # DEFINE RESOURCES
 
@@ -333,6 +920,23 @@ def get_greeting(name: str) -> str:
     logger.info("CALLED: get_greeting(name: str) -> str:")
     return f"Hello, {name}!"
 
+# Hit/miss statistics of the tool result caches
+@mcp.resource("cache://stats", mime_type="application/json")
+def get_cache_stats() -> str:
+    """Get hit, miss and size statistics for every cached tool"""
+    logger.info("CALLED: get_cache_stats() -> str:")
+    return json.dumps({
+        name: {**stats, "entries": len(cache), "maxsize": maxsize}
+        for name, (cache, stats, maxsize) in _TOOL_CACHES.items()
+    }, indent=2)
+
+# Job statistics of the process pool running @cpu_bound tools
+@mcp.resource("pool://stats", mime_type="application/json")
+def get_pool_stats() -> str:
+    """Get job and restart counts of the CPU pool"""
+    logger.info("CALLED: get_pool_stats() -> str:")
+    return json.dumps({**_cpu_pool.stats, "processes": _cpu_pool.processes, "in_flight": len(_cpu_pool._jobs)}, indent=2)
+
 
 # DEFINE AVAILABLE PROMPTS
 @mcp.prompt()
@@ -363,7 +967,22 @@ Examples:
 if __name__ == "__main__":
     # Check if running with mcp dev command
     logger.info("STARTING")
-    if len(sys.argv) > 1 and sys.argv[1] == "dev":
-        mcp.run()  # Run without transport for dev server
-    else:
-        mcp.run(transport="stdio")  # Run with stdio for direct execution
+    # --canvas pillow|paint picks the backend of the Paint tools
+    if "--canvas" in sys.argv:
+        index = sys.argv.index("--canvas")
+        canvas = create_canvas(sys.argv[index + 1])
+        del sys.argv[index:index + 2]
+    # Spawn the workers up front so the first heavy call does not pay for it
+    _cpu_pool.start()
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == "dev":
+            mcp.run()  # Run without transport for dev server
+        elif len(sys.argv) > 1 and sys.argv[1] == "sse":
+            # Persistent server that agents attach to: python example2.py sse [port]
+            if len(sys.argv) > 2:
+                mcp.settings.port = int(sys.argv[2])
+            mcp.run(transport="sse")
+        else:
+            mcp.run(transport="stdio")  # Run with stdio for direct execution
+    finally:
+        _cpu_pool.close()
@@ -2,12 +2,19 @@ import os
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from contextlib import asynccontextmanager
 import asyncio
 import google.generativeai as genai
-from concurrent.futures import TimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from functools import partial
 import traceback
 import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import random
 import win32gui
 import win32con
 import win32com.client
@@ -17,6 +24,7 @@ import psutil
 from pywinauto import Application
 from mcp.types import TextContent
 import argparse
+import json
 
 # Load environment variables from .env file
 load_dotenv()
@@ -27,131 +35,669 @@ print(f"API Key loaded: {'Yes' if api_key else 'No'}")  # Will print Yes/No with
 genai.configure(api_key=api_key)
 
 max_iterations = 3
-last_response = None
-iteration = 0
-iteration_response = []
+# Prompt size limits for the agent conversation
+PROMPT_TOKEN_BUDGET = 4000  # Estimated tokens allowed in one prompt
+RECENT_STEPS = 3            # Most recent steps always sent verbatim
+STEP_SUMMARY_CHARS = 200    # Older steps are truncated to this many characters
+# Number of queries run at the same time by the batch runner
+DEFAULT_CONCURRENCY = 8
+# Tools that act on the server's single canvas; only one query at a time may use them
+CANVAS_TOOLS = {"open_paint", "draw_rectangle", "add_text_in_paint", "draw_scene",
+                "get_canvas_image", "save_canvas_image"}
+
+# Appended to the system prompt when tools are also passed as native function declarations
+NATIVE_CALLING_NOTE = """
+Prefer calling the tools directly through function calling. FUNCTION_CALL lines are still accepted.
+"""
+
+DEFAULT_QUERY = """Find the ASCII values of characters in INDIA, calculate the sum of exponentials of those values, and visualize the result in Paint."""
 
 # Global variable for email flag
 send_email_flag = False
 
-async def generate_with_timeout(client, prompt, timeout=30):
-    """Generate content with a timeout"""
+# Models tried in order, each with its own retries, until one answers within the deadline
+LLM_MODELS = [name.strip() for name in os.getenv("GEMINI_MODELS", "gemini-1.5-pro,gemini-1.5-flash").split(",") if name.strip()]
+LLM_MAX_WORKERS = 4         # Threads running blocking generate_content calls
+LLM_ATTEMPT_TIMEOUT = 20    # Seconds a single model call may take before moving to the next model
+LLM_RETRIES = 2             # Extra attempts per model after a failed call
+LLM_BACKOFF_BASE = 0.5      # First retry waits up to this many seconds, doubling per attempt
+LLM_BACKOFF_MAX = 8.0
+
+LLM_CACHE_MAX_ENTRIES = 256        # Responses kept in memory
+LLM_CACHE_MAX_DISK_ENTRIES = 10000 # Responses kept in the SQLite file
+
+class CachedResponse:
+    """An LLM response reduced to what the agent reads: its text and native function calls"""
+
+    def __init__(self, text, function_calls=None):
+        self.text = text
+        self.function_calls = [tuple(call) for call in function_calls or []]
+
+    def to_json(self):
+        return json.dumps({"text": self.text, "function_calls": self.function_calls})
+
+    @classmethod
+    def from_json(cls, data):
+        item = json.loads(data)
+        return cls(item["text"], item["function_calls"])
+
+class ResponseCache:
+    """
+    LRU cache of LLM responses keyed by model chain, generation parameters and prompt hash.
+    Entries live in memory and, when path is given, in a SQLite file shared across runs.
+    Entries older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, path=None, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=None,
+                 max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(models, prompt, generation_config=None, tools=None):
+        """Hash everything that affects the response into a cache key"""
+        key_data = json.dumps({
+            "models": list(models),
+            "generation_config": generation_config,
+            "tools": tools,
+            "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, response FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and not self._expired(row[0]):
+                    entry = (row[0], CachedResponse.from_json(row[1]))
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, response):
+        """Store a CachedResponse under key"""
+        created = time.time()
+        with self._lock:
+            self._remember(key, (created, response))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, created, response) VALUES (?, ?, ?)",
+                    (key, created, response.to_json())
+                )
+                self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key, entry):
+        """Add an entry to the in-memory LRU, evicting the least recently used ones"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drop expired rows and keep at most max_disk_entries newest rows on disk"""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM llm_responses WHERE created < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM llm_responses WHERE key NOT IN "
+            "(SELECT key FROM llm_responses ORDER BY created DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self):
+        """Hit/miss counters and the number of entries held in memory"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class LLMClient:
+    """
+    Gemini client that builds each model once and runs calls on a bounded executor.
+    Failed calls are retried with exponential backoff and full jitter, then the next
+    model in the chain is tried; all attempts share one total deadline. With a ResponseCache
+    identical requests are answered from the cache without calling the model.
+    """
+
+    def __init__(self, models=LLM_MODELS, model_factory=None, max_workers=LLM_MAX_WORKERS,
+                 attempt_timeout=LLM_ATTEMPT_TIMEOUT, retries=LLM_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 cache=None, generation_config=None):
+        self.models = list(models)
+        self.cache = cache
+        self.generation_config = generation_config
+        self.model_factory = model_factory or genai.GenerativeModel
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._model_cache = {}
+
+    def _model(self, model_name):
+        """Return the cached model object for model_name"""
+        if model_name not in self._model_cache:
+            self._model_cache[model_name] = self.model_factory(model_name)
+        return self._model_cache[model_name]
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff delay for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def generate(self, prompt, timeout=30, tools=None):
+        """
+        Generate content for prompt, trying the model chain until the total timeout expires.
+        tools holds Gemini function declarations for native function calling.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_error = None
+        request_options = {"tools": tools} if tools else {}
+        if self.generation_config:
+            request_options["generation_config"] = self.generation_config
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.models, prompt, self.generation_config, tools)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("LLM response served from cache")
+                return cached
+
+        for model_name in self.models:
+            model = self._model(model_name)
+            for attempt in range(self.retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"LLM generation did not complete within {timeout}s") from last_error
+                try:
+                    response = await asyncio.wait_for(
+                        loop.run_in_executor(self._executor, partial(model.generate_content, contents=prompt, **request_options)),
+                        timeout=min(self.attempt_timeout, remaining)
+                    )
+                    print(f"LLM generation completed with {model_name} (attempt {attempt + 1})")
+                    if cache_key is not None:
+                        self.cache.put(cache_key, CachedResponse(get_response_text(response),
+                                                                 extract_function_calls(response)))
+                    return response
+                except asyncio.TimeoutError as e:
+                    # A slow model is unlikely to be faster on retry, move down the chain
+                    print(f"LLM generation with {model_name} timed out")
+                    last_error = e
+                    break
+                except Exception as e:
+                    print(f"Error in LLM generation with {model_name} (attempt {attempt + 1}): {e}")
+                    last_error = e
+                    if attempt < self.retries:
+                        delay = min(self._backoff(attempt), max(deadline - loop.time(), 0))
+                        await asyncio.sleep(delay)
+            print(f"Giving up on {model_name}")
+
+        if isinstance(last_error, asyncio.TimeoutError):
+            raise TimeoutError(f"LLM generation did not complete within {timeout}s") from last_error
+        raise last_error or RuntimeError("No LLM models configured")
+
+    def close(self):
+        """Shut down the executor used for model calls"""
+        self._executor.shutdown(wait=False)
+
+_llm_client = None
+
+def get_llm_client():
+    """Return the shared LLMClient, creating it on first use"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+def configure_llm_cache(llm_cache=None, ttl=None):
+    """
+    Attach a ResponseCache to the shared LLM client. llm_cache is "memory" for an
+    in-memory cache or the path of a SQLite file that keeps responses across runs.
+    """
+    if not llm_cache:
+        return None
+    cache = ResponseCache(None if llm_cache == "memory" else llm_cache, ttl=ttl)
+    get_llm_client().cache = cache
+    print(f"LLM response cache enabled: {llm_cache}")
+    return cache
+
+async def generate_with_timeout(client, prompt, timeout=30, tools=None):
+    """Generate content with a timeout, using the shared client unless one is given"""
     print("Starting LLM generation...")
+    client = client or get_llm_client()
     try:
-        # Convert the synchronous generate_content call to run in a thread
-        loop = asyncio.get_event_loop()
-        
-        # Use gemini-pro model without the 'models/' prefix
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: model.generate_content(contents=prompt)
-            ),
-            timeout=timeout
-        )
-        print("LLM generation completed")
-        return response
+        return await client.generate(prompt, timeout=timeout, tools=tools)
     except TimeoutError:
         print("LLM generation timed out!")
         raise
-    except Exception as e:
-        print(f"Error in LLM generation: {e}")
-        # If first attempt fails, try with gemini-1.5-pro
-        try:
-            print("Trying with gemini-1.5-pro...")
-            model = genai.GenerativeModel('gemini-1.5-pro') 
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None, 
-                    lambda: model.generate_content(contents=prompt)
-                ),
-                timeout=timeout
-            )
-            print("LLM generation completed with alternate model")
-            return response
-        except Exception as e2:
-            print(f"Error with alternate model: {e2}")
-            raise
-
-def reset_state():
-    """Reset all global variables to their initial state"""
-    global last_response, iteration, iteration_response
-    last_response = None
-    iteration = 0
-    iteration_response = []
 
-async def main(send_email=False):
-    global send_email_flag
-    send_email_flag = send_email
-    
-    reset_state()  # Reset at the start of main
-    print("Starting main execution...")
+@asynccontextmanager
+async def connect_to_server(server_params, server_url=None):
+    """
+    Yield the MCP read/write streams. With server_url the agent attaches to a
+    persistent server started with `python example2.py sse`; otherwise a
+    server process is spawned over stdio.
+    """
+    if server_url:
+        print(f"Attaching to persistent MCP server at {server_url}")
+        async with sse_client(server_url) as streams:
+            yield streams
+    else:
+        async with stdio_client(server_params) as streams:
+            yield streams
+
+# JSON schema keys understood by Gemini function declarations; everything else
+# (title, default, additionalProperties, ...) is dropped
+GEMINI_SCHEMA_KEYS = ("type", "description", "properties", "required", "items", "enum")
+
+def resolve_optional_schema(schema):
+    """Collapse an Optional anyOf (e.g. `list[float] | None`) into the schema of its non-null option"""
+    options = [option for option in schema.get("anyOf", []) if option.get("type") != "null"]
+    if "type" in schema or len(options) != 1:
+        return schema
+    resolved = {key: value for key, value in schema.items() if key != "anyOf"}
+    resolved.update(options[0])
+    return resolved
+
+def to_gemini_schema(schema):
+    """Convert an MCP tool JSON schema into the subset Gemini accepts"""
+    schema = resolve_optional_schema(schema)
+    converted = {key: schema[key] for key in GEMINI_SCHEMA_KEYS if key in schema}
+    converted.setdefault("type", "string")
+    if "properties" in converted:
+        converted["properties"] = {name: to_gemini_schema(prop) for name, prop in converted["properties"].items()}
+    if converted["type"] == "object" and not converted.get("properties"):
+        # Gemini rejects objects without properties; free-form objects are sent as JSON text
+        converted = {"type": "string", "description": (converted.get("description", "") + " JSON object").strip()}
+    if converted["type"] == "array":
+        # Untyped list parameters (e.g. `int_list: list`) are numeric in these tools
+        converted["items"] = to_gemini_schema(converted.get("items") or {"type": "number"})
+    return converted
+
+def to_function_declarations(tools):
+    """Build Gemini function declarations from the MCP tool list"""
+    declarations = []
+    for tool in tools:
+        declaration = {"name": tool.name, "description": tool.description or tool.name}
+        schema = tool.inputSchema or {}
+        if schema.get("properties"):
+            declaration["parameters"] = to_gemini_schema({**schema, "type": "object"})
+        declarations.append(declaration)
+    return [{"function_declarations": declarations}]
+
+def _response_parts(response):
+    """Return the content parts of the first candidate, or [] if there are none"""
     try:
-        # Create a single MCP server connection
-        print("Establishing connection to MCP server...")
-        server_params = StdioServerParameters(
-            command="python",
-            args=["example2.py"]
+        return list(response.candidates[0].content.parts)
+    except (AttributeError, IndexError):
+        return []
+
+def _to_plain(value):
+    """Convert proto map/repeated values from function call args into dicts and lists"""
+    if isinstance(value, (str, bytes)):
+        return value
+    if hasattr(value, "items"):
+        return {key: _to_plain(item) for key, item in value.items()}
+    if hasattr(value, "__iter__"):
+        return [_to_plain(item) for item in value]
+    return value
+
+def get_response_text(response):
+    """Return the text of a response, which has no .text when it only holds function calls"""
+    try:
+        return response.text
+    except (ValueError, AttributeError):
+        return "".join(getattr(part, "text", "") or "" for part in _response_parts(response))
+
+def extract_function_calls(response):
+    """Return the native function calls in a response as (name, arguments) pairs"""
+    if isinstance(response, CachedResponse):
+        return list(response.function_calls)
+    calls = []
+    for part in _response_parts(response):
+        function_call = getattr(part, "function_call", None)
+        if function_call and function_call.name:
+            calls.append((function_call.name, _to_plain(function_call.args or {})))
+    return calls
+
+def estimate_tokens(text):
+    """Rough token count for Gemini prompts (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+class ConversationState:
+    """
+    Steps of one agent run, each stored once. render() builds the prompt from the
+    system prompt, the query and the steps: the most recent steps are kept verbatim,
+    older ones are truncated and, if the prompt is still over budget, dropped oldest first.
+    """
+
+    def __init__(self, system_prompt, query, token_budget=PROMPT_TOKEN_BUDGET,
+                 recent_steps=RECENT_STEPS, summary_chars=STEP_SUMMARY_CHARS):
+        self.system_prompt = system_prompt
+        self.query = query
+        self.token_budget = token_budget
+        self.recent_steps = recent_steps
+        self.summary_chars = summary_chars
+        self.steps = []
+
+    def add_step(self, step):
+        """Record the outcome of one tool call"""
+        self.steps.append(step)
+
+    def _summarize(self, step):
+        """Truncate an older step to summary_chars"""
+        if len(step) <= self.summary_chars:
+            return step
+        return step[:self.summary_chars] + "..."
+
+    def render(self):
+        """Return the prompt for the next LLM call together with its estimated token count"""
+        header = f"{self.system_prompt}\n\nQuery: {self.query}"
+        if not self.steps:
+            return header, estimate_tokens(header)
+
+        split = max(len(self.steps) - self.recent_steps, 0)
+        older = [self._summarize(step) for step in self.steps[:split]]
+        recent = self.steps[split:]
+
+        omitted = 0
+        while True:
+            history = older[omitted:] + recent
+            if omitted:
+                history = [f"({omitted} earlier steps omitted)"] + history
+            prompt = header + "\n\n" + " ".join(history) + "  What should I do next?"
+            tokens = estimate_tokens(prompt)
+            if tokens <= self.token_budget or omitted >= len(older):
+                return prompt, tokens
+            omitted += 1
+
+TRUE_STRINGS = {"true", "1", "yes", "y", "on"}
+FALSE_STRINGS = {"false", "0", "no", "n", "off"}
+
+def _to_integer(value):
+    """Coerce a value to int, accepting integral floats such as 3.0"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"Expected an integer, got {value}")
+        return int(value)
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        raise ValueError(f"Expected an integer, got {value!r}") from None
+    return _to_integer(number)
+
+def _to_number(value):
+    """Coerce a value to a number, keeping integers as int"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Expected a number, got {value!r}") from None
+
+def _to_boolean(value):
+    """Coerce a value to bool from a bool, number or yes/no style string"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_STRINGS:
+        return True
+    if text in FALSE_STRINGS:
+        return False
+    raise ValueError(f"Expected a boolean, got {value}")
+
+def _to_untyped(value):
+    """Coerce a value with no declared type, preferring numbers over strings"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return _to_number(value)
+    except ValueError:
+        return value.strip()
+
+def _to_object(value):
+    """Coerce an object, which a FUNCTION_CALL line or a Gemini string field carries as JSON"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Expected a JSON object, got '{value.strip()}'") from e
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected an object, got {value!r}")
+    return value
+
+SCALAR_COERCERS = {
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "string": str,
+    "object": _to_object,
+}
+
+def _split_array(value):
+    """Split an array from a FUNCTION_CALL line: a JSON array, or comma-separated values"""
+    value = value.strip()
+    if value.startswith('['):
+        try:
+            parsed = json.loads(value)
+            if isinstance(parsed, list):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+    return [item.strip().strip('[]') for item in value.strip('[]').split(',') if item.strip().strip('[]')]
+
+def _is_whole_array(value):
+    """True for an array token that holds the whole list, e.g. `[1,4,9]` or `64,128`"""
+    value = value.strip()
+    return value.startswith('[') or ',' in value
+
+def _compile_coercer(schema):
+    """Build a function converting one raw value into the type described by schema"""
+    schema = resolve_optional_schema(schema)
+    schema_type = schema.get("type")
+    if schema_type == "array":
+        # Untyped list items (e.g. `int_list: list`) are numeric in these tools
+        coerce_item = _compile_coercer(schema.get("items") or {"type": "number"})
+
+        def coerce_array(value):
+            if isinstance(value, str):
+                value = _split_array(value)
+            return [coerce_item(item) for item in value]
+        return coerce_array
+    return SCALAR_COERCERS.get(schema_type, _to_untyped)
+
+class ToolSpec:
+    """A tool with its input schema compiled into argument parsers"""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+        schema = tool.inputSchema or {}
+        self.required = set(schema.get("required", []))
+        # (name, coercer, is_array, has_default, default) in declaration order
+        self.params = [
+            (param_name, _compile_coercer(param_info), resolve_optional_schema(param_info).get("type") == "array",
+             "default" in param_info, param_info.get("default"))
+            for param_name, param_info in schema.get("properties", {}).items()
+        ]
+        # The first array parameter followed only by optional ones may take all remaining values
+        self.rest_index = next(
+            (index for index, (_, _, is_array, _, _) in enumerate(self.params)
+             if is_array and not any(name in self.required for name, *_ in self.params[index + 1:])),
+            None
         )
 
-        async with stdio_client(server_params) as (read, write):
-            print("Connection established, creating session...")
-            async with ClientSession(read, write) as session:
-                print("Session created, initializing...")
-                await session.initialize()
-                
-                # Get available tools
-                print("Requesting tool list...")
-                tools_result = await session.list_tools()
-                tools = tools_result.tools
-                print(f"Successfully retrieved {len(tools)} tools")
+    def parse(self, params):
+        """
+        Convert positional string parameters from a FUNCTION_CALL line into arguments.
+        An array parameter followed only by optional ones consumes all remaining values
+        (e.g. `int_list_to_exponential_sum|73|78|68`) when it is the last parameter or its
+        value is a single item; a bracketed or comma-separated array such as `[1,4,9]` or
+        `64,128` leaves the following values to the optional parameters. Missing or empty
+        optional parameters take their schema default, and a missing required parameter
+        raises ValueError.
+        """
+        arguments = {}
+        consumed = False
+        for index, (param_name, coerce, is_array, has_default, default) in enumerate(self.params):
+            if consumed or index >= len(params) or (has_default and not params[index].strip()):
+                if has_default:
+                    arguments[param_name] = default
+                elif param_name in self.required:
+                    raise ValueError(f"Not enough parameters provided for {self.name}")
+                continue
+            if index == self.rest_index and (index == len(self.params) - 1 or not _is_whole_array(params[index])):
+                value = ','.join(params[index:])
+                consumed = True
+            else:
+                value = params[index]
+            try:
+                arguments[param_name] = coerce(value)
+            except ValueError as e:
+                raise ValueError(f"Invalid value for {self.name}.{param_name}: {e}") from e
+        return arguments
 
-                # Create system prompt with available tools
-                print("Creating system prompt...")
-                print(f"Number of tools: {len(tools)}")
-                
+    def coerce(self, arguments):
+        """Coerce a mapping of arguments, e.g. from a native function call, to the schema types"""
+        coerced = dict(arguments)
+        for param_name, coerce, _, has_default, default in self.params:
+            if param_name in coerced:
                 try:
-                    # First, let's inspect what a tool object looks like
-                    # if tools:
-                    #     print(f"First tool properties: {dir(tools[0])}")
-                    #     print(f"First tool example: {tools[0]}")
+                    coerced[param_name] = coerce(coerced[param_name])
+                except ValueError as e:
+                    raise ValueError(f"Invalid value for {self.name}.{param_name}: {e}") from e
+            elif has_default:
+                coerced[param_name] = default
+            elif param_name in self.required:
+                raise ValueError(f"Missing required parameter {param_name} for {self.name}")
+        return coerced
+
+class ToolRegistry:
+    """Tools from list_tools indexed by name, each compiled once into a ToolSpec"""
+
+    def __init__(self, tools):
+        self.tools = list(tools)
+        self._specs = {tool.name: ToolSpec(tool) for tool in self.tools}
+        self._function_declarations = None
+
+    @property
+    def names(self):
+        return list(self._specs)
+
+    def get(self, name):
+        """Return the ToolSpec for name, raising ValueError for unknown tools"""
+        spec = self._specs.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return spec
+
+    def parse(self, name, params):
+        """Convert positional string parameters for tool name into arguments"""
+        return self.get(name).parse(params)
+
+    def coerce(self, name, arguments):
+        """Coerce a mapping of arguments for tool name to the schema types"""
+        return self.get(name).coerce(arguments)
+
+    def function_declarations(self):
+        """Gemini function declarations for all tools, built on first use"""
+        if self._function_declarations is None:
+            self._function_declarations = to_function_declarations(self.tools)
+        return self._function_declarations
+
+def describe_tools(tools):
+    """Format the tool list as numbered lines for the system prompt"""
+    try:
+        # First, let's inspect what a tool object looks like
+        # if tools:
+        #     print(f"First tool properties: {dir(tools[0])}")
+        #     print(f"First tool example: {tools[0]}")
                     
-                    tools_description = []
-                    for i, tool in enumerate(tools):
-                        try:
-                            # Get tool properties
-                            params = tool.inputSchema
-                            desc = getattr(tool, 'description', 'No description available')
-                            name = getattr(tool, 'name', f'tool_{i}')
+        tools_description = []
+        for i, tool in enumerate(tools):
+            try:
+                # Get tool properties
+                params = tool.inputSchema
+                desc = getattr(tool, 'description', 'No description available')
+                name = getattr(tool, 'name', f'tool_{i}')
                             
-                            # Format the input schema in a more readable way
-                            if 'properties' in params:
-                                param_details = []
-                                for param_name, param_info in params['properties'].items():
-                                    param_type = param_info.get('type', 'unknown')
-                                    param_details.append(f"{param_name}: {param_type}")
-                                params_str = ', '.join(param_details)
-                            else:
-                                params_str = 'no parameters'
-
-                            tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                            tools_description.append(tool_desc)
-                            print(f"Added description for tool: {tool_desc}")
-                        except Exception as e:
-                            print(f"Error processing tool {i}: {e}")
-                            tools_description.append(f"{i+1}. Error processing tool")
+                # Format the input schema in a more readable way
+                if 'properties' in params:
+                    param_details = []
+                    for param_name, param_info in params['properties'].items():
+                        param_type = param_info.get('type', 'unknown')
+                        param_details.append(f"{param_name}: {param_type}")
+                    params_str = ', '.join(param_details)
+                else:
+                    params_str = 'no parameters'
+
+                tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
+                tools_description.append(tool_desc)
+                print(f"Added description for tool: {tool_desc}")
+            except Exception as e:
+                print(f"Error processing tool {i}: {e}")
+                tools_description.append(f"{i+1}. Error processing tool")
                     
-                    tools_description = "\n".join(tools_description)
-                    print("Successfully created tools description")
-                except Exception as e:
-                    print(f"Error creating tools description: {e}")
-                    tools_description = "Error loading tools"
-                
-                print("Created system prompt...")
-                
-                system_prompt = f"""You are an AI agent that solves problems and visualizes results in Microsoft Paint. You have access to various tools for calculations and visualization.
+        tools_description = "\n".join(tools_description)
+        print("Successfully created tools description")
+    except Exception as e:
+        print(f"Error creating tools description: {e}")
+        tools_description = "Error loading tools"
+    return tools_description
+
+def build_system_prompt(tools_description, function_calling="text"):
+    """Create the system prompt listing the available tools"""
+    system_prompt = f"""You are an AI agent that solves problems and visualizes results in Microsoft Paint. You have access to various tools for calculations and visualization.
 
 Available tools:
 {tools_description}
@@ -164,6 +710,7 @@ You must respond with EXACTLY ONE line in one of these formats (no additional te
    FUNCTION_CALL: open_paint
    FUNCTION_CALL: draw_rectangle|x1|y1|x2|y2
    FUNCTION_CALL: add_text_in_paint|text
+   FUNCTION_CALL: draw_scene|[{"type": "rectangle", "x1": 100, "y1": 100, "x2": 300, "y2": 200}, ...]
 
 3. For final answers:
    FINAL_ANSWER: [your_answer]
@@ -184,186 +731,306 @@ Examples:
 - FUNCTION_CALL: open_paint
 - FUNCTION_CALL: draw_rectangle|400|300|1200|600        # Filled black rectangle
 - FUNCTION_CALL: add_text_in_paint|Result = 42          # Black text at (500,400)
+- FUNCTION_CALL: draw_scene|[{"type": "rectangle", "x1": 400, "y1": 300, "x2": 1200, "y2": 600}, {"type": "text", "x": 500, "y": 400, "text": "Result = 42", "font_size": 32}]
+  # Draws a whole chart or diagram in one step; prefer it when there are several shapes or labels
 """
+    if function_calling == "native":
+        system_prompt += NATIVE_CALLING_NOTE
+    return system_prompt
 
-                query = """Find the ASCII values of characters in INDIA, calculate the sum of exponentials of those values, and visualize the result in Paint."""
-                print("Starting iteration loop...")
-                
-                # Use global iteration variables
-                global iteration, last_response
-                
-                while iteration < max_iterations:
-                    print(f"\n--- Iteration {iteration + 1} ---")
-                    if last_response is None:
-                        current_query = query
-                    else:
-                        current_query = current_query + "\n\n" + " ".join(iteration_response)
-                        current_query = current_query + "  What should I do next?"
-
-                    # Get model's response with timeout
-                    print("Preparing to generate LLM response...")
-                    prompt = f"{system_prompt}\n\nQuery: {current_query}"
-                    try:
-                        response = await generate_with_timeout(None, prompt)
-                        response_text = response.text.strip()
-                        print(f"LLM Response: {response_text}")
+class CanvasClaim:
+    """
+    One query's hold on the canvas lock shared by a batch. The server has a single canvas,
+    so a query takes the lock at its first canvas tool call and keeps it until it ends;
+    otherwise concurrent queries would open and draw over each other's pictures.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.held = False
+
+    async def acquire(self):
+        if not self.held:
+            await self.lock.acquire()
+            self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.lock.release()
+
+async def run_agent(session, registry, system_prompt, query, function_calling="text", canvas_claim=None):
+    """
+    Run the agent loop for one query over an initialized session.
+    All loop state is local, so many queries can run concurrently on the same session;
+    their canvas tool calls are serialized through canvas_claim (see CanvasClaim).
+    With function_calling="native" the tool schemas are sent as Gemini function declarations
+    and structured calls are used, falling back to FUNCTION_CALL lines in the text.
+    Returns the outcome of the query together with the steps taken and the elapsed time.
+    """
+    canvas_claim = canvas_claim or CanvasClaim(asyncio.Lock())
+    function_declarations = registry.function_declarations() if function_calling == "native" else None
+    start_time = time.perf_counter()
+    iteration = 0
+    last_response = None
+    conversation = ConversationState(system_prompt, query)
+    prompt_token_counts = []
+    final_answer = None
+    error = None
+    print("Starting iteration loop...")
+
+    while iteration < max_iterations:
+        print(f"\n--- Iteration {iteration + 1} ---")
+        # Get model's response with timeout
+        print("Preparing to generate LLM response...")
+        prompt, prompt_tokens = conversation.render()
+        prompt_token_counts.append(prompt_tokens)
+        print(f"Prompt tokens: ~{prompt_tokens} ({len(conversation.steps)} steps, budget {conversation.token_budget})")
+        try:
+            response = await generate_with_timeout(None, prompt, tools=function_declarations)
+            response_text = get_response_text(response).strip()
+            print(f"LLM Response: {response_text}")
+            final_answer = next((line.strip()[len("FINAL_ANSWER:"):].strip() for line in response_text.split('\n')
+                                 if line.strip().startswith("FINAL_ANSWER:")), final_answer)
                         
-                        # Find the FUNCTION_CALL line in the response
-                        for line in response_text.split('\n'):
-                            line = line.strip()
-                            if line.startswith("FUNCTION_CALL:"):
-                                response_text = line
-                                break
+            # Prefer a native function call, otherwise find the FUNCTION_CALL line in the response
+            native_calls = extract_function_calls(response)
+            if native_calls:
+                response_text = f"FUNCTION_CALL: {native_calls[0][0]}"
+            for line in response_text.split('\n'):
+                line = line.strip()
+                if line.startswith("FUNCTION_CALL:"):
+                    response_text = line
+                    break
                         
-                        if response_text.startswith("FUNCTION_CALL:"):
-                            _, function_info = response_text.split(":", 1)
-                            parts = [p.strip() for p in function_info.split("|")]
-                            func_name, params = parts[0], parts[1:]
+            if response_text.startswith("FUNCTION_CALL:"):
+                if native_calls:
+                    func_name, params = native_calls[0]
+                    print(f"\nDEBUG: Native function call: {func_name}({params})")
+                else:
+                    _, function_info = response_text.split(":", 1)
+                    parts = [p.strip() for p in function_info.split("|")]
+                    func_name, params = parts[0], parts[1:]
                             
-                            print(f"\nDEBUG: Raw function info: {function_info}")
-                            print(f"DEBUG: Split parts: {parts}")
-                            print(f"DEBUG: Function name: {func_name}")
-                            print(f"DEBUG: Raw parameters: {params}")
+                    print(f"\nDEBUG: Raw function info: {function_info}")
+                    print(f"DEBUG: Split parts: {parts}")
+                print(f"DEBUG: Function name: {func_name}")
+                print(f"DEBUG: Raw parameters: {params}")
                             
-                            try:
-                                # Find the matching tool to get its input schema
-                                tool = next((t for t in tools if t.name == func_name), None)
-                                if not tool:
-                                    print(f"DEBUG: Available tools: {[t.name for t in tools]}")
-                                    raise ValueError(f"Unknown tool: {func_name}")
-
-                                print(f"DEBUG: Found tool: {tool.name}")
-                                print(f"DEBUG: Tool schema: {tool.inputSchema}")
-
-                                # Prepare arguments according to the tool's input schema
-                                arguments = {}
-                                schema_properties = tool.inputSchema.get('properties', {})
-                                print(f"DEBUG: Schema properties: {schema_properties}")
-
-                                for param_name, param_info in schema_properties.items():
-                                    if not params:  # Check if we have enough parameters
-                                        raise ValueError(f"Not enough parameters provided for {func_name}")
-                                        
-                                    value = params.pop(0)  # Get and remove the first parameter
-                                    param_type = param_info.get('type', 'string')
-                                    
-                                    print(f"DEBUG: Converting parameter {param_name} with value {value} to type {param_type}")
-                                    
-                                    # Convert the value to the correct type based on the schema
-                                    if param_type == 'integer':
-                                        arguments[param_name] = int(value)
-                                    elif param_type == 'number':
-                                        arguments[param_name] = float(value)
-                                    elif param_type == 'array':
-                                        # Handle array input - convert all remaining parameters to integers
-                                        if func_name == "int_list_to_exponential_sum":
-                                            # For int_list_to_exponential_sum, use all parameters including the first one
-                                            array_values = [int(value)] + [int(p.strip()) for p in params]
-                                            arguments[param_name] = array_values
-                                            # Clear the params list since we've used all values
-                                            params.clear()
-                                        else:
-                                            # For other array parameters, handle as before
-                                            if isinstance(value, str):
-                                                value = value.strip('[]').split(',')
-                                            arguments[param_name] = [int(x.strip()) for x in value]
-                                    else:
-                                        arguments[param_name] = str(value)
-
-                                print(f"DEBUG: Final arguments: {arguments}")
-                                print(f"DEBUG: Calling tool {func_name}")
+                try:
+                    # Convert the parameters with the tool's compiled schema
+                    spec = registry.get(func_name)
+                    print(f"DEBUG: Found tool: {spec.name}")
+                    print(f"DEBUG: Tool schema: {spec.tool.inputSchema}")
+                    arguments = spec.parse(params) if isinstance(params, list) else spec.coerce(params)
+
+                    print(f"DEBUG: Final arguments: {arguments}")
+                    print(f"DEBUG: Calling tool {func_name}")
+                    if func_name in CANVAS_TOOLS:
+                        await canvas_claim.acquire()
                                 
-                                result = await session.call_tool(func_name, arguments=arguments)
-                                print(f"DEBUG: Raw result: {result}")
+                    result = await session.call_tool(func_name, arguments=arguments)
+                    print(f"DEBUG: Raw result: {result}")
                                 
-                                # Get the full result content
-                                if hasattr(result, 'content'):
-                                    print(f"DEBUG: Result has content attribute")
-                                    # Handle multiple content items
-                                    if isinstance(result.content, list):
-                                        iteration_result = [
-                                            item.text if hasattr(item, 'text') else str(item)
-                                            for item in result.content
-                                        ]
-                                    else:
-                                        iteration_result = str(result.content)
-                                else:
-                                    print(f"DEBUG: Result has no content attribute")
-                                    iteration_result = str(result)
+                    # Get the full result content
+                    if hasattr(result, 'content'):
+                        print(f"DEBUG: Result has content attribute")
+                        # Handle multiple content items
+                        if isinstance(result.content, list):
+                            iteration_result = [
+                                item.text if hasattr(item, 'text') else str(item)
+                                for item in result.content
+                            ]
+                        else:
+                            iteration_result = str(result.content)
+                    else:
+                        print(f"DEBUG: Result has no content attribute")
+                        iteration_result = str(result)
                                     
-                                print(f"DEBUG: Final iteration result: {iteration_result}")
+                    print(f"DEBUG: Final iteration result: {iteration_result}")
                                 
-                                # Format the response based on result type
-                                if isinstance(iteration_result, list):
-                                    result_str = f"[{', '.join(iteration_result)}]"
-                                else:
-                                    result_str = str(iteration_result)
+                    # Format the response based on result type
+                    if isinstance(iteration_result, list):
+                        result_str = f"[{', '.join(iteration_result)}]"
+                    else:
+                        result_str = str(iteration_result)
                                 
-                                iteration_response.append(
-                                    f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
-                                    f"and the function returned {result_str}."
-                                )
-                                last_response = iteration_result
-
-                                # If we've completed the calculation, proceed with visualization
-                                if func_name == "int_list_to_exponential_sum":
-                                    print("\n===  AI Agent Execution (Calculation) Complete, Proceeding with Visualization ===")
+                    conversation.add_step(
+                        f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
+                        f"and the function returned {result_str}."
+                    )
+                    last_response = iteration_result
+
+                    # If we've completed the calculation, proceed with visualization
+                    if func_name == "int_list_to_exponential_sum":
+                        print("\n===  AI Agent Execution (Calculation) Complete, Proceeding with Visualization ===")
+                        await canvas_claim.acquire()
  
-                                    print("\nStep 1: Opening Microsoft Paint...")
-                                    # Open Paint
-                                    result = await session.call_tool("open_paint")
-                                    print(f"✓ {result.content[0].text}")
-                                    await asyncio.sleep(1)
-
-                                    print("\nStep 2: Drawing rectangle frame...")
-                                    # Draw rectangle
-                                    result = await session.call_tool(
-                                        "draw_rectangle",
-                                        arguments={
-                                            "x1": 400,
-                                            "y1": 300,
-                                            "x2": 1200,
-                                            "y2": 600
-                                        }
-                                    )
-                                    print(f"✓ {result.content[0].text}")
-
-                                    print("\nStep 3: Adding result text...")
-                                    # Add text with the result
-                                    result = await session.call_tool(
-                                        "add_text_in_paint",
-                                        arguments={
-                                            "text": f"Result = {result_str}"
-                                        }
-                                    )
-                                    print(f"✓ {result.content[0].text}")
-                                    print("\n=== Visualization Complete ===")
-                                    print("The result has been displayed in Microsoft Paint.")
-                                    print("You can find the visualization in the Paint window.")
-                                    break
-
-                            except Exception as e:
-                                print(f"DEBUG: Error details: {str(e)}")
-                                print(f"DEBUG: Error type: {type(e)}")
-                                import traceback
-                                traceback.print_exc()
-                                iteration_response.append(f"Error in iteration {iteration + 1}: {str(e)}")
-                                break
-
-                        elif response_text.startswith("FINAL_ANSWER:"):
-                            print("\n=== Agent Execution Complete ===")
-                            break
-
-                        iteration += 1
-                    except Exception as e:
-                        print(f"Failed to get LLM response: {e}")
+                        print("\nStep 1: Opening Microsoft Paint...")
+                        # Open Paint
+                        result = await session.call_tool("open_paint")
+                        print(f"✓ {result.content[0].text}")
+                        await asyncio.sleep(1)
+
+                        print("\nStep 2: Drawing rectangle frame...")
+                        # Draw rectangle
+                        result = await session.call_tool(
+                            "draw_rectangle",
+                            arguments={
+                                "x1": 400,
+                                "y1": 300,
+                                "x2": 1200,
+                                "y2": 600
+                            }
+                        )
+                        print(f"✓ {result.content[0].text}")
+
+                        print("\nStep 3: Adding result text...")
+                        # Add text with the result
+                        result = await session.call_tool(
+                            "add_text_in_paint",
+                            arguments={
+                                "text": f"Result = {result_str}"
+                            }
+                        )
+                        print(f"✓ {result.content[0].text}")
+                        print("\n=== Visualization Complete ===")
+                        print("The result has been displayed in Microsoft Paint.")
+                        print("You can find the visualization in the Paint window.")
                         break
 
+                except Exception as e:
+                    print(f"DEBUG: Error details: {str(e)}")
+                    print(f"DEBUG: Error type: {type(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    conversation.add_step(f"Error in iteration {iteration + 1}: {str(e)}")
+                    break
+
+            elif response_text.startswith("FINAL_ANSWER:"):
+                print("\n=== Agent Execution Complete ===")
+                break
+
+            iteration += 1
+        except Exception as e:
+            print(f"Failed to get LLM response: {e}")
+            error = str(e)
+            break
+
+    canvas_claim.release()
+    return {
+        "query": query,
+        "final_answer": final_answer,
+        "steps": conversation.steps,
+        "prompt_tokens": prompt_token_counts,
+        # iteration is already max_iterations when the loop ran out of iterations
+        "iterations": min(iteration + 1, max_iterations),
+        "error": error,
+        "elapsed": round(time.perf_counter() - start_time, 3),
+    }
+
+def load_queries(queries_path):
+    """Read queries from a JSONL file, one {"id": ..., "query": ...} object or JSON string per line"""
+    queries = []
+    with open(queries_path) as queries_file:
+        for line_number, line in enumerate(queries_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            item.setdefault("id", line_number)
+            queries.append(item)
+    return queries
+
+async def run_batch(session, registry, system_prompt, queries, output_path, concurrency=DEFAULT_CONCURRENCY,
+                    function_calling="text"):
+    """
+    Run many queries as independent agent tasks over one shared session, at most
+    `concurrency` at a time, writing one JSON result line per query as it completes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    canvas_lock = asyncio.Lock()
+    start_time = time.perf_counter()
+
+    with open(output_path, 'w') as output_file:
+        async def run_one(item):
+            async with semaphore:
+                print(f"Running query {item['id']}")
+                canvas_claim = CanvasClaim(canvas_lock)
+                try:
+                    result = await run_agent(session, registry, system_prompt, item["query"], function_calling,
+                                             canvas_claim)
+                except Exception as e:
+                    print(f"Query {item['id']} failed: {e}")
+                    result = {"query": item["query"], "error": str(e)}
+                finally:
+                    canvas_claim.release()
+            result = {"id": item["id"], **result}
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            return result
+
+        results = await asyncio.gather(*(run_one(item) for item in queries))
+
+    elapsed = time.perf_counter() - start_time
+    failed = sum(1 for result in results if result.get("error"))
+    print(f"Batch complete: {len(results)} queries, {failed} failed, {elapsed:.2f}s total, "
+          f"{elapsed / max(len(results), 1):.3f}s per query")
+    return results
+
+async def main(send_email=False, server_url=None, queries_path=None, output_path="results.jsonl",
+               concurrency=DEFAULT_CONCURRENCY, function_calling="text", llm_cache=None, llm_cache_ttl=None):
+    global send_email_flag
+    send_email_flag = send_email
+    
+    print("Starting main execution...")
+    cache = configure_llm_cache(llm_cache, llm_cache_ttl)
+    try:
+        # Create a single MCP server connection
+        print("Establishing connection to MCP server...")
+        server_params = StdioServerParameters(
+            command="python",
+            args=["example2.py"]
+        )
+
+        async with connect_to_server(server_params, server_url) as (read, write):
+            print("Connection established, creating session...")
+            async with ClientSession(read, write) as session:
+                print("Session created, initializing...")
+                await session.initialize()
+                
+                # Get available tools
+                print("Requesting tool list...")
+                tools_result = await session.list_tools()
+                tools = tools_result.tools
+                print(f"Successfully retrieved {len(tools)} tools")
+                # Compile every tool's input schema once for the whole run
+                registry = ToolRegistry(tools)
+
+                # Create system prompt with available tools
+                print("Creating system prompt...")
+                print(f"Number of tools: {len(tools)}")
+                tools_description = describe_tools(tools)
+                system_prompt = build_system_prompt(tools_description, function_calling)
+                print("Created system prompt...")
+
+                if queries_path:
+                    queries = load_queries(queries_path)
+                    print(f"Running {len(queries)} queries with concurrency {concurrency}")
+                    await run_batch(session, registry, system_prompt, queries, output_path, concurrency,
+                                    function_calling)
+                else:
+                    await run_agent(session, registry, system_prompt, DEFAULT_QUERY, function_calling)
+
     except Exception as e:
         print(f"Error in main execution: {e}")
         traceback.print_exc()
     finally:
-        reset_state()  # Reset at the end of main
+        if cache is not None:
+            print(f"LLM cache stats: {cache.stats()}")
+            cache.close()
 
 def find_paint_window():
     """Find Paint window using multiple methods"""
@@ -455,4 +1122,26 @@ def ensure_paint_active():
     return success
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='Paint MCP agent')
+    parser.add_argument('--server-url',
+                        default=os.getenv("MCP_SERVER_URL"),
+                        help='SSE endpoint of a running server (e.g. http://127.0.0.1:8000/sse); '
+                             'a server process is spawned when omitted')
+    parser.add_argument('--queries',
+                        help='JSONL file of queries to run as a batch; the built-in query runs when omitted')
+    parser.add_argument('--output', default='results.jsonl',
+                        help='JSONL file the batch results are written to (default: results.jsonl)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Maximum number of queries in flight at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--function-calling', choices=['text', 'native'], default='text',
+                        help='How the model calls tools: FUNCTION_CALL text lines (default), or native '
+                             'Gemini function calling with the text format as fallback')
+    parser.add_argument('--llm-cache',
+                        help='Cache LLM responses: "memory", or a SQLite file path to reuse them across runs')
+    parser.add_argument('--llm-cache-ttl', type=float,
+                        help='Seconds a cached LLM response stays valid (default: no expiry)')
+    args = parser.parse_args()
+    asyncio.run(main(server_url=args.server_url, queries_path=args.queries,
+                     output_path=args.output, concurrency=args.concurrency,
+                     function_calling=args.function_calling, llm_cache=args.llm_cache,
+                     llm_cache_ttl=args.llm_cache_ttl))
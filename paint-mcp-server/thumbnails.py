@@ -0,0 +1,117 @@
+# Thumbnail generation with an on-disk cache, used by the thumbnail tools of example2.py
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+from PIL import Image as PILImage, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Generated thumbnails are kept here, one file per image, size and format
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", "thumbnail_cache")
+DEFAULT_THUMBNAIL_SIZE = 100
+MAX_THUMBNAIL_SIZE = 2048
+
+# Files create_thumbnails picks up from a directory
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+# Output formats, by the name tools accept, with their Pillow encoder and save options
+THUMBNAIL_FORMATS = {
+    "png": ("PNG", {"optimize": False}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+
+
+def validate_request(sizes, fmt):
+    """Raise ValueError for an unknown format or an out-of-range size"""
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unknown thumbnail format '{fmt}', expected one of {', '.join(THUMBNAIL_FORMATS)}")
+    if not sizes:
+        raise ValueError("At least one thumbnail size is required")
+    for size in sizes:
+        if not 1 <= size <= MAX_THUMBNAIL_SIZE:
+            raise ValueError(f"Thumbnail size must be between 1 and {MAX_THUMBNAIL_SIZE}, got {size}")
+
+def thumbnail_cache_path(image_path, stat, size, fmt, cache_dir=THUMBNAIL_CACHE_DIR):
+    """Cache file of one thumbnail; it changes whenever the image is modified"""
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}|{fmt}"
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest() + "." + fmt)
+
+def _encode(image, fmt):
+    encoder, options = THUMBNAIL_FORMATS[fmt]
+    if image.mode not in ("RGB", "RGBA", "L", "LA") and not (fmt == "png" and image.mode == "P"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, encoder, **options)
+    return buffer.getvalue()
+
+def _write_atomic(path, data):
+    # Concurrent workers may produce the same thumbnail; readers must never see a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def generate_thumbnails(image_path, sizes=(DEFAULT_THUMBNAIL_SIZE,), fmt="png", cache_dir=THUMBNAIL_CACHE_DIR):
+    """
+    Return {size: cache file} with a thumbnail of image_path fitting in size x size pixels
+    for every size. Missing ones are made from a single decode of the image: JPEGs are
+    decoded at reduced scale (draft mode) just large enough for the biggest size.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    validate_request(sizes, fmt)
+    stat = os.stat(image_path)
+    paths = {size: thumbnail_cache_path(image_path, stat, size, fmt, cache_dir) for size in sizes}
+    missing = [size for size in sizes if not os.path.exists(paths[size])]
+    if not missing:
+        return paths
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with PILImage.open(image_path) as img:
+        # draft() only picks a JPEG DCT scale; it is a no-op for other formats
+        img.draft("RGB", (missing[0] * 2, missing[0] * 2))
+        image = ImageOps.exif_transpose(img)
+        image.load()
+    # Largest first, each thumbnail resized from the previous one
+    for size in missing:
+        image.thumbnail((size, size))
+        _write_atomic(paths[size], _encode(image, fmt))
+    logger.debug(f"Generated {len(missing)} thumbnail(s) of {image_path}")
+    return paths
+
+def find_images(source, recursive=False):
+    """Image files in a directory (optionally with subdirectories) or matching a glob, sorted"""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*") if recursive else os.path.join(source, "*")
+        candidates = glob.iglob(pattern, recursive=recursive)
+    elif glob.has_magic(source):
+        candidates = glob.iglob(source, recursive=True)
+    else:
+        raise ValueError(f"{source} is neither a directory nor a glob pattern")
+    return sorted(
+        path for path in candidates
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(path)
+    )
+
+def thumbnail_batch(image_paths, sizes, fmt="png", cache_dir=THUMBNAIL_CACHE_DIR):
+    """
+    Worker entry point of create_thumbnails: thumbnail several images, recording
+    failures (e.g. corrupt files) per image instead of stopping the batch
+    """
+    entries = []
+    for image_path in image_paths:
+        try:
+            paths = generate_thumbnails(image_path, sizes, fmt, cache_dir)
+            entries.append({"source": image_path, "thumbnails": {str(size): path for size, path in paths.items()}})
+        except Exception as e:
+            entries.append({"source": image_path, "error": f"{type(e).__name__}: {e}"})
+    return entries
+
+def write_index(index_path, index):
+    """Write the thumbnail index as JSON, replacing any previous one atomically"""
+    directory = os.path.dirname(index_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _write_atomic(index_path, json.dumps(index, indent=2).encode())
@@ -0,0 +1,71 @@
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAINT_DIR = os.path.join(ROOT, "paint-mcp-server")
+GMAIL_DIR = os.path.join(ROOT, "gmail-mcp-server")
+
+# The servers import their helper modules (canvas, thumbnails, server) by plain name
+for directory in (PAINT_DIR, GMAIL_DIR):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+
+def load_script(path, name):
+    """Import a script whose file name is not a valid module name, e.g. talk2mcp-2.py"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Windows modules the agent scripts import at the top for their legacy Paint helpers
+WINDOWS_MODULES = ("win32gui", "win32con", "win32api", "win32process", "win32com", "win32com.client", "pywinauto")
+
+
+def stub_windows_modules():
+    """Put empty stand-ins for the Windows modules in sys.modules where the real ones are missing"""
+    for module_name in WINDOWS_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            sys.modules[module_name] = types.ModuleType(module_name)
+    sys.modules["win32com"].client = sys.modules["win32com.client"]
+    if not hasattr(sys.modules["pywinauto"], "Application"):
+        sys.modules["pywinauto"].Application = None
+
+
+def load_agent(script, name, tmp_path_factory):
+    """Import an agent script; it writes logs/ to the cwd, so that happens in a temporary directory"""
+    stub_windows_modules()
+    if name in sys.modules:
+        return sys.modules[name]
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp(name))
+    try:
+        return load_script(script, name)
+    finally:
+        os.chdir(cwd)
+
+
+AGENTS = {
+    "talk2mcp2": os.path.join(PAINT_DIR, "talk2mcp-2.py"),
+    "talk2mcp3": os.path.join(GMAIL_DIR, "talk2mcp-3.py"),
+}
+
+
+@pytest.fixture(scope="session", params=sorted(AGENTS))
+def agent(request, tmp_path_factory):
+    """Each agent script in turn, as a module"""
+    return load_agent(AGENTS[request.param], request.param, tmp_path_factory)
+
+
+@pytest.fixture(scope="session")
+def paint_agent(tmp_path_factory):
+    """talk2mcp-2.py, the agent of the Paint server"""
+    return load_agent(AGENTS["talk2mcp2"], "talk2mcp2", tmp_path_factory)
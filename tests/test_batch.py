@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+from mcp.types import Tool
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    def __init__(self, text):
+        self.text = text
+
+    def generate_content(self, contents, **kwargs):
+        return StubResponse(self.text)
+
+
+class SlowSession:
+    """Stand-in for the MCP ClientSession where every tool call takes a little while"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, arguments=None):
+        self.calls.append(name)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(content=[SimpleNamespace(text="done")])
+
+
+TOOLS = [Tool(name="int_list_to_exponential_sum", description="Sum of exponentials",
+              inputSchema={"type": "object", "properties": {"int_list": {"type": "array"}}, "required": ["int_list"]})]
+
+
+def test_batch_queries_do_not_interleave_canvas_steps(paint_agent, monkeypatch, tmp_path):
+    client = paint_agent.LLMClient(models=["stub"], model_factory=lambda name: StubModel(
+        "FUNCTION_CALL: int_list_to_exponential_sum|73|78|68"))
+    monkeypatch.setattr(paint_agent, "_llm_client", client)
+    session = SlowSession()
+    output_path = tmp_path / "results.jsonl"
+    queries = [{"id": i, "query": f"query {i}"} for i in range(3)]
+    try:
+        results = asyncio.run(paint_agent.run_batch(session, paint_agent.ToolRegistry(TOOLS), "system prompt",
+                                                    queries, output_path, concurrency=3))
+    finally:
+        client.close()
+
+    assert all(result["error"] is None for result in results)
+    assert len(output_path.read_text().splitlines()) == 3
+    # Every calculation runs before any drawing; each query then draws its whole picture in turn
+    canvas_calls = [name for name in session.calls if name in paint_agent.CANVAS_TOOLS]
+    assert session.calls[:3] == ["int_list_to_exponential_sum"] * 3
+    assert canvas_calls == ["open_paint", "draw_rectangle", "add_text_in_paint"] * 3
+
+
+def test_canvas_claim_is_released_when_a_query_ends(paint_agent):
+    async def main():
+        lock = asyncio.Lock()
+        first, second = paint_agent.CanvasClaim(lock), paint_agent.CanvasClaim(lock)
+        await first.acquire()
+        await first.acquire()  # claiming again is a no-op
+        waiter = asyncio.create_task(second.acquire())
+        await asyncio.sleep(0)
+        assert not second.held
+        first.release()
+        first.release()
+        await waiter
+        assert second.held
+        second.release()
+        assert not lock.locked()
+
+    asyncio.run(main())
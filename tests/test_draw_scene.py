@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import canvas
+import example2
+from canvas import FakePaintCanvas, FakeUiDriver, PillowCanvas, ignored_styles, validate_scene
+
+SCENE = [
+    {"type": "rectangle", "x1": 10, "y1": 10, "x2": 100, "y2": 60, "fill": "red"},
+    {"type": "text", "x": 20, "y": 20, "text": "Total", "font_size": 24},
+]
+
+
+def draw(backend, primitives):
+    """Open backend as the server's canvas and call the draw_scene tool; returns the result text"""
+    async def run():
+        await backend.open()
+        result = await example2.draw_scene(primitives)
+        return result["content"][0].text
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def fake_paint(monkeypatch):
+    backend = FakePaintCanvas()
+    backend.driver = FakeUiDriver(startup_delay=0, busy_delay=0)
+    monkeypatch.setattr(example2, "canvas", backend)
+    return backend
+
+
+def test_validate_scene_rejects_unsupported_types():
+    scene = SCENE + [{"type": "line", "x1": 0, "y1": 0, "x2": 5, "y2": 5}]
+    assert len(validate_scene(scene)) == 3
+    with pytest.raises(ValueError, match=r"unsupported primitive\(s\): 2 \(line\)"):
+        validate_scene(scene, ("rectangle", "text"))
+
+
+def test_ignored_styles():
+    assert ignored_styles(SCENE, canvas.SCENE_STYLES) == []
+    assert ignored_styles(SCENE, ()) == ["fill", "font_size"]
+    assert ignored_styles([{"type": "text", "color": None}], ()) == []
+
+
+def test_paint_rejects_the_scene_before_drawing(fake_paint):
+    text = draw(fake_paint, SCENE + [{"type": "ellipse", "x1": 0, "y1": 0, "x2": 5, "y2": 5}])
+    assert text.startswith("Error drawing scene") and "2 (ellipse)" in text
+    assert fake_paint.driver.actions == [("start",), ("maximize",)]
+
+
+def test_paint_reports_ignored_styles(fake_paint):
+    text = draw(fake_paint, SCENE)
+    assert text.startswith("Scene drawn with 2 primitives (1 rectangle, 1 text)")
+    assert "ignored fill, font_size" in text
+    assert ("type_keys", "Total") in fake_paint.driver.actions
+
+
+def test_pillow_draws_every_type_with_styles(monkeypatch):
+    backend = PillowCanvas(width=200, height=100)
+    monkeypatch.setattr(example2, "canvas", backend)
+    text = draw(backend, SCENE + [{"type": "ellipse", "x1": 120, "y1": 10, "x2": 180, "y2": 60, "fill": "blue"}])
+    assert text == "Scene drawn with 3 primitives (1 rectangle, 1 text, 1 ellipse)"
+    assert backend.image.getpixel((150, 35)) == (0, 0, 255)
+
+
+def test_canvas_image_is_returned_or_saved(monkeypatch, tmp_path):
+    backend = PillowCanvas(width=200, height=100)
+    monkeypatch.setattr(example2, "canvas", backend)
+    draw(backend, SCENE)
+    path = tmp_path / "canvas.png"
+
+    image = asyncio.run(example2.get_canvas_image())
+    result = asyncio.run(example2.save_canvas_image(str(path)))
+
+    assert image.data.startswith(b"\x89PNG")
+    assert result["content"][0].text == f"Canvas saved to {path}"
+    assert path.read_bytes().startswith(b"\x89PNG")
@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from mcp.types import Tool
+
+TOOLS = [
+    Tool(name="add", description="Add two numbers",
+         inputSchema={"type": "object", "properties": {"a": {"type": "integer"}, "b": {"type": "integer"}},
+                      "required": ["a", "b"]}),
+    Tool(name="array_reduce", description="Reduce an array",
+         inputSchema={"type": "object", "required": ["operation"], "properties": {
+             "operation": {"type": "string"},
+             "values": {"anyOf": [{"type": "array", "items": {"type": "number"}}, {"type": "null"}],
+                        "default": None, "title": "Values"}}}),
+]
+
+
+class StubResponse:
+    """Shaped like a Gemini response: .text raises when the candidate only holds function calls"""
+
+    def __init__(self, text="", function_calls=()):
+        parts = [SimpleNamespace(text=text, function_call=None)] if text else []
+        parts += [SimpleNamespace(text="", function_call=SimpleNamespace(name=name, args=args))
+                  for name, args in function_calls]
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=parts))]
+        self._text = text
+
+    @property
+    def text(self):
+        if not self._text:
+            raise ValueError("The response holds no text part")
+        return self._text
+
+
+class ScriptedModel:
+    """Stand-in for genai.GenerativeModel answering with the next scripted response"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.prompts = []
+
+    def generate_content(self, contents, **kwargs):
+        self.prompts.append(contents)
+        self.requests.append(kwargs)
+        return self.responses[min(len(self.requests), len(self.responses)) - 1]
+
+
+class RecordingSession:
+    """Stand-in for the MCP ClientSession, answering every tool call with one text item"""
+
+    def __init__(self, answer="7"):
+        self.answer = answer
+        self.calls = []
+
+    async def call_tool(self, name, arguments=None):
+        self.calls.append((name, arguments))
+        return SimpleNamespace(content=[SimpleNamespace(text=self.answer)])
+
+
+@pytest.fixture
+def run_with_model(agent, monkeypatch):
+    """Run one query through run_agent with the shared LLM client backed by a scripted model"""
+
+    def run(responses, function_calling="native"):
+        model = ScriptedModel(responses)
+        client = agent.LLMClient(models=["stub"], model_factory=lambda name: model)
+        monkeypatch.setattr(agent, "_llm_client", client)
+        session = RecordingSession()
+        try:
+            outcome = asyncio.run(agent.run_agent(session, agent.ToolRegistry(TOOLS), "system prompt",
+                                                  "What is 3 + 4?", function_calling=function_calling))
+        finally:
+            client.close()
+        return outcome, session, model
+    return run
+
+
+def test_extract_function_calls(agent):
+    response = StubResponse(function_calls=[("add", {"a": 3.0, "b": 4.0})])
+    assert agent.extract_function_calls(response) == [("add", {"a": 3.0, "b": 4.0})]
+    assert agent.get_response_text(response) == ""
+    assert agent.extract_function_calls(StubResponse("FINAL_ANSWER: [7]")) == []
+
+
+def test_function_declarations_follow_the_tool_schemas(agent):
+    [tools] = agent.ToolRegistry(TOOLS).function_declarations()
+    add, reduce = tools["function_declarations"]
+    assert add["name"] == "add"
+    assert add["parameters"]["properties"] == {"a": {"type": "integer"}, "b": {"type": "integer"}}
+    assert add["parameters"]["required"] == ["a", "b"]
+    # Optional anyOf collapses to its non-null option; title and default are dropped
+    assert reduce["parameters"]["properties"]["values"] == {"type": "array", "items": {"type": "number"}}
+
+
+def test_native_arguments_are_coerced_to_schema_types(agent):
+    registry = agent.ToolRegistry(TOOLS)
+    assert registry.coerce("add", {"a": 3.0, "b": "4"}) == {"a": 3, "b": 4}
+    assert registry.coerce("array_reduce", {"operation": "sum"}) == {"operation": "sum", "values": None}
+    with pytest.raises(ValueError, match="add.a"):
+        registry.coerce("add", {"a": 3.5, "b": 4})
+
+
+def test_structured_call_runs_the_tool(run_with_model):
+    outcome, session, model = run_with_model([
+        StubResponse(function_calls=[("add", {"a": 3.0, "b": 4.0})]),
+        StubResponse("FINAL_ANSWER: [7]"),
+    ])
+    assert session.calls == [("add", {"a": 3, "b": 4})]
+    assert outcome["error"] is None
+    assert outcome["final_answer"] == "[7]"
+    assert "add" in outcome["steps"][0]
+    declarations = model.requests[0]["tools"][0]["function_declarations"]
+    assert [declaration["name"] for declaration in declarations] == ["add", "array_reduce"]
+
+
+def test_native_mode_falls_back_to_function_call_text(run_with_model):
+    _, session, _ = run_with_model([StubResponse("FUNCTION_CALL: add|3|4"), StubResponse("FINAL_ANSWER: [7]")])
+    assert session.calls[0] == ("add", {"a": 3, "b": 4})
+
+
+def test_text_mode_sends_no_declarations(run_with_model):
+    _, session, model = run_with_model([StubResponse("FUNCTION_CALL: add|3|4"), StubResponse("FINAL_ANSWER: [7]")],
+                                       function_calling="text")
+    assert session.calls[0] == ("add", {"a": 3, "b": 4})
+    assert "tools" not in model.requests[0]
+
+
+def test_loop_prompts_again_with_the_steps_until_the_final_answer(run_with_model):
+    outcome, session, model = run_with_model([
+        StubResponse("FUNCTION_CALL: add|3|4"),
+        StubResponse("FUNCTION_CALL: array_reduce|sum|[3,4]"),
+        StubResponse("FINAL_ANSWER: [7]"),
+    ], function_calling="text")
+    assert [name for name, _ in session.calls] == ["add", "array_reduce"]
+    assert outcome["final_answer"] == "[7]"
+    assert len(model.prompts) == 3
+    assert "add" in model.prompts[1] and "array_reduce" in model.prompts[2]
+
+
+def test_iterations_when_the_budget_runs_out(agent, run_with_model):
+    outcome, session, model = run_with_model([StubResponse("FUNCTION_CALL: add|3|4")], function_calling="text")
+    assert len(model.prompts) == agent.max_iterations
+    assert outcome["iterations"] == agent.max_iterations
+    assert outcome["final_answer"] is None
+
+
+def test_iterations_when_the_model_answers(run_with_model):
+    outcome, _, _ = run_with_model([StubResponse("FUNCTION_CALL: add|3|4"), StubResponse("FINAL_ANSWER: [7]")],
+                                   function_calling="text")
+    assert outcome["iterations"] == 2
@@ -0,0 +1,32 @@
+from decimal import Decimal
+
+import pytest
+
+import server
+from server import int_list_to_exponential_sum
+
+
+@pytest.mark.parametrize("int_list", [
+    pytest.param(list(range(-50, 50)) * 12, id="small values"),
+    pytest.param([709] * 1200, id="every term fits a float, the sum does not"),
+    pytest.param(list(range(500, 800)) * 4, id="terms overflow a float"),
+])
+@pytest.mark.parametrize("mode", server.EXP_SUM_MODES)
+def test_numpy_path_matches_the_python_path(monkeypatch, int_list, mode):
+    monkeypatch.setattr(server, 'EXP_SUM_NUMPY_THRESHOLD', len(int_list) + 1)
+    python_result = int_list_to_exponential_sum(int_list, mode)
+    monkeypatch.setattr(server, 'EXP_SUM_NUMPY_THRESHOLD', len(int_list))
+    numpy_result = int_list_to_exponential_sum(int_list, mode)
+
+    assert type(numpy_result) is type(python_result)
+    if isinstance(python_result, str):
+        assert Decimal(numpy_result) / Decimal(python_result) == pytest.approx(1, rel=1e-12)
+    else:
+        assert numpy_result == pytest.approx(python_result, rel=1e-12)
+
+
+def test_empty_list():
+    assert int_list_to_exponential_sum([]) == 0.0
+    assert int_list_to_exponential_sum([], "decimal") == "0"
+    with pytest.raises(ValueError):
+        int_list_to_exponential_sum([], "log")
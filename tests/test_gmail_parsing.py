@@ -0,0 +1,94 @@
+import base64
+
+import pytest
+
+from server import parse_message_payload, truncate_body
+
+
+def b64(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def text_part(mime_type, text, charset=None):
+    part = {'mimeType': mime_type, 'filename': '', 'body': {'size': len(text.encode()), 'data': b64(text)}}
+    if charset:
+        part['headers'] = [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}]
+    return part
+
+
+def multipart(mime_type, *parts):
+    return {'mimeType': mime_type, 'filename': '', 'body': {'size': 0}, 'parts': list(parts)}
+
+
+PDF = {'mimeType': 'application/pdf', 'filename': 'report.pdf',
+       'body': {'size': 52000, 'attachmentId': 'att-1'}}
+HEADERS = [{'name': 'Subject', 'value': '=?utf-8?q?Caf=C3=A9?='}, {'name': 'From', 'value': 'a@example.com'},
+           {'name': 'To', 'value': 'b@example.com'}, {'name': 'Date', 'value': 'Mon, 1 Jan 2024 10:00:00 +0000'}]
+
+
+@pytest.mark.parametrize("payload, content, attachments", [
+    pytest.param(text_part('text/plain', "Just text"), "Just text", [], id="single part"),
+    pytest.param(multipart('multipart/mixed',
+                           multipart('multipart/alternative',
+                                     text_part('text/plain', "Plain version"),
+                                     text_part('text/html', "<p>HTML version</p>")),
+                           PDF),
+                 "Plain version", ['report.pdf'], id="nested multipart/alternative"),
+    pytest.param(multipart('multipart/mixed',
+                           text_part('text/html', "<html><style>p {color: red}</style>"
+                                                  "<p>Hello&nbsp;<b>there</b></p><p>Second</p></html>"),
+                           PDF),
+                 "Hello there\nSecond", ['report.pdf'], id="html-only fallback"),
+    pytest.param(multipart('multipart/mixed',
+                           {'mimeType': 'text/plain', 'filename': 'notes.txt',
+                            'body': {'size': 12, 'attachmentId': 'att-2'}},
+                           text_part('text/plain', "The body")),
+                 "The body", ['notes.txt'], id="text attachment is not the body"),
+    pytest.param(text_part('text/plain', "Gr\xfc\xdfe", charset='iso-8859-1') | {
+                     'body': {'data': b64("Gr\xfc\xdfe".encode('iso-8859-1'))}},
+                 "Gr\xfc\xdfe", [], id="declared charset"),
+    pytest.param(multipart('multipart/mixed', PDF), None, ['report.pdf'], id="attachment only"),
+])
+def test_parse_message_payload(payload, content, attachments):
+    email = parse_message_payload({'id': 'm1', 'payload': {**payload, 'headers': HEADERS + payload.get('headers', [])}})
+
+    assert email['content'] == content
+    assert email['subject'] == "Café"
+    assert (email['from'], email['to']) == ('a@example.com', 'b@example.com')
+    assert [attachment['filename'] for attachment in email['attachments']] == attachments
+    assert 'truncated' not in email
+
+
+def test_attachments_are_listed_without_their_contents():
+    email = parse_message_payload({'payload': multipart('multipart/mixed', text_part('text/plain', "Hi"), PDF)})
+
+    assert email['attachments'] == [
+        {'filename': 'report.pdf', 'mimeType': 'application/pdf', 'size': 52000, 'attachmentId': 'att-1'},
+    ]
+
+
+# "é" and "€" take 2 and 3 bytes in UTF-8
+@pytest.mark.parametrize("text, max_body_bytes, content, truncated", [
+    ("abcdef", 6, "abcdef", False),
+    ("abcdef", 4, "abcd", True),
+    ("aé", 2, "a", True),
+    ("aé", 3, "aé", False),
+    ("a€b", 3, "a", True),
+    ("a€b", 4, "a€", True),
+])
+def test_body_is_truncated_on_a_utf8_boundary(text, max_body_bytes, content, truncated):
+    email = parse_message_payload({'payload': text_part('text/plain', text)}, max_body_bytes=max_body_bytes)
+    assert email['content'] == content
+    assert email.get('truncated', False) is truncated
+
+    cached = parse_message_payload({'payload': text_part('text/plain', text)})
+    email = truncate_body(cached, max_body_bytes)
+    assert email['content'] == content
+    assert email.get('truncated', False) is truncated
+
+
+def test_truncate_body_leaves_bodyless_emails_alone():
+    email = {'content': None, 'subject': 'x', 'attachments': []}
+    assert truncate_body(email, 1) is email
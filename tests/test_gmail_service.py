@@ -0,0 +1,356 @@
+import asyncio
+import base64
+import json
+import logging
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from email.parser import Parser
+
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.http import HttpMockSequence
+
+import server
+from server import GmailService
+
+
+def message(email_id, text=None):
+    """A format=full message as Gmail returns it, with a text/plain body"""
+    text = text if text is not None else f"Body of {email_id}"
+    return {
+        'id': email_id,
+        'threadId': f"t-{email_id}",
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [{'name': 'Subject', 'value': f"Subject {email_id}"}, {'name': 'From', 'value': 'a@example.com'}],
+            'body': {'data': base64.urlsafe_b64encode(text.encode()).decode()},
+        },
+    }
+
+
+class FakeGmail:
+    """
+    In-memory Gmail backend that answers the API calls GmailService makes.
+    Every request, including each request inside a batch, is recorded in `requests`.
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.unread = []
+        self.history_id = '100'
+        # Responses of successive history.list calls, as (status, body)
+        self.history_pages = []
+        self.attachments = {}
+        self.requests = []
+        self.batch_sizes = []
+        self.batch_latency = 0.0
+        self.batches_in_flight = 0
+        self.max_batches_in_flight = 0
+        self._lock = threading.Lock()
+
+    def http(self):
+        return FakeGmailHttp(self)
+
+    def calls(self, method, path):
+        """Recorded requests with the given method and path below users/me/"""
+        return [request for request in self.requests if request[:2] == (method, path)]
+
+    def handle(self, method, uri, body):
+        """Answer one (non-batch) API request with (status, JSON body)"""
+        parsed = urllib.parse.urlparse(uri)
+        path = parsed.path.split('/users/me/', 1)[1]
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        body = json.loads(body) if body else None
+        with self._lock:
+            self.requests.append((method, path, params, body))
+
+        if path == 'profile':
+            return 200, {'emailAddress': 'me@example.com', 'historyId': self.history_id}
+        if path == 'history':
+            return self.history_pages.pop(0)
+        if path == 'messages' and method == 'GET':
+            return 200, {'messages': [{'id': email_id, 'threadId': f"t-{email_id}"} for email_id in self.unread]}
+        if path in ('messages/batchModify', 'messages/send') or path.endswith(('/modify', '/trash')):
+            return 200, {'id': 'sent'} if path == 'messages/send' else {}
+        if '/attachments/' in path:
+            email_id, _, attachment_id = path[len('messages/'):].split('/')
+            if (email_id, attachment_id) in self.attachments:
+                return 200, self.attachments[email_id, attachment_id]
+        elif path.startswith('messages/') and path[len('messages/'):] in self.messages:
+            return 200, self.messages[path[len('messages/'):]]
+        return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+
+    def handle_batch(self, body, content_type):
+        """Answer a multipart/mixed batch request with one multipart/mixed response"""
+        with self._lock:
+            self.batches_in_flight += 1
+            self.max_batches_in_flight = max(self.max_batches_in_flight, self.batches_in_flight)
+        time.sleep(self.batch_latency)
+
+        request = Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}")
+        parts = []
+        for part in request.get_payload():
+            request_line = part.get_payload().split('\n', 1)[0]
+            method, path, _ = request_line.split(' ')
+            status, content = self.handle(method, f"https://gmail.googleapis.com{path}", None)
+            parts.append(f"--batch_boundary\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                         f"Content-Type: application/json\r\n\r\n{json.dumps(content)}\r\n")
+
+        with self._lock:
+            self.batch_sizes.append(len(parts))
+            self.batches_in_flight -= 1
+        return ({'status': '200', 'content-type': 'multipart/mixed; boundary=batch_boundary'},
+                ''.join(parts) + '--batch_boundary--')
+
+
+class FakeGmailHttp(HttpMockSequence):
+    """HttpMockSequence whose responses come from a FakeGmail instead of a fixed list"""
+
+    def __init__(self, backend):
+        super().__init__([])
+        self.backend = backend
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        if urllib.parse.urlparse(uri).path == '/batch':
+            self._iterable.append(self.backend.handle_batch(body, headers['content-type']))
+        else:
+            status, content = self.backend.handle(method, uri, body)
+            self._iterable.append(({'status': str(status)}, json.dumps(content)))
+        return super().request(uri, method, body, headers, *args, **kwargs)
+
+
+@pytest.fixture
+def gmail():
+    return FakeGmail()
+
+
+def make_service(backend, **kwargs):
+    return GmailService('unused', 'unused', http_factory=backend.http, **kwargs)
+
+
+def test_unread_emails_are_fetched_in_batches_of_batch_size(gmail):
+    gmail.unread = [f"m{i}" for i in range(121)]
+    gmail.messages = {email_id: message(email_id) for email_id in gmail.unread}
+
+    emails = asyncio.run(make_service(gmail).get_unread_emails(include_content=True))
+
+    assert sorted(gmail.batch_sizes) == [21, server.BATCH_SIZE, server.BATCH_SIZE]
+    assert [email['id'] for email in emails] == gmail.unread
+    assert emails[120]['content'] == "Body of m120"
+    assert emails[0]['subject'] == "Subject m0"
+    assert emails[0]['threadId'] == "t-m0"
+
+
+def test_failing_message_in_a_batch_does_not_fail_the_others(gmail):
+    gmail.unread = [f"m{i}" for i in range(5)]
+    gmail.messages = {email_id: message(email_id) for email_id in gmail.unread if email_id != "m2"}
+
+    emails = asyncio.run(make_service(gmail).get_unread_emails(include_content=True))
+
+    assert gmail.batch_sizes == [5]
+    assert [email['id'] for email in emails] == gmail.unread
+    assert '404' in emails[2]['error']
+    assert 'content' not in emails[2]
+    assert all(email['content'] == f"Body of {email['id']}" for i, email in enumerate(emails) if i != 2)
+
+
+def test_concurrent_batches_are_limited_to_max_workers(gmail):
+    gmail.batch_latency = 0.05
+    gmail.unread = [f"m{i}" for i in range(5 * server.BATCH_SIZE)]
+    gmail.messages = {email_id: message(email_id) for email_id in gmail.unread}
+
+    emails = asyncio.run(make_service(gmail).get_unread_emails(include_content=True, max_workers=2))
+
+    assert len(emails) == 5 * server.BATCH_SIZE
+    assert len(gmail.batch_sizes) == 5
+    # The API thread pool has more threads than that, so only the semaphore keeps it at two
+    assert gmail.max_batches_in_flight == 2
+
+
+def test_cache_sync_applies_history_records(gmail, tmp_path):
+    gmail.unread = ["m1", "m2"]
+    service = make_service(gmail, cache_path=str(tmp_path / "cache.sqlite"))
+    assert asyncio.run(service.get_unread_emails()) == [{'id': "m1", 'threadId': "t-m1"}, {'id': "m2", 'threadId': "t-m2"}]
+    assert service.cache.get_history_id() == '100'
+
+    gmail.history_pages = [
+        (200, {'history': [
+            {'messagesAdded': [{'message': {'id': "m3", 'threadId': "t-m3", 'labelIds': server.UNREAD_LABELS}}]},
+            {'labelsRemoved': [{'message': {'id': "m1"}, 'labelIds': ['UNREAD']}]},
+        ], 'nextPageToken': 'page2', 'historyId': '120'}),
+        (200, {'history': [
+            {'labelsAdded': [{'message': {'id': "m4", 'threadId': "t-m4"}, 'labelIds': server.UNREAD_LABELS}]},
+            {'messagesDeleted': [{'message': {'id': "m2"}}]},
+        ], 'historyId': '120'}),
+    ]
+    emails = asyncio.run(service.get_unread_emails())
+
+    assert [email['id'] for email in emails] == ["m4", "m3"]
+    assert [params for _, _, params, _ in gmail.calls('GET', 'history')] == [
+        {'startHistoryId': '100', 'alt': 'json'},
+        {'startHistoryId': '100', 'pageToken': 'page2', 'alt': 'json'},
+    ]
+    # Served from the cache, the unread listing was only requested once
+    assert len(gmail.calls('GET', 'messages')) == 1
+    assert service.cache.get_history_id() == '120'
+
+
+def test_expired_history_id_falls_back_to_a_full_listing(gmail, tmp_path):
+    gmail.unread = ["m1", "m2"]
+    cache_path = str(tmp_path / "cache.sqlite")
+    asyncio.run(make_service(gmail, cache_path=cache_path).get_unread_emails())
+
+    # A new server process reuses the cache file, whose historyId Gmail no longer knows
+    gmail.unread = ["m5"]
+    gmail.history_id = '500'
+    gmail.history_pages = [(404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}})]
+    service = make_service(gmail, cache_path=cache_path)
+    emails = asyncio.run(service.get_unread_emails())
+
+    assert emails == [{'id': "m5", 'threadId': "t-m5"}]
+    assert len(gmail.calls('GET', 'history')) == 1
+    assert len(gmail.calls('GET', 'messages')) == 2
+    assert service.cache.unread_messages() == [{'id': "m5", 'threadId': "t-m5"}]
+    assert service.cache.get_history_id() == '500'
+
+
+def test_deferred_reads_are_merged_into_one_batch_modify(gmail):
+    gmail.messages = {email_id: message(email_id) for email_id in ("m1", "m2", "m3")}
+    service = make_service(gmail)
+
+    async def main():
+        for email_id in ("m1", "m2", "m1", "m3"):
+            await service.read_email(email_id, defer_mark_as_read=True)
+        return await service.flush_pending_reads()
+
+    assert asyncio.run(main()) == "3 emails marked as read."
+    assert [body for _, _, _, body in gmail.calls('POST', 'messages/batchModify')] == [
+        {'ids': ["m1", "m2", "m3"], 'removeLabelIds': ['UNREAD']},
+    ]
+    assert not gmail.calls('POST', 'messages/m1/modify')
+
+
+def test_deferred_reads_are_flushed_after_a_delay(gmail, monkeypatch):
+    monkeypatch.setattr(server, 'READ_FLUSH_DELAY', 0.01)
+    gmail.messages = {"m1": message("m1")}
+    service = make_service(gmail)
+
+    async def main():
+        await service.read_email("m1", defer_mark_as_read=True)
+        assert not gmail.calls('POST', 'messages/batchModify')
+        await asyncio.sleep(0.1)
+        return await service.flush_pending_reads()
+
+    assert asyncio.run(main()) == "No pending emails to mark as read."
+    assert len(gmail.calls('POST', 'messages/batchModify')) == 1
+
+
+def test_batch_modify_is_split_at_the_api_limit(gmail):
+    email_ids = [f"m{i}" for i in range(2 * server.BATCH_MODIFY_LIMIT + 500)]
+
+    result = asyncio.run(make_service(gmail).batch_mark_as_read(email_ids))
+
+    assert result == f"{len(email_ids)} emails marked as read."
+    bodies = [body for _, _, _, body in gmail.calls('POST', 'messages/batchModify')]
+    assert [len(body['ids']) for body in bodies] == [server.BATCH_MODIFY_LIMIT, server.BATCH_MODIFY_LIMIT, 500]
+    assert [email_id for body in bodies for email_id in body['ids']] == email_ids
+
+
+def test_batch_trash_dedupes_and_adds_the_trash_label(gmail):
+    result = asyncio.run(make_service(gmail).batch_trash_emails(["m1", "m2", "m1"]))
+
+    assert result == "2 emails moved to trash successfully."
+    assert [body for _, _, _, body in gmail.calls('POST', 'messages/batchModify')] == [
+        {'ids': ["m1", "m2"], 'addLabelIds': ['TRASH'], 'removeLabelIds': ['INBOX']},
+    ]
+
+
+def test_deferred_reads_flush_at_once_when_a_batch_is_full(gmail, monkeypatch):
+    monkeypatch.setattr(server, 'BATCH_MODIFY_LIMIT', 2)
+    gmail.messages = {email_id: message(email_id) for email_id in ("m1", "m2", "m3")}
+    service = make_service(gmail)
+
+    async def main():
+        for email_id in ("m1", "m2", "m3"):
+            await service.read_email(email_id, defer_mark_as_read=True)
+        assert [body['ids'] for _, _, _, body in gmail.calls('POST', 'messages/batchModify')] == [["m1", "m2"]]
+        await service.close()
+
+    asyncio.run(main())
+    assert [body['ids'] for _, _, _, body in gmail.calls('POST', 'messages/batchModify')] == [["m1", "m2"], ["m3"]]
+
+
+def test_get_attachment_returns_the_encoded_data(gmail):
+    data = base64.urlsafe_b64encode(b'%PDF-1.4 fake').decode()
+    gmail.attachments[("m1", "att-1")] = {'attachmentId': 'att-1', 'size': 13, 'data': data}
+    service = make_service(gmail)
+
+    assert asyncio.run(service.get_attachment("m1", "att-1")) == {'size': 13, 'data': data}
+    assert asyncio.run(service.get_attachment("m1", "missing")).startswith("An HttpError occurred")
+    assert [path for _, path, _, _ in gmail.requests] == ["messages/m1/attachments/att-1",
+                                                          "messages/m1/attachments/missing"]
+
+
+def test_failed_startup_is_logged_without_a_tool_call(caplog):
+    async def start():
+        raise FileNotFoundError("credentials.json")
+
+    async def main():
+        task = asyncio.create_task(start())
+        task.add_done_callback(server.log_startup_failure)
+        await asyncio.sleep(0)
+
+    with caplog.at_level(logging.ERROR, logger=server.logger.name):
+        asyncio.run(main())
+    assert "Gmail service startup failed: credentials.json" in caplog.text
+
+
+def fake_credentials(expires_in):
+    # google-auth keeps expiry as a naive UTC datetime
+    expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=expires_in)
+    return Credentials(token='access', refresh_token='refresh', token_uri='https://oauth2.googleapis.com/token',
+                       client_id='client', client_secret='secret', expiry=expiry)
+
+
+@pytest.mark.parametrize("expires_in, first_delay", [
+    (-60, 0),
+    (1000, 1000 - server.TOKEN_REFRESH_MARGIN),
+])
+def test_token_is_refreshed_before_it_expires(gmail, monkeypatch, tmp_path, expires_in, first_delay):
+    token = fake_credentials(expires_in)
+    refreshed = []
+
+    def refresh(request):
+        refreshed.append(request)
+        token.token = 'new access'
+        token.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) > 1:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(token, 'refresh', refresh)
+    service = GmailService('unused', str(tmp_path / "token.json"), http_factory=gmail.http)
+    service.token = token
+
+    async def main():
+        await service.start()
+        assert service._refresh_task is not None
+        service._refresh_task.cancel()
+        monkeypatch.setattr(server.asyncio, 'sleep', sleep)
+        with pytest.raises(asyncio.CancelledError):
+            await service._refresh_token_before_expiry()
+
+    asyncio.run(main())
+    assert delays[0] == pytest.approx(first_delay, abs=5)
+    assert len(refreshed) == 1
+    # The next refresh is again due TOKEN_REFRESH_MARGIN seconds before the new expiry
+    assert delays[1] == pytest.approx(3600 - server.TOKEN_REFRESH_MARGIN, abs=5)
+    assert json.loads((tmp_path / "token.json").read_text())['token'] == 'new access'
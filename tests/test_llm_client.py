@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stand-in for genai.GenerativeModel; each call runs the next behaviour in the script"""
+
+    def __init__(self, name, script):
+        self.name = name
+        self.script = list(script)
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        behaviour = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        return behaviour(self.name)
+
+
+def answer(name):
+    return StubResponse(f"answer from {name}")
+
+
+def fail(name):
+    raise RuntimeError(f"{name} is overloaded")
+
+
+def slow(seconds):
+    def behaviour(name):
+        time.sleep(seconds)
+        return StubResponse(f"late answer from {name}")
+    return behaviour
+
+
+def make_client(agent, scripts, **options):
+    """LLMClient over stub models; scripts maps each model name to its behaviours"""
+    models = {name: StubModel(name, script) for name, script in scripts.items()}
+    options.setdefault("backoff_base", 0.01)
+    options.setdefault("backoff_max", 0.05)
+    client = agent.LLMClient(models=list(scripts), model_factory=models.__getitem__, **options)
+    return client, models
+
+
+def test_retries_failed_calls_with_backoff(agent):
+    client, models = make_client(agent, {"primary": [fail, fail, answer]}, retries=2)
+    delays = []
+    backoff = client._backoff
+    client._backoff = lambda attempt: delays.append(backoff(attempt)) or delays[-1]
+    try:
+        response = asyncio.run(client.generate("prompt", timeout=5))
+    finally:
+        client.close()
+    assert response.text == "answer from primary"
+    assert models["primary"].calls == 3
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 0.01 and 0 <= delays[1] <= 0.02
+
+
+def test_backoff_is_capped(agent):
+    client, _ = make_client(agent, {"primary": [answer]}, backoff_base=1, backoff_max=3)
+    try:
+        assert all(0 <= client._backoff(attempt) <= 3 for attempt in range(10))
+    finally:
+        client.close()
+
+
+def test_falls_back_to_next_model_after_retries(agent):
+    client, models = make_client(agent, {"primary": [fail], "fallback": [answer]}, retries=1)
+    try:
+        response = asyncio.run(client.generate("prompt", timeout=5))
+    finally:
+        client.close()
+    assert response.text == "answer from fallback"
+    assert models["primary"].calls == 2
+
+
+def test_timeout_moves_to_next_model_without_retrying(agent):
+    client, models = make_client(agent, {"primary": [slow(0.5)], "fallback": [answer]},
+                                 attempt_timeout=0.1, retries=2)
+    start = time.monotonic()
+    try:
+        response = asyncio.run(client.generate("prompt", timeout=5))
+    finally:
+        client.close()
+    assert response.text == "answer from fallback"
+    assert models["primary"].calls == 1
+    assert time.monotonic() - start < 0.4
+
+
+def test_total_deadline_covers_all_models(agent):
+    client, models = make_client(agent, {"primary": [slow(0.3)], "fallback": [slow(0.3)]},
+                                 attempt_timeout=1, retries=2)
+    start = time.monotonic()
+    try:
+        with pytest.raises(agent.TimeoutError):
+            asyncio.run(client.generate("prompt", timeout=0.2))
+    finally:
+        client.close()
+    assert time.monotonic() - start < 0.3
+    assert models["fallback"].calls == 0
+
+
+def test_raises_last_error_when_every_model_fails(agent):
+    client, models = make_client(agent, {"primary": [fail], "fallback": [fail]}, retries=1)
+    try:
+        with pytest.raises(RuntimeError, match="fallback is overloaded"):
+            asyncio.run(client.generate("prompt", timeout=5))
+    finally:
+        client.close()
+    assert models["primary"].calls == models["fallback"].calls == 2
+
+
+def test_models_are_built_once(agent):
+    built = []
+
+    def factory(name):
+        built.append(name)
+        return StubModel(name, [answer])
+
+    client = agent.LLMClient(models=["primary"], model_factory=factory)
+    try:
+        for _ in range(3):
+            asyncio.run(client.generate("prompt", timeout=5))
+    finally:
+        client.close()
+    assert built == ["primary"]
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+import canvas
+from canvas import FakeUiDriver, PaintCanvas, wait_until
+
+
+def test_wait_until_returns_the_first_truthy_result():
+    answers = iter([None, 0, "ready"])
+    assert asyncio.run(wait_until(lambda: next(answers), timeout=1, interval=0.001)) == "ready"
+
+
+def test_wait_until_times_out():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError, match="the window"):
+        asyncio.run(wait_until(lambda: False, timeout=0.1, interval=0.01, description="the window"))
+    assert 0.1 <= time.monotonic() - start < 0.5
+
+
+def test_wait_until_yields_to_the_event_loop():
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        task = asyncio.create_task(ticker())
+        deadline = time.monotonic() + 0.1
+        await wait_until(lambda: time.monotonic() >= deadline, timeout=1, interval=0.01)
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(ticks) >= 5
+
+
+def test_open_waits_for_the_window_only_as_long_as_it_takes():
+    driver = FakeUiDriver(startup_delay=0.1, busy_delay=0.01)
+    paint = PaintCanvas(driver, timeout=1)
+    start = time.monotonic()
+    asyncio.run(paint.open())
+    assert 0.1 <= time.monotonic() - start < 0.5
+    assert paint.is_open
+    assert driver.actions == [("start",), ("maximize",)]
+
+
+def test_open_times_out_when_paint_never_appears(monkeypatch):
+    monkeypatch.setattr(canvas, "PAINT_START_TIMEOUT", 0.1)
+    paint = PaintCanvas(FakeUiDriver(startup_delay=10), timeout=1)
+    with pytest.raises(TimeoutError, match="Paint window"):
+        asyncio.run(paint.open())
+    assert not paint.is_open
+
+
+def test_draw_rectangle_steps():
+    driver = FakeUiDriver(startup_delay=0, busy_delay=0.005)
+    paint = PaintCanvas(driver, timeout=1)
+
+    async def draw():
+        await paint.open()
+        await paint.draw_rectangle(10, 20, 110, 120)
+
+    asyncio.run(draw())
+    assert driver.actions[2:] == [
+        ("set_focus",),
+        ("click_window", canvas.RECTANGLE_TOOL_COORDS),
+        ("click_canvas", (10, 20)),
+        ("press_canvas", (10, 20)),
+        ("release_canvas", (110, 120)),
+    ]
+
+
+def test_add_text_defaults_to_the_text_position():
+    driver = FakeUiDriver(startup_delay=0, busy_delay=0.005)
+    paint = PaintCanvas(driver, timeout=1)
+    driver.focused = True
+    assert asyncio.run(paint.add_text("Result = 42")) == canvas.DEFAULT_TEXT_POSITION
+    assert driver.actions == [
+        ("click_window", canvas.GREEN_COLOR_COORDS),
+        ("click_window", canvas.TEXT_TOOL_COORDS),
+        ("click_canvas", canvas.DEFAULT_TEXT_POSITION),
+        ("type_keys", "Result = 42"),
+        ("click_canvas", canvas.TEXT_DONE_COORDS),
+    ]
+
+
+def test_steps_wait_for_paint_to_become_idle():
+    driver = FakeUiDriver(startup_delay=0, busy_delay=0.05)
+    paint = PaintCanvas(driver, timeout=1)
+    driver.focused = True
+    start = time.monotonic()
+    asyncio.run(paint.draw_rectangle(0, 0, 10, 10))
+    # Four UI actions, each keeping the fake Paint busy for busy_delay
+    assert time.monotonic() - start >= 4 * 0.05
+
+
+def test_busy_paint_times_out():
+    driver = FakeUiDriver(startup_delay=0, busy_delay=10)
+    paint = PaintCanvas(driver, timeout=0.1)
+    driver.focused = True
+    with pytest.raises(TimeoutError, match="idle after selecting the rectangle tool"):
+        asyncio.run(paint.draw_rectangle(0, 0, 10, 10))
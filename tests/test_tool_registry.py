@@ -0,0 +1,56 @@
+import pytest
+from mcp.types import Tool
+
+
+def tool(name, properties, required):
+    return Tool(name=name, description=name, inputSchema={"type": "object", "properties": properties,
+                                                           "required": required})
+
+
+def optional(schema):
+    return {"anyOf": [schema, {"type": "null"}], "default": None}
+
+
+TOOLS = [
+    tool("add", {"a": {"type": "integer"}, "b": {"type": "integer"}}, ["a", "b"]),
+    tool("int_list_to_exponential_sum",
+         {"int_list": {"type": "array", "items": {}}, "mode": {"type": "string", "default": "auto"}}, ["int_list"]),
+    tool("array_elementwise", {
+        "operation": {"type": "string"},
+        "values": optional({"type": "array", "items": {"type": "number"}}),
+        "values_b64": optional({"type": "string"}),
+        "operand": optional({"type": "number"}),
+    }, ["operation"]),
+    tool("create_thumbnail", {
+        "image_path": {"type": "string"},
+        "sizes": optional({"type": "array", "items": {"type": "integer"}}),
+        "format": {"type": "string", "default": "png"},
+    }, ["image_path"]),
+]
+
+
+@pytest.fixture
+def registry(agent):
+    return agent.ToolRegistry(TOOLS)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("add|3|4", {"a": 3, "b": 4}),
+    ("int_list_to_exponential_sum|73|78|68", {"int_list": [73, 78, 68], "mode": "auto"}),
+    ("int_list_to_exponential_sum|[1000,1000]|log", {"int_list": [1000, 1000], "mode": "log"}),
+    ("array_elementwise|add|[1,4,9]||5", {"operation": "add", "values": [1, 4, 9], "values_b64": None, "operand": 5}),
+    ("create_thumbnail|x.jpg|64,128|webp", {"image_path": "x.jpg", "sizes": [64, 128], "format": "webp"}),
+    ("create_thumbnail|x.jpg", {"image_path": "x.jpg", "sizes": None, "format": "png"}),
+])
+def test_parse(registry, line, expected):
+    name, *params = line.split("|")
+    assert registry.parse(name, params) == expected
+
+
+def test_parse_errors(registry):
+    with pytest.raises(ValueError, match="Unknown tool"):
+        registry.parse("missing", [])
+    with pytest.raises(ValueError, match="add"):
+        registry.parse("add", ["3"])
+    with pytest.raises(ValueError, match="int_list"):
+        registry.parse("int_list_to_exponential_sum", ["[1,3]x"])